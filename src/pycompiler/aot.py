@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+"""An ahead of time backend for the vm's code.  See vm.py.  AotCompiler splits the code
+into basic blocks and writes a python module with a function per block and a loop
+dispatching on the pc the blocks return.  The module only needs python to run, its
+run() does the same 'in' and 'out' as the vm with data as a list local to it.
+load_codefile() compiles a codefile once, caching the module next to it.
+"""
+import sys, os, imp, inspect
+parent_dir = os.path.abspath( os.path.join(__file__, '../..') )
+if not parent_dir in sys.path:
+    sys.path.append(parent_dir)
+__all__ = ['AotCompiler', 'AotEmitter', 'load_codefile', 'run_codefile', 'aot_path']
+
+from globals import *
+from util import *
+from jit import SourceEmitter
+from cache import cache_key
+from pagedmem import read_data, write_data
+from memimage import ImageMemory, is_image
+
+immed_ops = ['lit', 'load', 'store', 'brl', 'inc', 'dec']
+# instructions after which execution doesn't fall through to the next one
+block_ends = ['quit', 'br', 'brl', 'brf']
+known_ops = ['lit', 'load', 'store', 'ldi', 'sti', 'add', 'sub', 'mult', 'div', 'neg',
+             'eq', 'lt', 'gt', 'ne', 'le', 'ge', 'br', 'brl', 'brf', 'in', 'out',
+             'and', 'or', 'not', 'inc', 'dec', 'quit']
+
+module_header = '''"""Generated from %(source)s by pycompiler.aot, do not edit.
+run() runs the program, see pycompiler/aot.py."""
+import sys
+
+CODE_KEY = %(key)r
+
+class AotException(Exception): pass
+
+%(convert_from_str)s
+def read():
+    return convert_from_str(raw_input('> '))
+
+def write(value):
+    print value
+
+'''
+
+module_footer = '''
+BLOCKS = {%(blocks)s}
+DATA_LEN = %(data_len)d
+
+def run(data=None):
+    """Runs the program on the list data, indexed from 1 like the vm's, and returns it."""
+    if data is None: data = [None]
+    # the blocks don't grow data for stores at literal addresses below DATA_LEN
+    if len(data) < DATA_LEN: data.extend([None] * (DATA_LEN - len(data)))
+    stack = []
+    blocks = BLOCKS
+    pc = 1
+    while pc is not None:
+        block = blocks.get(pc)
+        if block is None:
+            raise AotException('no block at pc %%s, a branch the compiler did not see' %% pc)
+        pc = block(data, stack)
+    return data
+
+if __name__ == '__main__':
+    run()
+'''
+
+class AotEmitter(SourceEmitter):
+    """SourceEmitter for a block function of the generated module, where 'in' and 'out'
+    are the module's read() and write()."""
+    def read_input(self, t):
+        return ['%s = read()' % t]
+
+    def write_output(self, value):
+        return ['write(%s)' % value]
+
+
+class AotCompiler:
+    """Compiles the vm's code list (index 0 is None) into the source of a python module.
+    data is the initial data, used to find the targets of gotos ('lit cell ldi br' or
+    'load cell br').  A 'br' to any other computed address makes every instruction the
+    start of a block.
+    """
+    def __init__(self, code, data=None, source='code'):
+        self.code = code
+        self.data = data or [None]
+        self.source = source
+        self.instrs = self.decode()
+        self.leaders = self.find_leaders()
+
+    def decode(self):
+        """Returns the code as a list of (pc, op, operand), operand None for ops without one."""
+        instrs = []
+        pc = 1
+        while pc < len(self.code):
+            op = self.code[pc]
+            arg = None
+            if op in immed_ops and pc + 1 < len(self.code):
+                arg = self.code[pc+1]
+                instrs.append( (pc, op, arg) )
+                pc += 2
+            else:
+                instrs.append( (pc, op, arg) )
+                pc += 1
+        return instrs
+
+    def find_leaders(self):
+        """Returns the sorted list of pcs starting basic blocks:  pc 1, branch targets,
+        and the instructions following branches, quit, and anything unknown."""
+        positions = [pc for (pc, op, arg) in self.instrs]
+        leaders = set([1])
+        for i, (pc, op, arg) in enumerate(self.instrs):
+            if op in block_ends or not op in known_ops or \
+                    (op in immed_ops and arg is None):
+                if i + 1 < len(self.instrs): leaders.add(self.instrs[i+1][0])
+            if op == 'brl':
+                leaders.add(arg)
+            elif op == 'brf' and i > 0 and self.instrs[i-1][1] == 'lit':
+                leaders.add(self.instrs[i-1][2])
+            elif op == 'brf':
+                leaders.update(positions)
+            elif op == 'br':
+                cell = None
+                if i > 0 and self.instrs[i-1][1] == 'load':
+                    cell = self.instrs[i-1][2]
+                elif i > 1 and self.instrs[i-1][1] == 'ldi' and self.instrs[i-2][1] == 'lit':
+                    cell = self.instrs[i-2][2]
+                if type(cell) is int and 0 < cell < len(self.data) and \
+                        type(self.data[cell]) is int:
+                    leaders.add(self.data[cell])
+                else:
+                    leaders.update(positions)
+        return sorted([pc for pc in leaders if pc in positions])
+
+    def blocks(self):
+        """Returns the basic blocks as lists of (pc, op, operand)."""
+        leaders = set(self.leaders)
+        blocks = []
+        for instr in self.instrs:
+            if instr[0] in leaders: blocks.append([])
+            if blocks: blocks[-1].append(instr)
+        return blocks
+
+    def block_source(self, block):
+        """Returns the source of the function for block."""
+        emitter = AotEmitter(len(self.data))
+        lines, pop, flush = emitter.lines, emitter.pop, emitter.flush
+        next_pc = None
+        for (pc, op, arg) in block:
+            next_pc = pc + (2 if op in immed_ops else 1)
+            if op in immed_ops and arg is None:
+                lines.append('raise AotException(%r)' % ('%s at %d is missing its operand'
+                                                           % (op, pc)))
+                next_pc = None
+                break
+            if emitter.emit(op, arg):
+                continue
+            if op == 'quit':
+                lines.extend(flush() + ['return None'])
+            elif op == 'br':
+                target = pop()
+                lines.extend(flush() + ['return %s' % target])
+            elif op == 'brl':
+                lines.extend(flush() + ['return %r' % arg])
+            elif op == 'brf':
+                target = pop()
+                cond = pop()
+                lines.extend(flush() + ['if %s == 0: return %s' % (cond, target),
+                                        'return %d' % next_pc])
+            else:
+                lines.append('raise AotException(%r)' % ('Unknown operator %r at %d' % (op, pc)))
+            next_pc = None
+            break
+        if next_pc is not None:
+            # falls through to the next block
+            if next_pc < len(self.code):
+                lines.extend(flush() + ['return %d' % next_pc])
+            else:
+                lines.append('raise AotException(%r)' % 'pc past end of code')
+        header = ['def block_%d(data, stack):' % block[0][0]]
+        if [line for line in lines if 'pop()' in line or 'push(' in line]:
+            header.append('    pop, push = stack.pop, stack.append')
+        return '\n'.join(header + ['    ' + line for line in lines]) + '\n'
+
+    def key(self):
+        """Returns the key of the generated module, a hash of the code, the leaders
+        found from data and the length of data the stores were compiled for, so
+        rewriting variables in the datafile doesn't change it."""
+        text = '\n'.join([repr(val) for val in self.code]) + repr(self.leaders) + \
+               repr(len(self.data))
+        return cache_key(text, AotEmitter)
+
+    def generate(self):
+        """Returns the source of the module."""
+        header = module_header % {'source': self.source, 'key': self.key(),
+                                  'convert_from_str': inspect.getsource(convert_from_str)}
+        blocks = self.blocks()
+        footer = module_footer % {'blocks': ', '.join(['%d: block_%d' % (b[0][0], b[0][0])
+                                                       for b in blocks]),
+                                  'data_len': len(self.data)}
+        return header + '\n'.join([self.block_source(b) for b in blocks]) + footer
+
+
+def read_list(fname):
+    """Reads a code or data file into a list indexed from 1, as VM.read_files() does.
+    A datafile that is a memory image is mapped as an ImageMemory instead."""
+    values = [None]
+    if fname and os.path.exists(fname):
+        if is_image(fname): return ImageMemory(fname)
+        read_data(fname, values)
+    return values
+
+def aot_path(codefile):
+    """Returns the path of the module compiled from codefile."""
+    return codefile + '_aot.py'
+
+def load_codefile(codefile, datafile=None):
+    """Returns the module compiled from codefile, compiling it only if the module next
+    to it is missing or was compiled from different code.
+    @param datafile: the initial data, used for the targets of gotos"""
+    data = read_list(datafile)
+    compiler = AotCompiler(read_list(codefile), data, source=codefile)
+    if isinstance(data, ImageMemory): data.map.close()
+    key = compiler.key()
+    path = aot_path(codefile)
+    if os.path.exists(path):
+        for line in open(path):
+            if line.startswith('CODE_KEY'):
+                if line.split('=', 1)[1].strip() == repr(key):
+                    return imp.load_source('plh_aot_%s' % key, path)
+                break
+    try:
+        temp = '%s.%d' % (path, os.getpid())
+        open(temp, 'w').write(compiler.generate())
+        os.rename(temp, path)
+    except (IOError, OSError), msg:
+        write_to('aot.load_codefile:  could not write %s: %s' % (path, msg), sys.stderr)
+        module = imp.new_module('plh_aot_%s' % key)
+        exec compiler.generate() in module.__dict__
+        return module
+    return imp.load_source('plh_aot_%s' % key, path)
+
+def run_codefile(codefile, datafile=None):
+    """Runs codefile compiled ahead of time, like VM.execute(), reading the initial data
+    from datafile and writing the data back to it.  A memory image stays one, only its
+    dirty pages written back."""
+    module = load_codefile(codefile, datafile)
+    data = module.run(read_list(datafile))
+    if isinstance(data, ImageMemory):
+        data.sync()
+    elif datafile:
+        write_data(data, datafile)
+    return data
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+"""A batch executor running many PL/H jobs on a pool of worker processes.  Each source
+file is compiled once, however many jobs run it, and the compiled programs are handed
+to every worker once when the pool starts (inherited by fork where there is one), so a
+job sent to a worker is just the index of its program and its input.  The results come
+back as the jobs finish, with the output, exit status and number of instructions run.
+"""
+import sys, os, StringIO, multiprocessing
+parent_dir = os.path.abspath( os.path.join(__file__, '../..') )
+if not parent_dir in sys.path:
+    sys.path.append(parent_dir)
+__all__ = ['BatchExecutor', 'BatchException']
+
+from globals import *
+from util import *
+from vm import VM
+from channels import ListInput, BufferedOutput
+from translator import PlhTranslator
+from scanner import Scanner
+
+class BatchException(Exception): pass
+
+# instructions a worker runs at a time, see run_job()
+QUANTUM = 1 << 16
+
+# the compiled programs in a worker, a list of (code, data), set by init_worker()
+programs = None
+
+def init_worker(compiled):
+    global programs
+    programs = compiled
+
+def run_job(job):
+    """Runs job, (name, program index, input values, instruction budget), in a worker
+    and returns its result dictionary, see BatchExecutor.run()."""
+    name, index, input, budget = job
+    code, data = programs[index]
+    out = StringIO.StringIO()
+    vm = VM(input=ListInput(input or []), output=BufferedOutput(out))
+    vm.code = code
+    vm.data = data.copy()
+    vm.running = True
+    status, error = 0, None
+    try:
+        while vm.running:
+            if budget is None:
+                vm.run_quantum(QUANTUM)
+            elif vm.instr_count < budget:
+                vm.run_quantum(min(QUANTUM, budget - vm.instr_count))
+            else:
+                raise BatchException('instruction budget of %d used up' % budget)
+    except Exception, msg:
+        status, error = 1, '%s: %s' % (msg.__class__.__name__, msg)
+    vm.output.flush()
+    return {'name': name, 'status': status, 'error': error, 'output': out.getvalue(),
+            'instructions': vm.instr_count}
+
+
+class BatchExecutor:
+    """Collects jobs with add(), then run() runs them all.  Compiled files go in workdir.
+    @param processes: the number of worker processes, the number of cpus by default,
+    0 runs the jobs in this process
+    @param optimize: passed to the PlhTranslator, see optimizer.py
+    @param budget: the most instructions a job may run, None for no limit
+    """
+    def __init__(self, processes=None, workdir=None, optimize=False, budget=None):
+        if processes is None: processes = multiprocessing.cpu_count()
+        self.processes = processes
+        self.workdir = workdir or os.path.join(tempdir, 'batch_files')
+        if not os.path.exists(self.workdir): os.mkdir(self.workdir)
+        self.optimize, self.budget = optimize, budget
+        # the compiled programs, (code, data), and their indexes by source file
+        self.programs = []
+        self.program_index = {}
+        self.jobs = []
+
+    def compile(self, srcfile):
+        """Returns the index of the program compiled from srcfile, compiling it only the
+        first time."""
+        srcfile = os.path.abspath(srcfile)
+        if not srcfile in self.program_index:
+            n = len(self.programs)
+            trans = PlhTranslator(tokensource=Scanner(srcfile=srcfile).tokens(),
+                                  codefile=os.path.join(self.workdir, 'codefile%d' % n),
+                                  datafile=os.path.join(self.workdir, 'datafile%d' % n),
+                                  optimize=self.optimize)
+            trans.parse()
+            if not trans.code[1:]:
+                raise BatchException('%s did not compile' % srcfile)
+            self.programs.append( (trans.code, trans.data) )
+            self.program_index[srcfile] = n
+        return self.program_index[srcfile]
+
+    def add(self, srcfile, input=None, name=None):
+        """Adds a job running srcfile on input, a list of the values 'in' reads.
+        @param name: names the job's result, the number of the job by default"""
+        if name is None: name = len(self.jobs)
+        self.jobs.append( (name, self.compile(srcfile), input, self.budget) )
+
+    def run(self):
+        """Runs the jobs added, yielding the result of each as it finishes:
+        {'name': the job's name, 'status': 0, or 1 if it raised, 'error': the exception,
+        'output': what it wrote, 'instructions': the number it executed}"""
+        jobs, self.jobs = self.jobs, []
+        if not self.processes:
+            init_worker(self.programs)
+            for job in jobs: yield run_job(job)
+            return
+        pool = multiprocessing.Pool(self.processes, init_worker, (self.programs,))
+        try:
+            chunksize = max(1, len(jobs) // (self.processes * 4))
+            for result in pool.imap_unordered(run_job, jobs, chunksize):
+                yield result
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
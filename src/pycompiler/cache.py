@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+"""A cache for compiled grammars and translation schemes.  Reading a grammar file
+and building its sets and parse table is done once, the result is pickled to a file
+in cachedir named by a hash of the grammar text, and the object is memoized for the
+rest of the process.  See Grammar.load_grammar() and TransScheme.load_ts().
+"""
+import sys, os, inspect, hashlib, cPickle
+parent_dir = os.path.abspath( os.path.join(__file__, '../..') )
+if not parent_dir in sys.path:
+    sys.path.append(parent_dir)
+
+__all__ = ['load_compiled', 'cache_key', 'clear_memo']
+
+from globals import *
+from util import *
+
+# bump to invalidate every cached file when the pickled layout changes in a way
+# the source hash below wouldn't catch
+CACHE_VERSION = 1
+
+# compiled objects already loaded by this process, keyed by cache_key()
+_memo = {}
+# the keys of the sources already hashed by this process, keyed by (source_id(), class),
+# so a memo hit reads and hashes nothing
+_keys = {}
+
+def source_id(string_or_file):
+    """Returns what identifies the source without reading it:  the path, modification
+    time and size of a file, or the string itself."""
+    try:
+        st = os.stat(string_or_file)
+    except (OSError, TypeError, ValueError):
+        return string_or_file
+    return (os.path.abspath(string_or_file), st.st_mtime, st.st_size)
+
+def cache_key(text, cls):
+    """Returns the hex digest keying the compiled form of the grammar text as an instance
+    of cls.  The source of every module defining cls or one of its bases is part of the
+    hash, so editing the grammar code invalidates the cache as well as editing the grammar.
+    """
+    h = hashlib.sha1('%d:%s.%s:' % (CACHE_VERSION, cls.__module__, cls.__name__))
+    modules = []
+    for klass in inspect.getmro(cls):
+        module = sys.modules.get(klass.__module__)
+        if module and not module in modules: modules.append(module)
+    for module in modules:
+        try:
+            h.update( open(inspect.getsourcefile(module)).read() )
+        except (TypeError, IOError):
+            h.update(module.__name__)
+    h.update(text)
+    return h.hexdigest()
+
+def load_compiled(string_or_file, cls, create, directory=None):
+    """Returns the compiled grammar for the string or file source.  Tries the in process
+    memo, then the cache file, and only then calls create(string_or_file), pickling its
+    result to the cache.  The returned object is shared, so don't modify it (eg add_rule()).
+    @param cls: the class create() returns instances of, used in the key
+    @param create: function creating the object from the source, eg Grammar.create_grammar
+    @param directory: where the cache files go, cachedir if not given
+    """
+    source = (source_id(string_or_file), cls)
+    key = _keys.get(source)
+    if key in _memo: return _memo[key]
+    text = string_or_file
+    if os.path.exists(string_or_file):
+        text = open(string_or_file).read()
+    key = _keys[source] = cache_key(text, cls)
+    if key in _memo: return _memo[key]
+    directory = directory or cachedir
+    path = os.path.join(directory, '%s.%s.pickle' % (cls.__name__, key))
+    compiled = None
+    if os.path.exists(path):
+        try:
+            compiled = cPickle.load(open(path, 'rb'))
+        except Exception, msg:
+            write_to('cache.load_compiled:  ignoring bad cache file %s: %s' % (path, msg),
+                     sys.stderr)
+    if compiled is None:
+        compiled = create(text)
+        try:
+            if not os.path.exists(directory): os.mkdir(directory)
+            # write then rename so another process never reads half a file
+            temp = '%s.%d' % (path, os.getpid())
+            f = open(temp, 'wb')
+            cPickle.dump(compiled, f, cPickle.HIGHEST_PROTOCOL)
+            f.close()
+            os.rename(temp, path)
+        except (IOError, OSError), msg:
+            write_to('cache.load_compiled:  could not write %s: %s' % (path, msg), sys.stderr)
+    _memo[key] = compiled
+    return compiled
+
+def clear_memo():
+    """Forget the compiled objects loaded by this process, the cache files remain."""
+    _memo.clear()
+    _keys.clear()
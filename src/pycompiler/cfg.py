@@ -0,0 +1,478 @@
+#!/usr/bin/env python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+"""Control flow analysis of vm code, for the optimizer, the compilers, the profiler and
+the verifier to build on.  See vm.py and translator.py.  ControlFlowGraph splits the
+code into basic blocks and finds their successors, the dominators, the natural loops,
+and the defs and uses of each data address.
+    A goto is 'lit cell ldi br' (or 'load cell br'), a branch through a label cell in
+data the translator set to the label's pc.  The target is resolved from the cell: its
+initial value and any constant the code stores in it.  A store at a computed address
+could write any cell, but the translator's code never computes the address of a label
+cell, so given its symbols the label cells are taken to hold only those values.  A br
+or brf whose target can't be resolved is in unresolved.  It could branch anywhere, so
+then every instruction is a block of its own and a successor of it, as in aot.py.  The
+constants followed to the loads, stores and brf targets are still those found through
+the blocks before, the translator never branching into the middle of an expression.
+    The def-use chains of the data addresses are reaching definitions, found once for
+all the loads by a worklist over the blocks with a gen and kill bit set each, a bit
+for each store at a constant address.  A store at a computed address could write any
+cell, it is in computed_defs and left out of the chains.
+    Every step is a pass over the code or the blocks, so the analysis scales with the
+size of the program.  Nothing recurses on the length of the code.
+"""
+import sys, os
+parent_dir = os.path.abspath( os.path.join(__file__, '../..') )
+if not parent_dir in sys.path:
+    sys.path.append(parent_dir)
+__all__ = ['ControlFlowGraph', 'BasicBlock', 'CfgException']
+
+from globals import *
+from util import *
+from vmtrace import stack_effects
+
+class CfgException(Exception): pass
+
+# instructions with an immediate operand
+immed_ops = ['lit', 'load', 'store', 'brl', 'inc', 'dec']
+# instructions ending a basic block
+block_ends = ['quit', 'br', 'brl', 'brf']
+# the pc of the initial data, in the defs reaching a use
+INITIAL = 0
+
+def is_int(val):
+    return type(val) in (int, long)
+
+class BasicBlock:
+    """A basic block.  start is the pc of its first instruction, instrs its instructions
+    as (pc, op, operand), operand None for instructions without one, succs and preds the
+    starts of the blocks it branches or falls through to, and comes from."""
+    def __init__(self, start):
+        self.start = start
+        self.instrs = []
+        self.succs = []
+        self.preds = []
+
+    def __repr__(self):
+        return 'BasicBlock(%d, %d instrs, succs=%s)' % (self.start, len(self.instrs),
+                                                       self.succs)
+
+
+class ControlFlowGraph:
+    """The control flow graph of code, indexed from 1 like the vm's, with data the
+    initial data.  symbols, the translator's symbol table, gives the label cells,
+    otherwise they are the cells read right before a br.  After construction:
+        blocks      the dictionary of the start of each block to its BasicBlock
+        order       the starts of the blocks in code order
+        rpo         the starts of the blocks reachable from pc 1 in reverse postorder
+        idom        the dictionary of each reachable block to its immediate dominator,
+                    None for the entry block
+        loops       the dictionary of the header of each natural loop to the set of
+                    blocks in it, loops sharing a header merged
+        back_edges  the (tail, header) edges closing the loops
+        targets     the dictionary of the pc of each br and brf to its targets
+        unresolved  the pcs of the br and brf whose targets couldn't be resolved
+        label_cells the set of label cells
+        defs        the dictionary of each data address to the (pc, value) of the
+                    stores at it, value None unless a constant is stored
+        uses        the dictionary of each data address to the pcs of the loads of it
+        computed_defs, computed_uses    the pcs of the sti and ldi at addresses that
+                    aren't constant
+        use_defs    the dictionary of the pc of each load at a constant address to the
+                    sorted pcs of the stores at it that can reach it, INITIAL among
+                    them if the initial data can
+        def_uses    the dictionary of the pc of each store at a constant address to
+                    the sorted pcs of the loads it can reach
+    @raise CfgException: if an immediate op is missing its operand, or a resolved
+    branch targets a pc that isn't an instruction
+    """
+    def __init__(self, code, data, symbols=None):
+        self.code, self.data, self.symbols = code, data, symbols
+        self.instrs = self.decode()
+        self.positions = dict( (pc, i) for (i, (pc, op, arg)) in enumerate(self.instrs) )
+        self.label_cells = self.find_label_cells()
+        leaders = self.find_leaders()
+        while True:
+            self.split(leaders)
+            self.scan()
+            self.resolve()
+            new = set([t for ts in self.targets.values() for t in ts]) - leaders
+            if not new: break
+            # a constant stored in a label cell makes a new leader, split again
+            leaders.update(new)
+        if self.unresolved:
+            self.split(self.positions)
+            for pc in self.unresolved: self.targets[pc] = self.order
+        self.connect()
+        self.rpo = self.reverse_postorder()
+        self.idom = self.dominators()
+        self.number_dominator_tree()
+        self.back_edges, self.loops = self.natural_loops()
+        self.use_defs, self.def_uses = self.chains()
+
+    def decode(self):
+        """Returns the code as a list of (pc, op, operand)."""
+        code = self.code
+        instrs = []
+        pc = 1
+        while pc < len(code):
+            op = code[pc]
+            if op in immed_ops:
+                if pc + 1 >= len(code):
+                    raise CfgException('%s at %d is missing its operand' % (op, pc))
+                instrs.append( (pc, op, code[pc+1]) )
+                pc += 2
+            else:
+                instrs.append( (pc, op, None) )
+                pc += 1
+        return instrs
+
+    def label_cell_before(self, i):
+        """Returns the cell whose value instrs ending at i push ('load cell' or
+        'lit cell ldi'), else None."""
+        instrs = self.instrs
+        if i < 0: return None
+        if instrs[i][1] == 'load' and is_int(instrs[i][2]):
+            return instrs[i][2]
+        if i > 0 and instrs[i][1] == 'ldi' and instrs[i-1][1] == 'lit' and \
+                is_int(instrs[i-1][2]):
+            return instrs[i-1][2]
+        return None
+
+    def find_label_cells(self):
+        cells = set()
+        if self.symbols:
+            cells.update([entry['address'] for entry in self.symbols.values()
+                          if entry['type'] == 'label'])
+        for (i, (pc, op, arg)) in enumerate(self.instrs):
+            if op == 'br':
+                cell = self.label_cell_before(i-1)
+                if cell is not None: cells.add(cell)
+        return cells
+
+    def find_leaders(self):
+        """Returns the set of pcs starting blocks that can be found before scan():  pc 1,
+        the instructions after block ends, brl and brf targets, and the initial values of
+        the label cells."""
+        instrs = self.instrs
+        leaders = set()
+        if instrs: leaders.add(instrs[0][0])
+        for (i, (pc, op, arg)) in enumerate(instrs):
+            if op in block_ends and i + 1 < len(instrs):
+                leaders.add(instrs[i+1][0])
+            if op == 'brl':
+                leaders.add(self.target(arg, op, pc))
+            elif op == 'brf' and i > 0 and instrs[i-1][1] == 'lit' and is_int(instrs[i-1][2]):
+                leaders.add(self.target(instrs[i-1][2], op, pc))
+        for cell in self.label_cells:
+            if 0 <= cell < len(self.data) and self.data[cell] in self.positions:
+                leaders.add(self.data[cell])
+        return leaders
+
+    def target(self, target, op, pc):
+        """Returns target if it is the pc of an instruction."""
+        if not target in self.positions:
+            raise CfgException('%s at %d branches to %r, not an instruction' % (op, pc, target))
+        return target
+
+    def split(self, leaders):
+        """Splits the instructions into blocks at leaders."""
+        self.blocks = {}
+        self.order = []
+        self.block_at = {}
+        block = None
+        for instr in self.instrs:
+            if block is None or instr[0] in leaders:
+                block = BasicBlock(instr[0])
+                self.blocks[block.start] = block
+                self.order.append(block.start)
+            block.instrs.append(instr)
+            self.block_at[instr[0]] = block.start
+            if instr[1] in block_ends: block = None
+
+    def scan(self):
+        """Finds the addresses of the loads and stores, and the brf targets, following
+        the constants on the stack through each block.  Values on the stack at the start
+        of a block are unknown."""
+        self.defs, self.uses = {}, {}
+        self.computed_defs, self.computed_uses = [], []
+        self.def_at, self.use_at = {}, {}
+        self.brf_targets = {}
+        for start in self.order:
+            stack = []
+            def pop():
+                if stack: return stack.pop()
+                return None
+            for (pc, op, arg) in self.blocks[start].instrs:
+                if op == 'lit':
+                    stack.append(arg if is_int(arg) else None)
+                elif op == 'load':
+                    self.uses.setdefault(arg, []).append(pc)
+                    self.use_at[pc] = arg
+                    stack.append(None)
+                elif op == 'store':
+                    value = pop()
+                    self.defs.setdefault(arg, []).append( (pc, value) )
+                    self.def_at[pc] = arg
+                elif op == 'ldi':
+                    address = pop()
+                    if address is None:
+                        self.computed_uses.append(pc)
+                    else:
+                        self.uses.setdefault(address, []).append(pc)
+                    self.use_at[pc] = address
+                    stack.append(None)
+                elif op == 'sti':
+                    value, address = pop(), pop()
+                    if address is None:
+                        self.computed_defs.append(pc)
+                    else:
+                        self.defs.setdefault(address, []).append( (pc, value) )
+                    self.def_at[pc] = address
+                elif op in ('add', 'sub'):
+                    b, a = pop(), pop()
+                    if a is None or b is None:
+                        stack.append(None)
+                    else:
+                        stack.append(a + b if op == 'add' else a - b)
+                elif op == 'brf':
+                    self.brf_targets[pc] = pop()
+                    pop()
+                elif op in stack_effects:
+                    pops, pushes = stack_effects[op]
+                    for k in range(pops): pop()
+                    stack.extend([None] * pushes)
+                else:
+                    # an op added to the instr_set, its effect on the stack isn't known
+                    del stack[:]
+
+    def label_values(self, cell):
+        """Returns the sorted values a label cell can hold, or None if a store of an
+        unknown value could change it."""
+        if not 0 <= cell < len(self.data): return None
+        if self.computed_defs and not self.symbols: return None
+        values = set([self.data[cell]])
+        for (pc, value) in self.defs.get(cell, []):
+            if value is None: return None
+            values.add(value)
+        return sorted(values)
+
+    def resolve(self):
+        """Fills in targets and unresolved, the targets of the unresolved empty."""
+        self.targets = {}
+        self.unresolved = []
+        for (i, (pc, op, arg)) in enumerate(self.instrs):
+            if op == 'brf':
+                target = self.brf_targets.get(pc)
+                if target is None:
+                    self.unresolved.append(pc)
+                    self.targets[pc] = []
+                else:
+                    self.targets[pc] = [self.target(target, op, pc)]
+            elif op == 'br':
+                cell = self.label_cell_before(i-1)
+                values = None
+                if cell is not None: values = self.label_values(cell)
+                if values is None:
+                    self.unresolved.append(pc)
+                    self.targets[pc] = []
+                else:
+                    self.targets[pc] = [self.target(v, op, pc) for v in values]
+
+    def connect(self):
+        """Fills in the succs and preds of the blocks."""
+        for (k, start) in enumerate(self.order):
+            block = self.blocks[start]
+            pc, op, arg = block.instrs[-1]
+            succs = []
+            if op == 'brl':
+                succs.append(arg)
+            elif op in ('br', 'brf'):
+                succs.extend(self.targets[pc])
+            if not op in ('quit', 'br', 'brl') and k + 1 < len(self.order):
+                succs.append(self.order[k+1])
+            seen = set()
+            for succ in succs:
+                if not succ in seen:
+                    seen.add(succ)
+                    block.succs.append(succ)
+                    self.blocks[succ].preds.append(start)
+
+    def reverse_postorder(self):
+        """Returns the starts of the blocks reachable from the entry in reverse
+        postorder."""
+        if not self.order: return []
+        post = []
+        visited = set([self.order[0]])
+        work = [(self.order[0], iter(self.blocks[self.order[0]].succs))]
+        while work:
+            start, succs = work[-1]
+            for succ in succs:
+                if not succ in visited:
+                    visited.add(succ)
+                    work.append( (succ, iter(self.blocks[succ].succs)) )
+                    break
+            else:
+                work.pop()
+                post.append(start)
+        post.reverse()
+        return post
+
+    def dominators(self):
+        """Returns the immediate dominators, by the iterative algorithm of Cooper,
+        Harvey and Kennedy over the reverse postorder."""
+        if not self.rpo: return {}
+        index = dict( (start, k) for (k, start) in enumerate(self.rpo) )
+        entry = self.rpo[0]
+        idom = {entry: entry}
+        def intersect(a, b):
+            while a != b:
+                while index[a] > index[b]: a = idom[a]
+                while index[b] > index[a]: b = idom[b]
+            return a
+        changed = True
+        while changed:
+            changed = False
+            for start in self.rpo[1:]:
+                new = None
+                for pred in self.blocks[start].preds:
+                    if pred in idom:
+                        new = pred if new is None else intersect(pred, new)
+                if idom.get(start) != new:
+                    idom[start] = new
+                    changed = True
+        idom[entry] = None
+        return idom
+
+    def number_dominator_tree(self):
+        """Numbers the dominator tree in pre and postorder, for dominates()."""
+        children = {}
+        for (start, parent) in self.idom.items():
+            if parent is not None: children.setdefault(parent, []).append(start)
+        self.pre, self.post = {}, {}
+        if not self.rpo: return
+        n = 0
+        work = [(self.rpo[0], False)]
+        while work:
+            start, done = work.pop()
+            if done:
+                self.post[start] = n
+            else:
+                self.pre[start] = n
+                work.append( (start, True) )
+                work.extend([(child, False) for child in children.get(start, [])])
+            n += 1
+
+    def dominates(self, a, b):
+        """True if block a dominates block b, both reachable."""
+        return self.pre[a] <= self.pre[b] and self.post[b] <= self.post[a]
+
+    def natural_loops(self):
+        """Returns the back edges and the loops."""
+        back_edges = []
+        loops = {}
+        for start in self.rpo:
+            for succ in self.blocks[start].succs:
+                if succ in self.idom and self.dominates(succ, start):
+                    back_edges.append( (start, succ) )
+        for (tail, header) in back_edges:
+            body = loops.setdefault(header, set([header]))
+            work = [tail]
+            while work:
+                start = work.pop()
+                if start in body: continue
+                body.add(start)
+                work.extend([pred for pred in self.blocks[start].preds if pred in self.idom])
+        return back_edges, loops
+
+    def block_of(self, pc):
+        """Returns the block holding the instruction at pc."""
+        return self.blocks[self.block_at[pc]]
+
+    def chains(self):
+        """Returns use_defs and def_uses, from the reaching definitions of the stores at
+        constant addresses."""
+        # a bit for each store at a constant address, and one for the initial value
+        # of each address loaded
+        bits, address_of, masks = [], [], {}
+        bit_of = {}
+        for address in self.uses:
+            bit_of[(INITIAL, address)] = len(bits)
+            bits.append(INITIAL)
+            address_of.append(address)
+        for (address, defs) in self.defs.items():
+            for (pc, value) in defs:
+                bit_of[pc] = len(bits)
+                bits.append(pc)
+                address_of.append(address)
+        for (k, address) in enumerate(address_of):
+            masks[address] = masks.get(address, 0) | (1 << k)
+        initial = 0
+        for address in self.uses: initial |= 1 << bit_of[(INITIAL, address)]
+        gen, kill = {}, {}
+        for start in self.rpo:
+            g = k = 0
+            for (pc, op, arg) in self.blocks[start].instrs:
+                address = self.def_at.get(pc)
+                if address is not None:
+                    mask = masks[address]
+                    g = (g & ~mask) | (1 << bit_of[pc])
+                    k |= mask
+            gen[start], kill[start] = g, k
+        entry = self.rpo[0] if self.rpo else None
+        ins = dict( (start, 0) for start in self.rpo )
+        outs = {}
+        work = list(reversed(self.rpo))
+        queued = set(work)
+        while work:
+            start = work.pop()
+            queued.discard(start)
+            block = self.blocks[start]
+            bits_in = initial if start == entry else 0
+            for pred in block.preds:
+                bits_in |= outs.get(pred, 0)
+            ins[start] = bits_in
+            out = gen[start] | (bits_in & ~kill[start])
+            if outs.get(start) != out:
+                outs[start] = out
+                for succ in block.succs:
+                    if not succ in queued:
+                        queued.add(succ)
+                        work.append(succ)
+        use_defs, def_uses = {}, {}
+        for start in self.rpo:
+            reaching = ins[start]
+            for (pc, op, arg) in self.blocks[start].instrs:
+                address = self.use_at.get(pc)
+                if address is not None:
+                    reached = reaching & masks.get(address, 0)
+                    defs = []
+                    while reached:
+                        low = reached & -reached
+                        defs.append(bits[low.bit_length() - 1])
+                        reached ^= low
+                    use_defs[pc] = sorted(defs)
+                    for d in defs:
+                        if d != INITIAL: def_uses.setdefault(d, []).append(pc)
+                address = self.def_at.get(pc)
+                if address is not None:
+                    reaching = (reaching & ~masks[address]) | (1 << bit_of[pc])
+        for uses in def_uses.values(): uses.sort()
+        return use_defs, def_uses
+
+    def reaching_defs(self, pc):
+        """Returns the set of the pcs of the stores at constant addresses that can reach
+        the load at pc, INITIAL if the initial data can.  A load at a computed address is
+        reached by every store.  The computed stores aren't included, see computed_defs."""
+        if pc in self.use_defs: return set(self.use_defs[pc])
+        if not pc in self.computed_uses or not self.block_at.get(pc) in self.idom:
+            return set()
+        reached = set([INITIAL])
+        for defs in self.defs.values():
+            reached.update([d for (d, value) in defs])
+        return reached
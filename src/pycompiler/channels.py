@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+"""Input and output channels for the vm's 'in' and 'out' instructions.  See vm.py.
+An input channel has read() returning the next value, raising EOFError when there
+are no more.  An output channel has write(value) and flush().  The defaults,
+ConsoleInput and ConsoleOutput, prompt and print a value at a time as the vm always
+has, the others are for running programs without a console:  values from a list or
+array, an iterator, or a file descriptor, and output written in blocks or kept as a
+list of values.
+"""
+import sys, os
+from array import array
+parent_dir = os.path.abspath( os.path.join(__file__, '../..') )
+if not parent_dir in sys.path:
+    sys.path.append(parent_dir)
+__all__ = ['ConsoleInput', 'ListInput', 'IteratorInput', 'FileInput',
+           'ConsoleOutput', 'BufferedOutput', 'ListOutput', 'make_input']
+
+from globals import *
+from util import *
+
+class ConsoleInput:
+    """Reads a line at a time with raw_input(prompt), converted by convert_from_str()."""
+    def __init__(self, prompt='> '):
+        self.prompt = prompt
+
+    def read(self):
+        return convert_from_str(raw_input(self.prompt))
+
+
+class ListInput:
+    """Reads the values of a list or array, eg an array('i') of ints already parsed."""
+    def __init__(self, values):
+        self.values = values
+        self.next = 0
+
+    def read(self):
+        try:
+            value = self.values[self.next]
+        except IndexError:
+            raise EOFError('ListInput:  no more input after %d values' % self.next)
+        self.next += 1
+        return value
+
+
+class IteratorInput:
+    """Reads the values of any iterable, taking them only as they are read."""
+    def __init__(self, iterable):
+        self.iterator = iter(iterable)
+
+    def read(self):
+        try:
+            return self.iterator.next()
+        except StopIteration:
+            raise EOFError('IteratorInput:  no more input')
+
+
+class FileInput:
+    """Reads whitespace separated values, converted by convert_from_str(), from a file
+    descriptor or a file object, bufsize bytes at a time."""
+    def __init__(self, fd, bufsize=1<<16):
+        if hasattr(fd, 'fileno'): fd = fd.fileno()
+        self.fd = fd
+        self.bufsize = bufsize
+        self.values = []
+        self.next = 0
+        # an unfinished value at the end of the last block read
+        self.partial = ''
+        self.eof = False
+
+    def fill(self):
+        """Reads blocks until there are values to read or the file is done."""
+        while self.next >= len(self.values) and not self.eof:
+            block = os.read(self.fd, self.bufsize)
+            text = self.partial + block
+            tokens = text.split()
+            self.partial = ''
+            if not block:
+                self.eof = True
+            elif tokens and not text[-1].isspace():
+                # the last value may go on in the next block
+                self.partial = tokens.pop()
+            self.values = [convert_from_str(token) for token in tokens]
+            self.next = 0
+
+    def read(self):
+        if self.next >= len(self.values): self.fill()
+        if self.next >= len(self.values):
+            raise EOFError('FileInput:  end of file %s' % self.fd)
+        value = self.values[self.next]
+        self.next += 1
+        return value
+
+
+class ConsoleOutput:
+    """Prints a value at a time to sys.stdout, whatever it is when printed."""
+    def write(self, value):
+        print value
+
+    def flush(self):
+        pass
+
+
+class BufferedOutput:
+    """Writes the values a line each to file, sys.stdout by default, in blocks of
+    about bufsize bytes.  Call flush() to write what is left when done."""
+    def __init__(self, file=None, bufsize=1<<16):
+        self.file = file
+        self.bufsize = bufsize
+        self.lines = []
+        self.size = 0
+
+    def write(self, value):
+        line = '%s\n' % (value,)
+        self.lines.append(line)
+        self.size += len(line)
+        if self.size >= self.bufsize: self.flush()
+
+    def flush(self):
+        if self.lines:
+            (self.file or sys.stdout).write(''.join(self.lines))
+            self.lines = []
+            self.size = 0
+
+
+class ListOutput:
+    """Keeps the values written in the list self.values."""
+    def __init__(self):
+        self.values = []
+        self.write = self.values.append
+
+    def flush(self):
+        pass
+
+
+def make_input(source):
+    """Returns source as an input channel:  None is a ConsoleInput, a list, tuple or array
+    a ListInput, an int (a file descriptor) or an open file a FileInput, anything else
+    with a read() method is taken to be a channel already, and any other iterable is
+    an IteratorInput."""
+    if source is None: return ConsoleInput()
+    if isinstance(source, (int, long)) or hasattr(source, 'fileno'):
+        return FileInput(source)
+    if isinstance(source, (list, tuple, array)): return ListInput(source)
+    if hasattr(source, 'read'): return source
+    return IteratorInput(source)
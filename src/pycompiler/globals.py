@@ -12,11 +12,12 @@ pycompiler_home/
           --------tokfiledir/    contains tokenfiles
           --------grammardir/    contains grammars and translation schemes
           --------temp/        temp for tests, etc.
+          --------cache/       compiled grammars, see cache.py
 """
 import os
 
 __all__ = ['pycompiler_home', 'srcfiledir', 'tokfiledir', 'grammardir', 
-           'resourcedir', 'tempdir', ]
+           'resourcedir', 'tempdir', 'cachedir', ]
 
 pycompiler_home = os.path.normpath(__file__ + '/../../..')
 
@@ -25,6 +26,7 @@ tokfiledir = os.path.join(pycompiler_home, 'tokenfiles')
 grammardir = os.path.join(pycompiler_home, 'grammars')
 tempdir = os.path.join(pycompiler_home, 'temp')
 resourcedir = os.path.join(pycompiler_home, 'resources')
+cachedir = os.path.join(pycompiler_home, 'cache')
 
 if not os.path.exists(tempdir): os.mkdir(tempdir)
 
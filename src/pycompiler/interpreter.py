@@ -18,10 +18,13 @@ from util import *
 from translator import *
 from vm import *
 from scanner import *
+from channels import *
 
 
 class  PlhInterpreter:
-    def __init__(self, vm=None, translator=None, scanner=None, outputdir=None):
+    def __init__(self, vm=None, translator=None, scanner=None, outputdir=None,
+                 optimize=False):
+        """@param optimize: passed to the PlhTranslator, see optimizer.py"""
         if not outputdir:
             self.outputdir = os.path.join(os.getcwd(), 'interpreter_files')
         else:
@@ -32,43 +35,48 @@ class  PlhInterpreter:
         self.vm = vm
         self.trans = translator
         self.scanner = scanner
+        self.optimize = optimize
         self.tokfile = os.path.join(self.outputdir, 'tokfile')
         self.codefile = os.path.join(self.outputdir, 'codefile')
         self.datafile = os.path.join(self.outputdir, 'datafile')
+        self.programfile = os.path.join(self.outputdir, 'program.plhc')
         self.tr_outfile = os.path.join(self.outputdir, 'tr_outfile')
         self.vm_outfile = os.path.join(self.outputdir, 'vm_outfile')
         
-    def run_file(self, srcfile, interactive=True):
+    def run_file(self, srcfile, interactive=True, input=None):
         """Run srcfile through the scanner, parser, and vm
         @param srcfile: a PL/H source code file
-        @param interactive: if False, srcfile is run and any stdout is returned
-        but stdin is not available via keyboard
-        @return: string containing stdout from running program if interactive False
+        @param interactive: if False, srcfile is run and its output is returned 
+        instead of printed, and input is read from stdin without prompts
+        @param input: where the program's input comes from instead, anything VM takes
+        as input, eg a list of values, see channels.py
+        @return: string containing the output of the program if interactive False
         """
         self.scanner = Scanner(srcfile=srcfile, tokfile=self.tokfile)
-        self.scanner.scan()
-        self.trans = PlhTranslator(tokensource=self.tokfile,
+        # tokens go straight from the scanner to the translator, no tokfile is written
+        self.trans = PlhTranslator(tokensource=self.scanner.tokens(),
                                    codefile=self.codefile, 
                                    datafile=self.datafile,
-                                   outfile=self.tr_outfile)
+                                   programfile=self.programfile,
+                                   scanner=self.scanner,
+                                   outfile=self.tr_outfile,
+                                   optimize=self.optimize)
         self.trans.parse()
-        self.vm = VM(outfile=self.vm_outfile, 
-                     codefile=self.codefile, 
-                     datafile=self.datafile)
         if interactive:
+            self.vm = VM(outfile=self.vm_outfile, 
+                         codefile=self.programfile, 
+                         datafile=self.datafile,
+                         input=input)
             self.vm.execute()
         else:
-            sys.stdout.flush()
-            old_stdout = sys.stdout
-            retstring = ''
-            try:
-                sys.stdout = StringIO.StringIO()
-                self.vm.execute()
-                sys.stdout.flush()
-                retstring = sys.stdout.getvalue()
-            finally:
-                sys.stdout = old_stdout
-                return retstring
+            out = StringIO.StringIO()
+            self.vm = VM(outfile=self.vm_outfile, 
+                         codefile=self.programfile, 
+                         datafile=self.datafile,
+                         input=input or ConsoleInput(prompt=''),
+                         output=BufferedOutput(out))
+            self.vm.execute()
+            return out.getvalue()
             
 if __name__ == '__main__':
     outputdir = os.path.join(tempdir, 'interp_main_files')
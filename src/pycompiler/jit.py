@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+"""A tracing jit for the vm.  See vm.py.  The targets of backward branches, ie the tops
+of loops, are counted, and when one gets hot the instructions executed from it are
+recorded until execution gets back to it.  The trace is compiled with compile() into a
+python function running the loop, with a guard on each branch that exits back to the
+interpreter when the branch doesn't go the way it did in the trace.
+Run it with VM(engine='jit').
+"""
+import sys, os
+parent_dir = os.path.abspath( os.path.join(__file__, '../..') )
+if not parent_dir in sys.path:
+    sys.path.append(parent_dir)
+__all__ = ['TracingJit', 'SourceEmitter']
+
+from globals import *
+from util import *
+from vm import VmException
+
+# python expressions for the instructions computing a value from the stack,
+# a is the value under the top, b is the top
+expressions = {'add': '%(a)s + %(b)s', 'sub': '%(a)s - %(b)s', 'mult': '%(a)s * %(b)s',
+               'div': '%(a)s / %(b)s',
+               'eq': '1 if %(a)s == %(b)s else 0', 'lt': '1 if %(a)s < %(b)s else 0',
+               'gt': '1 if %(a)s > %(b)s else 0', 'ne': '1 if %(a)s != %(b)s else 0',
+               'le': '1 if %(a)s <= %(b)s else 0', 'ge': '1 if %(a)s >= %(b)s else 0',
+               'and': '%(a)s and %(b)s', 'or': '%(a)s or %(b)s',
+               'neg': '-%(b)s', 'not': 'not %(b)s',
+               'inc': '%(b)s + %(arg)r', 'dec': '%(b)s - %(arg)r',
+               'load': 'data[%(arg)r]', 'ldi': 'data[%(b)s]', }
+pops = {'neg': 1, 'not': 1, 'inc': 1, 'dec': 1, 'load': 0, 'ldi': 1}
+
+class SourceEmitter:
+    """Writes python source for straight line stack code, one instruction at a time
+    with emit().  The values on the stack are held in python locals (stack holds their
+    names, or literals), and pop() and push(value) are the names of functions popping 
+    and pushing the real stack in the generated code, used when the code needs a value
+    it didn't push, and by flush() for the values left over.  Memory is the list data.
+    Subclasses say how 'in' and 'out' are done with read_input() and write_output().
+    """
+    def __init__(self, data_len):
+        """@param data_len: the length of data when the code runs, a store to a literal 
+        address below it doesn't check data is long enough"""
+        self.data_len = data_len
+        self.lines = []
+        self.stack = []
+        self.n_locals = 0
+
+    def new_local(self):
+        self.n_locals += 1
+        return 't%d' % self.n_locals
+
+    def pop(self):
+        if self.stack: return self.stack.pop()
+        t = self.new_local()
+        self.lines.append('%s = pop()' % t)
+        return t
+
+    def flush(self):
+        """Returns the lines pushing the values left on the stack onto the real stack."""
+        return ['push(%s)' % value for value in self.stack]
+
+    def read_input(self, t):
+        """Returns the lines setting local t to a value read by 'in'."""
+        return ['op_in(None)', '%s = pop()' % t]
+
+    def write_output(self, value):
+        """Returns the lines writing value for 'out'."""
+        return ['push(%s)' % value, 'op_out(None)']
+
+    def emit(self, op, arg):
+        """Writes op, anything but a branch or quit.  Returns False if op isn't known."""
+        lines, stack = self.lines, self.stack
+        if op == 'lit':
+            stack.append(repr(arg))
+        elif op in expressions:
+            b = None
+            if pops.get(op, 2): b = self.pop()
+            a = None
+            if pops.get(op, 2) == 2: a = self.pop()
+            t = self.new_local()
+            lines.append('%s = %s' % (t, expressions[op] % {'a': a, 'b': b, 'arg': arg}))
+            stack.append(t)
+        elif op in ('store', 'sti'):
+            value = self.pop()
+            if op == 'store': addr = repr(arg)
+            else: addr = self.pop()
+            # data only grows, so a literal address inside it now always will be
+            if not (addr.isdigit() and int(addr) < self.data_len):
+                lines.append('while len(data) <= %s: data.append(None)' % addr)
+            lines.append('data[%s] = %s' % (addr, value))
+        elif op == 'in':
+            t = self.new_local()
+            lines.extend(self.read_input(t))
+            stack.append(t)
+        elif op == 'out':
+            lines.extend(self.write_output(self.pop()))
+        else:
+            return False
+        return True
+    
+
+class TracingJit:
+    """Runs the vm's decoded code, see VM.decode(), counting the backward branches
+    taken.  A loop top reached threshold times is recorded by record() and compiled
+    by compile_trace() into a function run in place of the interpreter from then on.
+    A trace longer than max_length, or one that quits, is dropped and its loop top
+    isn't tried again.
+    """
+    def __init__(self, vm, threshold=50, max_length=1000):
+        self.vm = vm
+        self.threshold, self.max_length = threshold, max_length
+        # loop tops to the number of times a backward branch went to them
+        self.counts = {}
+        # loop tops to their compiled trace functions, and the sources of those
+        self.traces = {}
+        self.sources = {}
+        # loop tops whose recording was dropped
+        self.blacklist = set()
+
+    def run(self):
+        """Executes the code until quit, starting after the vm's pc."""
+        vm = self.vm
+        if vm.decoded_code is not vm.code: vm.decode()
+        opcodes, operands = vm.opcodes, vm.operands
+        instrs, widths = vm.decoded_instrs, vm.decoded_widths
+        n_ops = len(vm.op_names)
+        branches = set()
+        for op in ('br', 'brl', 'brf'):
+            branches.add(vm.op_names.index(op))
+            branches.add(vm.op_names.index(op) + n_ops)
+        traces, counts, threshold = self.traces, self.counts, self.threshold
+        try:
+            while vm.running:
+                pc = vm.pc + 1
+                if pc in traces:
+                    traces[pc](vm)
+                    continue
+                opcode = opcodes[pc]
+                vm.pc = pc + widths[opcode] - 1
+                instrs[opcode](operands[pc])
+                if opcode in branches and vm.pc < pc:
+                    target = vm.pc + 1
+                    count = counts[target] = counts.get(target, 0) + 1
+                    if count >= threshold and not target in self.blacklist:
+                        self.record(target)
+        except IndexError, msg:
+            msg = str(msg) + '\nself.pc = %d, len(self.code) = %d' % (vm.pc, len(vm.code))
+            raise VmException(msg)
+
+    def record(self, start):
+        """Executes from start recording the instructions until execution gets back to
+        start, or reaches another compiled trace, then compiles the trace.  The trace
+        is a list of (pc, op, operand, pc of the next instruction executed)."""
+        vm = self.vm
+        opcodes, operands = vm.opcodes, vm.operands
+        instrs, widths = vm.decoded_instrs, vm.decoded_widths
+        trace = []
+        while vm.running and len(trace) < self.max_length:
+            pc = vm.pc + 1
+            if trace and (pc == start or pc in self.traces):
+                self.traces[start] = self.compile_trace(start, trace)
+                return
+            opcode = opcodes[pc]
+            vm.pc = pc + widths[opcode] - 1
+            instrs[opcode](operands[pc])
+            op = vm.code[pc]
+            arg = None
+            if op in vm.immed_op_instructions: arg = vm.code[pc+1]
+            trace.append( (pc, op, arg, vm.pc + 1) )
+        self.blacklist.add(start)
+
+    def compile_trace(self, start, trace):
+        """Returns the function running the trace from start.  The values on the stack
+        are held in python locals, taken from and given back to the vm's stack only
+        where the trace needs more than it pushed, exits, or loops."""
+        emitter = SourceEmitter(len(self.vm.data))
+        lines, pop, flush = emitter.lines, emitter.pop, emitter.flush
+        def leave(pc):
+            """Leave the trace to execute pc next."""
+            return flush() + ['vm.pc = %d' % (pc - 1), 'return']
+        def guard(test, exit_lines):
+            lines.append('if %s:' % test)
+            lines.extend(['    ' + line for line in exit_lines])
+
+        for (pc, op, arg, next_pc) in trace:
+            if emitter.emit(op, arg):
+                pass
+            elif op == 'br':
+                target = pop()
+                if target != repr(next_pc):
+                    guard('%s != %d' % (target, next_pc),
+                          flush() + ['vm.pc = %s - 1' % target, 'return'])
+            elif op == 'brl':
+                pass
+            elif op == 'brf':
+                target = pop()
+                cond = pop()
+                if next_pc == pc + 1:
+                    # not taken in the trace
+                    guard('%s == 0' % cond, flush() + ['vm.pc = %s - 1' % target, 'return'])
+                else:
+                    guard('%s != 0' % cond, leave(pc + 1))
+                    if target != repr(next_pc):
+                        guard('%s != %d' % (target, next_pc),
+                              flush() + ['vm.pc = %s - 1' % target, 'return'])
+            else:
+                raise VmException('TracingJit:  can\'t compile %s at %d' % (op, pc))
+        last_pc = trace[-1][3]
+        if last_pc == start:
+            lines.extend(flush() or ['pass'])
+        else:
+            lines.extend(leave(last_pc))
+        source = '\n'.join(['def trace_%d(vm):' % start,
+                            '    data = vm.data',
+                            '    pop, push = vm.stack.pop, vm.stack.push',
+                            '    op_in, op_out = vm.op_in, vm.op_out',
+                            '    while 1:'] +
+                           ['        ' + line for line in lines]) + '\n'
+        self.sources[start] = source
+        namespace = {}
+        exec compile(source, '<trace %d>' % start, 'exec') in namespace
+        return namespace['trace_%d' % start]
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+"""A binary memory image for the vm's datafile, for data kept between runs.  See vm.py.
+ImageMemory is a PagedMemory over an mmap of the image: a cell is read straight from
+the map until its page is written, then the page is copied into pages, and pages is
+the set of dirty pages.  sync() writes back only the dirty pages, so loading and
+saving cost what the program touched rather than the size of memory.
+    The image is IMAGE_MAGIC, struct header_format (page size, number of cells), the
+cells, then the overflow.  A cell is cell_size bytes, a tag byte and 8 bytes of int or
+float, so cell i is at header_size + i * cell_size.  The cells no value was written
+to are zeros, None, and write_image() leaves them as holes in the file.  A value that
+doesn't fit a cell, a string or a long too big, is kept in the overflow, a marshalled
+list after the cells, and its cell holds its index.  The overflow only grows while
+the image is reused.
+"""
+import sys, os, struct, mmap, marshal
+parent_dir = os.path.abspath( os.path.join(__file__, '../..') )
+if not parent_dir in sys.path:
+    sys.path.append(parent_dir)
+__all__ = ['ImageMemory', 'write_image', 'is_image', 'IMAGE_MAGIC']
+
+from globals import *
+from util import *
+from pagedmem import PagedMemory, runs_of, PAGE_SIZE
+
+IMAGE_MAGIC = 'PLHM\x01'
+header_format = '<5sII'
+header_size = struct.calcsize(header_format)
+cell_format = '<Bq'
+cell_size = struct.calcsize(cell_format)
+# cell tags
+NONE, INT, FLOAT, TRUE, FALSE, OVERFLOW = range(6)
+none_cell = '\0' * cell_size
+
+def encode_cell(value, overflow):
+    """Returns the cell for value, appending it to the list overflow if it doesn't fit."""
+    t = type(value)
+    if value is None: return none_cell
+    if t is bool: return struct.pack(cell_format, TRUE if value else FALSE, 0)
+    if t in (int, long) and -2**63 <= value < 2**63: return struct.pack(cell_format, INT, value)
+    if t is float: return struct.pack('<Bd', FLOAT, value)
+    overflow.append(value)
+    return struct.pack(cell_format, OVERFLOW, len(overflow) - 1)
+
+def decode_cell(buf, offset, overflow):
+    """Returns the value of the cell at offset in buf."""
+    tag, n = struct.unpack_from(cell_format, buf, offset)
+    if tag == INT: return n
+    if tag == NONE: return None
+    if tag == FLOAT: return struct.unpack_from('<d', buf, offset + 1)[0]
+    if tag == TRUE: return True
+    if tag == FALSE: return False
+    return overflow[n]
+
+def is_image(fname):
+    """Returns True if the file fname is a memory image."""
+    f = open(fname, 'rb')
+    try:
+        return f.read(len(IMAGE_MAGIC)) == IMAGE_MAGIC
+    finally:
+        f.close()
+
+def write_image(data, fname, page_size=PAGE_SIZE):
+    """Writes the cells of data, a list or a PagedMemory, to a new image fname,
+    seeking over the runs of None."""
+    overflow = []
+    out = open(fname, 'wb')
+    out.write(struct.pack(header_format, IMAGE_MAGIC, page_size, len(data)))
+    i = 0
+    cells = []
+    for (value, count) in runs_of(data, 0):
+        if value is None and count > 1:
+            out.write(''.join(cells))
+            cells = []
+            i += count
+            out.seek(header_size + i * cell_size)
+        else:
+            cells.append(encode_cell(value, overflow))
+            i += 1
+    out.write(''.join(cells))
+    out.truncate(header_size + len(data) * cell_size)
+    out.seek(header_size + len(data) * cell_size)
+    if overflow: out.write(marshal.dumps(overflow))
+    out.close()
+
+
+class ImageMemory(PagedMemory):
+    """Data memory mapped from the image fname, with the page size of the image.
+    image_size is the number of cells in the image, cells appended after them read as
+    None until written."""
+    def __init__(self, fname):
+        self.fname = fname
+        self.map = None
+        self.open_map()
+
+    def open_map(self):
+        f = open(self.fname, 'rb')
+        try:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+        magic, self.page_size, self.image_size = struct.unpack_from(header_format, self.map)
+        if magic != IMAGE_MAGIC:
+            self.map.close()
+            raise ValueError('%s is not a memory image' % self.fname)
+        end = header_size + self.image_size * cell_size
+        self.overflow = marshal.loads(self.map[end:]) if len(self.map) > end else []
+        self.size = self.image_size
+        self.pages = {}
+
+    def read_page(self, n):
+        """Returns the cells of page n, from the image, as a list."""
+        start = n * self.page_size
+        stop = min(start + self.page_size, self.image_size)
+        cells = [decode_cell(self.map, header_size + i * cell_size, self.overflow)
+                 for i in xrange(start, stop)]
+        return cells + [None] * (self.page_size - len(cells))
+
+    def page(self, n):
+        if n in self.pages: return self.pages[n]
+        if n * self.page_size < self.image_size: return self.read_page(n)
+        return None
+
+    def __getitem__(self, i):
+        if type(i) is slice: return [self[k] for k in xrange(*i.indices(self.size))]
+        if i < 0: i += self.size
+        if not 0 <= i < self.size: raise IndexError('memory address out of range')
+        page = self.pages.get(i // self.page_size)
+        if page is not None: return page[i % self.page_size]
+        if i < self.image_size:
+            return decode_cell(self.map, header_size + i * cell_size, self.overflow)
+        return None
+
+    def __setitem__(self, i, value):
+        if i < 0: i += self.size
+        if not 0 <= i < self.size: raise IndexError('memory address out of range')
+        n, offset = divmod(i, self.page_size)
+        page = self.pages.get(n)
+        if page is None:
+            page = self.pages[n] = self.read_page(n) if n * self.page_size < self.image_size \
+                                   else [None] * self.page_size
+        page[offset] = value
+
+    def copy(self):
+        """Returns a PagedMemory with the cells, not backed by the image."""
+        memory = PagedMemory(page_size=self.page_size)
+        memory.size = self.size
+        for n in xrange(self.size // self.page_size + 1):
+            page = self.page(n)
+            if page is not None: memory.pages[n] = page[:]
+        return memory
+
+    def sync(self):
+        """Writes the dirty pages back to the image, with the header and overflow if
+        the size or overflow changed, and maps it again."""
+        if not self.pages and self.size == self.image_size: return
+        n_overflow = len(self.overflow)
+        old_end = header_size + self.image_size * cell_size
+        self.map.close()
+        out = open(self.fname, 'r+b')
+        try:
+            if self.size != self.image_size:
+                # the cells appended are zeros, over the old overflow
+                out.truncate(old_end)
+                out.truncate(header_size + self.size * cell_size)
+            for n in sorted(self.pages):
+                start = n * self.page_size
+                cells = self.pages[n][:max(0, min(self.page_size, self.size - start))]
+                out.seek(header_size + start * cell_size)
+                out.write(''.join([encode_cell(value, self.overflow) for value in cells]))
+            if self.size != self.image_size or len(self.overflow) != n_overflow:
+                out.seek(header_size + self.size * cell_size)
+                if self.overflow: out.write(marshal.dumps(self.overflow))
+                out.truncate()
+                out.seek(0)
+                out.write(struct.pack(header_format, IMAGE_MAGIC, self.page_size, self.size))
+        finally:
+            out.close()
+            self.open_map()
+
+    def close(self):
+        """Writes back the dirty pages and unmaps the image."""
+        self.sync()
+        self.map.close()
+
+    def __repr__(self):
+        return 'ImageMemory(%r, %d cells, %d dirty pages of %d)' % (
+            self.fname, self.size, len(self.pages), self.page_size)
@@ -0,0 +1,288 @@
+#!/usr/bin/env  python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+"""A peephole optimizer for the code the PL/H translator emits.  See translator.py and
+vm.py.  The translator's actions emit the same naive sequences for every statement, eg
+'lit addr ldi' to read a variable and 'lit addr ldi br' for a goto.  The optimizer
+rewrites them into shorter sequences doing the same thing on the vm.
+"""
+import sys, os
+parent_dir = os.path.abspath( os.path.join(__file__, '../..') )
+if not parent_dir in sys.path:
+    sys.path.append(parent_dir)
+__all__ = ['PeepholeOptimizer', 'OptimizerException']
+
+from globals import *
+from util import *
+
+class OptimizerException(Exception): pass
+
+# instructions with an immediate operand
+immed_ops = ['lit', 'load', 'store', 'brl', 'inc', 'dec']
+# (number popped, number pushed) for the instructions that don't branch
+stack_effects = {'lit': (0, 1), 'load': (0, 1), 'store': (1, 0),
+                 'ldi': (1, 1), 'sti': (2, 0),
+                 'add': (2, 1), 'sub': (2, 1), 'mult': (2, 1), 'div': (2, 1),
+                 'neg': (1, 1), 'inc': (1, 1), 'dec': (1, 1),
+                 'eq': (2, 1), 'lt': (2, 1), 'gt': (2, 1), 'ne': (2, 1),
+                 'le': (2, 1), 'ge': (2, 1),
+                 'and': (2, 1), 'or': (2, 1), 'not': (1, 1),
+                 'in': (0, 1), 'out': (1, 0)}
+# instructions after which execution doesn't fall through
+no_fall_through = ['quit', 'br', 'brl']
+# binary operators folded when both operands are int literals
+fold_ops = {'add': lambda a, b: a + b,
+            'sub': lambda a, b: a - b,
+            'mult': lambda a, b: a * b,
+            'div': lambda a, b: a / b,
+            'eq': lambda a, b: 1 if a == b else 0,
+            'lt': lambda a, b: 1 if a < b else 0,
+            'gt': lambda a, b: 1 if a > b else 0,
+            'ne': lambda a, b: 1 if a != b else 0,
+            'le': lambda a, b: 1 if a <= b else 0,
+            'ge': lambda a, b: 1 if a >= b else 0,}
+
+def is_int(val):
+    return type(val) in (int, long)
+
+class PeepholeOptimizer:
+    """Optimizes the code of a translated program.  The code and data lists are the
+    translator's (index 0 is None), and symbols is its symbol table, used to find the
+    label cells in data holding code addresses for gotos.  optimize() returns the new
+    code list and updates the label cells in data to the new addresses.
+        Code addresses are found in the label cells, 'lit addr brf', and 'brl addr'.
+    Those addresses are the leaders, no rewrite spans one, so a branch never lands in
+    the middle of a rewritten sequence.  A 'br' whose target isn't a label cell would
+    make the leaders unknowable, so the code is left alone then.
+    """
+    def __init__(self, code, data, symbols):
+        self.code, self.data, self.symbols = code, data, symbols
+        self.label_cells = [entry['address'] for entry in symbols.values()
+                            if entry['type'] == 'label']
+
+    def decode(self):
+        """Returns the code as a list of instructions [address, op, operand], operand
+        None for instructions without an immediate operand.
+        @raise OptimizerException: if an immediate op is missing its operand"""
+        instrs = []
+        pc = 1
+        while pc < len(self.code):
+            op = self.code[pc]
+            if op in immed_ops:
+                if pc + 1 >= len(self.code):
+                    raise OptimizerException('%s at %d is missing its operand' % (op, pc))
+                instrs.append([pc, op, self.code[pc+1]])
+                pc += 2
+            else:
+                instrs.append([pc, op, None])
+                pc += 1
+        return instrs
+
+    def find_leaders(self, instrs):
+        """Returns the set of code addresses branched to, or None if a 'br' has a target
+        other than a label cell."""
+        leaders = set()
+        for cell in self.label_cells:
+            if is_int(self.data[cell]): leaders.add(self.data[cell])
+        for i, (addr, op, arg) in enumerate(instrs):
+            if op == 'brl':
+                leaders.add(arg)
+            elif op == 'brf':
+                if i == 0 or instrs[i-1][1] != 'lit' or not is_int(instrs[i-1][2]):
+                    return None
+                leaders.add(instrs[i-1][2])
+            elif op == 'br':
+                if i == 0 or not self.label_cell_load(instrs, i-1):
+                    return None
+        return leaders
+
+    def label_cell_load(self, instrs, i):
+        """Returns the label cell if instrs ending at i push its value ('load cell' or
+        'lit cell ldi'), else None."""
+        if instrs[i][1] == 'load' and instrs[i][2] in self.label_cells:
+            return instrs[i][2]
+        if i > 0 and instrs[i][1] == 'ldi' and instrs[i-1][1] == 'lit' and \
+                instrs[i-1][2] in self.label_cells:
+            return instrs[i-1][2]
+        return None
+
+    def optimize(self):
+        """Returns the optimized code list, updating the label cells in data."""
+        instrs = self.decode()
+        leaders = self.find_leaders(instrs)
+        if leaders is None:
+            write_to('PeepholeOptimizer:  computed branch, code not optimized', sys.stderr)
+            return self.code
+        changed = True
+        while changed:
+            changed = False
+            for rewrite in [self.fold_constants, self.direct_load_store,
+                            self.immediate_add, self.goto_to_brl, self.remove_dead_code]:
+                if rewrite(instrs, leaders): changed = True
+        return self.relocate(instrs)
+
+    def spans_leader(self, instrs, i, j, leaders):
+        """True if any of instrs[i+1:j+1] is branched to."""
+        for k in range(i+1, j+1):
+            if instrs[k][0] in leaders: return True
+        return False
+
+    def fold_constants(self, instrs, leaders):
+        """'lit a lit b op' -> 'lit (a op b)', 'lit a neg' -> 'lit -a', and 'lit a inc b'
+        -> 'lit (a+b)' (dec likewise) for int literals."""
+        changed = False
+        i = 0
+        while i < len(instrs):
+            addr, op, arg = instrs[i]
+            if op == 'lit' and is_int(arg):
+                if i + 2 < len(instrs) and instrs[i+1][1] == 'lit' and \
+                        is_int(instrs[i+1][2]) and instrs[i+2][1] in fold_ops and \
+                        not self.spans_leader(instrs, i, i+2, leaders) and \
+                        not (instrs[i+2][1] == 'div' and instrs[i+1][2] == 0):
+                    instrs[i][2] = fold_ops[instrs[i+2][1]](arg, instrs[i+1][2])
+                    del instrs[i+1:i+3]
+                    changed = True
+                    continue
+                if i + 1 < len(instrs) and instrs[i+1][1] in ('neg', 'inc', 'dec') and \
+                        (instrs[i+1][1] == 'neg' or is_int(instrs[i+1][2])) and \
+                        not self.spans_leader(instrs, i, i+1, leaders):
+                    next_op, next_arg = instrs[i+1][1:]
+                    if next_op == 'neg': instrs[i][2] = -arg
+                    elif next_op == 'inc': instrs[i][2] = arg + next_arg
+                    else: instrs[i][2] = arg - next_arg
+                    del instrs[i+1]
+                    changed = True
+                    continue
+            i += 1
+        return changed
+
+    def direct_load_store(self, instrs, leaders):
+        """'lit addr ldi' -> 'load addr', and 'lit addr <value> sti' -> '<value> store addr'
+        where <value> is straight line code leaving one value above addr on the stack."""
+        changed = False
+        i = 0
+        while i < len(instrs):
+            addr, op, arg = instrs[i]
+            if op == 'lit' and is_int(arg) and arg > 0:
+                if i + 1 < len(instrs) and instrs[i+1][1] == 'ldi' and \
+                        not self.spans_leader(instrs, i, i+1, leaders):
+                    instrs[i][1] = 'load'
+                    del instrs[i+1]
+                    changed = True
+                    continue
+                j = self.find_sti(instrs, i, leaders)
+                if j is not None:
+                    instrs[j][1:] = ['store', arg]
+                    instrs[i+1][0] = addr
+                    del instrs[i]
+                    changed = True
+                    continue
+            i += 1
+        return changed
+
+    def find_sti(self, instrs, i, leaders):
+        """Returns the index of the sti storing to the address pushed by instrs[i], if
+        that is the next instruction popping it, None otherwise."""
+        depth = 0
+        for j in range(i+1, len(instrs)):
+            if instrs[j][0] in leaders: return None
+            op = instrs[j][1]
+            if op == 'sti' and depth == 1: return j
+            if not op in stack_effects: return None
+            pops, pushes = stack_effects[op]
+            if pops > depth: return None
+            depth += pushes - pops
+        return None
+
+    def immediate_add(self, instrs, leaders):
+        """'lit k add' -> 'inc k' and 'lit k sub' -> 'dec k', and for the commutative
+        add, 'lit k X add' -> 'X inc k' where X is a load or lit."""
+        changed = False
+        i = 0
+        while i < len(instrs):
+            addr, op, arg = instrs[i]
+            if op == 'lit' and is_int(arg):
+                if i + 1 < len(instrs) and instrs[i+1][1] in ('add', 'sub') and \
+                        not self.spans_leader(instrs, i, i+1, leaders):
+                    instrs[i][1:] = [{'add': 'inc', 'sub': 'dec'}[instrs[i+1][1]], arg]
+                    del instrs[i+1]
+                    changed = True
+                    continue
+                if i + 2 < len(instrs) and instrs[i+1][1] in ('load', 'lit') and \
+                        instrs[i+2][1] == 'add' and \
+                        not self.spans_leader(instrs, i, i+2, leaders):
+                    instrs[i][1:] = instrs[i+1][1:]
+                    instrs[i+1][1:] = ['inc', arg]
+                    del instrs[i+2]
+                    changed = True
+                    continue
+            i += 1
+        return changed
+
+    def goto_to_brl(self, instrs, leaders):
+        """'lit cell ldi br' or 'load cell br' for a label cell -> 'brl target'.  The
+        target is an address in the original code, relocate() maps it."""
+        changed = False
+        i = 1
+        while i < len(instrs):
+            cell = None
+            if instrs[i][1] == 'br': cell = self.label_cell_load(instrs, i-1)
+            if cell is not None and is_int(self.data[cell]):
+                start = i - 1 if instrs[i-1][1] == 'load' else i - 2
+                if not self.spans_leader(instrs, start, i, leaders):
+                    instrs[start][1:] = ['brl', self.data[cell]]
+                    del instrs[start+1:i+1]
+                    changed = True
+                    i = start
+            i += 1
+        return changed
+
+    def remove_dead_code(self, instrs, leaders):
+        """Removes the instructions following quit, br, or brl up to the next leader, and
+        a brl to the instruction following it."""
+        changed = False
+        i = 0
+        while i < len(instrs):
+            if instrs[i][1] in no_fall_through:
+                j = i + 1
+                while j < len(instrs) and not instrs[j][0] in leaders: j += 1
+                if j > i + 1:
+                    del instrs[i+1:j]
+                    changed = True
+                if instrs[i][1] == 'brl' and i + 1 < len(instrs) and \
+                        instrs[i][2] == instrs[i+1][0]:
+                    del instrs[i]
+                    changed = True
+                    continue
+            i += 1
+        return changed
+
+    def relocate(self, instrs):
+        """Lays out instrs as a code list and maps every code address, in label cells,
+        'lit addr brf' and 'brl addr', from the original code to the new code.  An
+        original address maps to the first instruction at or after it that was kept."""
+        new_addr = {}
+        pc = 1
+        for addr, op, arg in instrs:
+            new_addr[addr] = pc
+            pc += 2 if op in immed_ops else 1
+        end = pc
+        def relocated(target):
+            for addr in range(target, len(self.code)):
+                if addr in new_addr: return new_addr[addr]
+            return end
+        code = [None]
+        for i, (addr, op, arg) in enumerate(instrs):
+            if op == 'brl' or \
+                    (op == 'lit' and i + 1 < len(instrs) and instrs[i+1][1] == 'brf'):
+                arg = relocated(arg)
+            code.append(op)
+            if op in immed_ops: code.append(arg)
+        for cell in self.label_cells:
+            if is_int(self.data[cell]): self.data[cell] = relocated(self.data[cell])
+        return code
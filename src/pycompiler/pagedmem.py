@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+"""Paged data memory shared by the translator and the vm, and the datafile format.
+PagedMemory is indexed like the data list, but a declaration only reserves a range
+of addresses, and a page of cells is only allocated the first time one of its cells
+is written.  Cells never written read as None.  A declare x(1000000) costs nothing
+until x is used.
+    The datafile has one value per line, and only the first whitespace delimited token
+of a line is read.  A run of at least RUN_MIN uninitialized cells is written as the
+single line None*N, so the big arrays no program has touched yet don't make big
+datafiles.  write_data() and read_data() write and read it for either memory.
+"""
+import sys, os
+parent_dir = os.path.abspath( os.path.join(__file__, '../..') )
+if not parent_dir in sys.path:
+    sys.path.append(parent_dir)
+__all__ = ['PagedMemory', 'data_lines', 'read_data', 'write_data', 'PAGE_SIZE', 'RUN_MIN']
+
+from globals import *
+from util import *
+
+# cells in a page
+PAGE_SIZE = 1024
+# the shortest run of None written as one line in a datafile
+RUN_MIN = 16
+RUN_PREFIX = 'None*'
+
+class PagedMemory(object):
+    """Data memory of len() cells, allocated a page at a time on the first write
+    to the page.  pages is the dictionary of page number to the list of its cells."""
+    def __init__(self, cells=(None,), page_size=PAGE_SIZE):
+        self.page_size = page_size
+        self.pages = {}
+        self.size = 0
+        self.extend(cells)
+
+    def reserve(self, n):
+        """Adds n uninitialized cells at the end without allocating any.
+        @return: the address of the first"""
+        address = self.size
+        self.size += n
+        return address
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if type(i) is slice: return [self[k] for k in xrange(*i.indices(self.size))]
+        if i < 0: i += self.size
+        if not 0 <= i < self.size: raise IndexError('memory address out of range')
+        page = self.pages.get(i // self.page_size)
+        if page is None: return None
+        return page[i % self.page_size]
+
+    def __getslice__(self, i, j):
+        return self[slice(i, j)]
+
+    def __setitem__(self, i, value):
+        if i < 0: i += self.size
+        if not 0 <= i < self.size: raise IndexError('memory address out of range')
+        n, offset = divmod(i, self.page_size)
+        page = self.pages.get(n)
+        if page is None:
+            if value is None: return
+            page = self.pages[n] = [None] * self.page_size
+        page[offset] = value
+
+    def append(self, value):
+        self[self.reserve(1)] = value
+
+    def extend(self, values):
+        """Adds the values at the end, as list.extend().  The None values only reserve
+        their cells."""
+        for value in values:
+            if value is None: self.size += 1
+            else: self.append(value)
+
+    def page(self, n):
+        """Returns the list of the cells of page n to read, or None if none are set."""
+        return self.pages.get(n)
+
+    def runs(self, start=0):
+        """Yields the cells from start on as (value, count), where count is 1 but for
+        runs of uninitialized cells, which are counted without reading the pages
+        never allocated."""
+        empty = 0
+        i = start
+        while i < self.size:
+            n, offset = divmod(i, self.page_size)
+            end = min((n + 1) * self.page_size, self.size)
+            page = self.page(n)
+            if page is None:
+                empty += end - i
+            else:
+                for value in page[offset:offset + end - i]:
+                    if value is None:
+                        empty += 1
+                    else:
+                        if empty: yield None, empty
+                        empty = 0
+                        yield value, 1
+            i = end
+        if empty: yield None, empty
+
+    def tolist(self):
+        """Returns the cells as a list, copying the pages allocated."""
+        cells = [None] * self.size
+        for n in self.pages:
+            start = n * self.page_size
+            stop = min(start + self.page_size, self.size)
+            cells[start:stop] = self.page(n)[:stop - start]
+        return cells
+
+    def copy(self):
+        """Returns a copy with its own pages."""
+        memory = PagedMemory(page_size=self.page_size)
+        memory.size = self.size
+        memory.pages = dict( (n, page[:]) for (n, page) in self.pages.items() )
+        return memory
+
+    def __iter__(self):
+        for (value, count) in self.runs():
+            for k in xrange(count): yield value
+
+    def __eq__(self, other):
+        return len(self) == len(other) and list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'PagedMemory(%d cells, %d pages of %d)' % (self.size, len(self.pages),
+                                                          self.page_size)
+
+
+def runs_of(data, start):
+    """Yields the cells of data, a list or a PagedMemory, from start as (value, count)."""
+    if isinstance(data, PagedMemory):
+        for run in data.runs(start): yield run
+        return
+    empty = 0
+    for value in data[start:]:
+        if value is None:
+            empty += 1
+        else:
+            if empty: yield None, empty
+            empty = 0
+            yield value, 1
+    if empty: yield None, empty
+
+def data_lines(data, start=0):
+    """Returns the lines of the datafile for the cells of data from start, without
+    line endings."""
+    lines = []
+    for (value, count) in runs_of(data, start):
+        if count >= RUN_MIN: lines.append('%s%d' % (RUN_PREFIX, count))
+        else: lines.extend( [str(value)] * count )
+    return lines
+
+def write_data(data, fname, start=0):
+    """Writes the cells of data from start to the datafile fname, a line each."""
+    out = open(fname, 'w')
+    for line in data_lines(data, start): out.write(line + os.linesep)
+    out.close()
+
+def read_data(fname, data):
+    """Appends the values in the datafile fname to data, a list or a PagedMemory.
+    Into a PagedMemory the runs of None only reserve their cells."""
+    for line in open(fname):
+        tokens = line.split()
+        if not tokens: continue
+        if tokens[0].startswith(RUN_PREFIX):
+            n = int(tokens[0][len(RUN_PREFIX):])
+            if isinstance(data, PagedMemory): data.reserve(n)
+            else: data.extend( [None] * n )
+        else:
+            data.append( convert_from_str(tokens[0]) )
+    return data
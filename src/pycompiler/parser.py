@@ -13,10 +13,21 @@ parent_dir = os.path.abspath( os.path.join(__file__, '../..') )
 if not parent_dir in sys.path:
     sys.path.append(parent_dir)
 
-__all__ = ['Grammar', 'Parser']
+__all__ = ['Grammar', 'Parser', 'NONTERMINAL', 'TERMINAL', 'ACTION',
+           'TRACE_OFF', 'TRACE_RULES', 'TRACE_FULL']
 
 from globals import *
 from util import *
+from cache import load_compiled
+
+# kind tags of the interned symbols, see Grammar.intern_symbols()
+NONTERMINAL, TERMINAL, ACTION = 0, 1, 2
+
+# trace levels of the parser's outfile:  nothing, the rules applied and tokens matched,
+# or those plus a snapshot of the stack and current token every cycle
+TRACE_OFF, TRACE_RULES, TRACE_FULL = 0, 1, 2
+# buffer size of the outfile, a full trace writes a snapshot every cycle
+TRACE_BUFSIZE = 1 << 16
 
 class Grammar:
     """A data structure that holds a CFG.  The terminals and nonterminals are lists.
@@ -25,16 +36,41 @@ class Grammar:
     rules[0][1] = the first rule, left side
     It is defined this way so that the parse actions are a list of lists whose indices
     match the rules they apply to.
+    The FIRST, FOLLOW and PREDICT sets are computed from the rules, so the parse actions
+    are optional:  a rule with no (or an empty) parse action set gets its PREDICT set.
+    Hand written sets are kept, but checked against the computed ones, see check_parse_actions().
     """
+    # end of token input marker, always in the FOLLOW set of the start symbol,
+    # and the bottom of stack marker the parser pushes under the start symbol.
+    # Both are terminals, they are added if the grammar doesn't declare them.
+    end_marker = '#'
+    bottom_marker = '%'
+    
     def __init__(self, terminals, nonterminals,
                  rules, parse_actions, start_symbol):
         self.terminals = terminals[:]
+        for marker in (self.end_marker, self.bottom_marker):
+            if not marker in self.terminals: self.terminals.append(marker)
         self.nonterminals = nonterminals[:]
         self.rules = rules[:]
         ## pa is the parse actions, didn't want to get confused with 
         ## the method name
         self.pa = parse_actions[:]
         self.start_symbol = start_symbol
+        # right hand sides of the rules split into tuples of symbols
+        self.rhs = [tuple(rule[1].split()) for rule in self.rules]
+        # FIRST and FOLLOW sets keyed by nonterminal, the set of nullable nonterminals, 
+        # and a PREDICT set per rule, see compute_sets()
+        self.first, self.follow, self.nullable, self.predict = {}, {}, set(), []
+        # hand written parse action sets that differ from the PREDICT sets:
+        # a list of tuples (rule index, missing tokens, extra tokens)
+        self.pa_mismatches = []
+        self.compute_sets()
+        self.check_parse_actions()
+        ## the LL(1) parse table, built once from the parse action sets, see build_parse_table()
+        self.parse_table = {}
+        self.conflicts = []
+        self.build_parse_table()
         
     def __str__(self):
         """String representation shows the grammar's start symbol, terminals, nonterminals,
@@ -61,6 +97,248 @@ class Grammar:
             gstring += line + nl
         return gstring
         
+    def is_transparent(self, symbol):
+        """Returns True for right hand side symbols that derive nothing and are skipped
+        by the FIRST and FOLLOW computations.  A plain grammar has none, see TransScheme.
+        """
+        return False
+    
+    def first_of(self, symbols):
+        """Returns a tuple (FIRST set, nullable) for the sequence of symbols, using 
+        the current FIRST sets of the nonterminals.  Any symbol that is neither a 
+        nonterminal nor transparent is taken as a terminal.
+        """
+        result = set()
+        for sym in symbols:
+            if sym in self.first:
+                result |= self.first[sym]
+                if not sym in self.nullable: return result, False
+            elif not self.is_transparent(sym):
+                result.add(sym)
+                return result, False
+        return result, True
+    
+    def compute_sets(self):
+        """Computes the FIRST and FOLLOW sets of every nonterminal and the PREDICT set of 
+        every rule from scratch.  Both fixpoints are worklist driven, so a rule is only
+        revisited when a set it depends on has grown.  See add_rule() for the incremental 
+        version.
+        """
+        self.first, self.follow, self.nullable = {}, {}, set()
+        # rules_using[nt] = indices of the rules with nt in their right hand side
+        # follow_edges[a] = nonterminals b with FOLLOW(a) a subset of FOLLOW(b)
+        self.rules_using, self.follow_edges = {}, {}
+        for nt in self.nonterminals + [rule[0] for rule in self.rules]:
+            self.first[nt], self.follow[nt], self.follow_edges[nt] = set(), set(), set()
+        if self.start_symbol in self.follow:
+            self.follow[self.start_symbol].add(self.end_marker)
+        for i in range( len(self.rules) ):
+            self._index_rule(i)
+        all_rules = range( len(self.rules) )
+        self._update_first(list(all_rules))
+        self._update_follow(all_rules, [self.start_symbol])
+        self.predict = [self._predict_set(i) for i in all_rules]
+        
+    def add_rule(self, lhs, rhs, parse_action=None):
+        """Adds the rule lhs -> rhs, both strings, with an optional hand written parse 
+        action set, then brings FIRST, FOLLOW, PREDICT and the parse table up to date.
+        Adding a rule can only grow the sets, so the worklists are seeded with just the 
+        new rule and the rules depending on what changed, rather than starting over.
+        A hand written parse action set describes the grammar before the new rule, so 
+        every existing rule whose PREDICT set changed has its parse actions replaced by 
+        the computed set--that is what lets the new rule reach the parse table.
+        @return: index of the new rule
+        """
+        i = len(self.rules)
+        if not lhs in self.nonterminals: self.nonterminals.append(lhs)
+        # a new nonterminal already used on a right side was taken as a terminal 
+        # there, which the grow-only update can't undo, so start over in that case
+        recompute = not lhs in self.first and \
+                    [rule_rhs for rule_rhs in self.rhs if lhs in rule_rhs]
+        self.rules.append([lhs, rhs])
+        self.rhs.append( tuple(rhs.split()) )
+        while len(self.pa) < i: self.pa.append([])
+        self.pa.append( list(parse_action or []) )
+        old_predict = self.predict + [set()]
+        if recompute:
+            self.compute_sets()
+            changed = set(self.first)
+        else:
+            for table in (self.first, self.follow, self.follow_edges):
+                if not lhs in table: table[lhs] = set()
+            self._index_rule(i)
+            changed = self._update_first([i])
+            affected = set([i])
+            for nt in changed: affected.update(self.rules_using.get(nt, ()))
+            changed |= self._update_follow(sorted(affected), [])
+            self.predict = old_predict[:]
+        for j in range( len(self.rules) ):
+            if j == i or self.rules[j][0] in changed or \
+                    [s for s in self.rhs[j] if s in changed]:
+                predict = self._predict_set(j)
+                if j != i and predict != old_predict[j]:
+                    self.pa[j] = self.ordered(predict)
+                self.predict[j] = predict
+        self.check_parse_actions()
+        self.build_parse_table()
+        return i
+        
+    def check_parse_actions(self):
+        """Checks the hand written parse action sets against the PREDICT sets.  A rule 
+        with no parse action set (or an empty one) is given its PREDICT set, otherwise any 
+        difference is recorded in self.pa_mismatches.  Missing tokens mean the parser will
+        reject valid input, so those are reported on stderr as well.  Extra tokens are only
+        a problem if they cause a conflict, which build_parse_table() reports.
+        The hand written set is still the one used for parsing.
+        @return: self.pa_mismatches
+        """
+        self.pa_mismatches = []
+        while len(self.pa) < len(self.rules): self.pa.append([])
+        for i in range( len(self.rules) ):
+            if not self.pa[i]:
+                self.pa[i] = self.ordered(self.predict[i])
+                continue
+            given = set(self.pa[i])
+            missing, extra = self.predict[i] - given, given - self.predict[i]
+            if missing or extra:
+                self.pa_mismatches.append( (i, self.ordered(missing), self.ordered(extra)) )
+            if missing:
+                msg = 'Grammar:  parse actions for rule %d (%s) are missing %s' % \
+                        (i, ' -> '.join(self.rules[i]), make_seq_string(self.ordered(missing), '{}'))
+                write_to(msg, sys.stderr)
+        return self.pa_mismatches
+    
+    def ordered(self, tokens):
+        """Returns the tokens as a list in the order of self.terminals, unknown tokens last."""
+        order = dict( (t, i) for (i, t) in enumerate(self.terminals) )
+        return sorted(tokens, key=lambda t: (order.get(t, len(order)), t))
+        
+    def _index_rule(self, i):
+        """Records rule i in self.rules_using for every nonterminal on its right side."""
+        for sym in set(self.rhs[i]):
+            if sym in self.first:
+                self.rules_using.setdefault(sym, []).append(i)
+    
+    def _update_first(self, worklist):
+        """Runs the FIRST/nullable worklist to a fixpoint from the rule indices in worklist.
+        @return: set of the nonterminals whose FIRST set or nullability changed
+        """
+        changed, queued = set(), set(worklist)
+        while worklist:
+            i = worklist.pop()
+            queued.discard(i)
+            lhs = self.rules[i][0]
+            first, nullable = self.first_of(self.rhs[i])
+            grew = not first <= self.first[lhs]
+            if grew: self.first[lhs] |= first
+            if nullable and not lhs in self.nullable:
+                self.nullable.add(lhs)
+                grew = True
+            if grew:
+                changed.add(lhs)
+                for j in self.rules_using.get(lhs, ()):
+                    if not j in queued:
+                        queued.add(j)
+                        worklist.append(j)
+        return changed
+    
+    def _update_follow(self, rule_indices, worklist):
+        """Adds the FOLLOW constraints of the rules in rule_indices, then propagates along
+        follow_edges to a fixpoint, starting from the nonterminals in worklist as well.
+        @return: set of the nonterminals whose FOLLOW set changed
+        """
+        changed, worklist = set(), list(worklist)
+        for i in rule_indices:
+            lhs = self.rules[i][0]
+            # scan right to left, tail is FIRST of what follows the current symbol
+            tail, tail_nullable = set(), True
+            for sym in reversed(self.rhs[i]):
+                if sym in self.first:
+                    if not tail <= self.follow[sym]:
+                        self.follow[sym] |= tail
+                        changed.add(sym)
+                        worklist.append(sym)
+                    if tail_nullable and not sym in self.follow_edges[lhs]:
+                        self.follow_edges[lhs].add(sym)
+                        worklist.append(lhs)
+                    if sym in self.nullable: 
+                        tail = tail | self.first[sym]
+                    else:
+                        tail, tail_nullable = set(self.first[sym]), False
+                elif not self.is_transparent(sym):
+                    tail, tail_nullable = set([sym]), False
+        while worklist:
+            nt = worklist.pop()
+            for succ in self.follow_edges.get(nt, ()):
+                if not self.follow[nt] <= self.follow[succ]:
+                    self.follow[succ] |= self.follow[nt]
+                    changed.add(succ)
+                    worklist.append(succ)
+        return changed
+    
+    def _predict_set(self, i):
+        """Returns the PREDICT set of rule i."""
+        result, nullable = self.first_of(self.rhs[i])
+        if nullable: result |= self.follow[self.rules[i][0]]
+        return result
+        
+    def build_parse_table(self):
+        """Builds the LL(1) parse table from the parse action sets.  The table is a dictionary
+        keyed by nonterminal, each value a dictionary keyed by token name to the index of the
+        rule to apply.  If more than one rule claims the same (nonterminal, token) entry the 
+        grammar is not LL(1):  the first rule keeps the entry, as parse_action() always did, 
+        and the conflict is recorded in self.conflicts as a tuple 
+        (nonterminal, token, kept rule index, rejected rule index) and reported on stderr.
+        @return: the list of conflicts, empty if the grammar is LL(1)
+        """
+        self.parse_table, self.conflicts = {}, []
+        for i in range( min(len(self.rules), len(self.pa)) ):
+            nonterm = self.rules[i][0]
+            row = self.parse_table.setdefault(nonterm, {})
+            for token in self.pa[i]:
+                if not token in row:
+                    row[token] = i
+                elif row[token] != i:
+                    self.conflicts.append( (nonterm, token, row[token], i) )
+        for (nonterm, token, kept, rejected) in self.conflicts:
+            msg = 'Grammar:  LL(1) conflict for (%s, %s) between rules %d and %d, using rule %d' \
+                    % (nonterm, token, kept, rejected, kept)
+            write_to(msg, sys.stderr)
+        self.intern_symbols()
+        return self.conflicts
+    
+    def kind_of(self, symbol):
+        """Returns the kind tag of symbol:  NONTERMINAL, ACTION for transparent symbols, 
+        and TERMINAL for anything else."""
+        if symbol in self.first or symbol in self.nonterminals: return NONTERMINAL
+        if self.is_transparent(symbol): return ACTION
+        return TERMINAL
+    
+    def intern_symbols(self):
+        """Numbers every symbol of the grammar so the parser's hot loop works on small ints:
+            symbol_ids[name] = id, symbol_names[id] = name, symbol_kinds[id] = kind tag
+            rule_pushes[i] = ids of rule i's right side, reversed, ready to extend a stack
+            id_table[id] = {terminal id: rule index} for nonterminals, None otherwise
+        """
+        self.symbol_ids, self.symbol_names, self.symbol_kinds = {}, [], []
+        def intern(name):
+            if not name in self.symbol_ids:
+                self.symbol_ids[name] = len(self.symbol_names)
+                self.symbol_names.append(name)
+                self.symbol_kinds.append(self.kind_of(name))
+            return self.symbol_ids[name]
+        for name in self.terminals + self.nonterminals:
+            intern(name)
+        for i in range( len(self.rules) ):
+            intern(self.rules[i][0])
+            for name in self.rhs[i]: intern(name)
+        for row in self.parse_table.values():
+            for name in row: intern(name)
+        self.rule_pushes = [tuple(intern(name) for name in reversed(rhs)) for rhs in self.rhs]
+        self.id_table = [None] * len(self.symbol_names)
+        for (nonterm, row) in self.parse_table.items():
+            self.id_table[intern(nonterm)] = dict( (intern(name), i) for (name, i) in row.items() )
+        
     def parse_action(self, stack_top, next_token):
         """Returns the index of the rule that works given the nonterminal on top
         of the stack and the next token of input.  
@@ -68,13 +346,9 @@ class Grammar:
         @param stack_top: string value -- ie the name of the top token in stack
         @param param: string value as well
         """
-        index = -1
-        for i in range( len(self.pa) ):
-            if next_token in self.pa[i]:
-                if self.rules[i][0] == stack_top: 
-                    index = i
-                    break
-        return index
+        row = self.parse_table.get(stack_top)
+        if row is None: return -1
+        return row.get(next_token, -1)
             
     @staticmethod
     def get_gse3():
@@ -131,6 +405,20 @@ class Grammar:
         Escape characters with a backslash, ie to put a comma in the grammar use [ +, -, \, ...]. 
         For now--only can handle escaping a single character.
         
+        """
+        return Grammar(**Grammar.read_grammar(string_or_file))
+    
+    @staticmethod
+    def load_grammar(string_or_file):
+        """Same as create_grammar(), but the grammar is compiled at most once per process
+        and cached on disk between processes, see cache.py.  The grammar returned is shared.
+        """
+        return load_compiled(string_or_file, Grammar, Grammar.create_grammar)
+    
+    @staticmethod
+    def read_grammar(string_or_file):
+        """Reads a grammar in the create_grammar() format from a string or a file.
+        @return: dictionary of the keyword arguments for the Grammar constructor
         """
         grammar_string = string_or_file
         if os.path.exists(string_or_file):
@@ -171,45 +459,58 @@ class Grammar:
                 parts = parts[1].replace("'", "").split('{')
                 rule.append(parts[0].strip())
                 kwargs['rules'].append(rule)
+                pa = []
                 if len(parts) > 1:        # parse actions
                     temp = []; rem = parts[1]
                     if rem.find(escape_char) != -1: rem = getescaped(rem, temp)
                     remparts = [s.strip() for s in rem.strip()[:-1].split(',')]
-                    kwargs['parse_actions'].append(
-                        [s for s in remparts if s ] + temp)
-            
-        g = Grammar(**kwargs)
-        return g
+                    pa = [s for s in remparts if s ] + temp
+                # rules without a parse action set get their PREDICT set, see Grammar
+                kwargs['parse_actions'].append(pa)
+        return kwargs
         
 
-class Parser:
-    """LL(1) parser implementation."""
+class Parser(object):
+    """LL(1) parser implementation.  The parse stack holds the interned symbol ids of the
+    grammar (see Grammar.intern_symbols()), the stack attribute shows it as tokens."""
     def __init__(self, tokensource = 'tokfile',
                  outfile = None,                 
-                 grammar = None):
+                 grammar = None,
+                 trace = None):
         """@param tokensource: string or file, whitespace delimited, source of tokens
-        to parse
+        to parse, or an iterable of (name, value) pairs, eg Scanner.tokens(), that is 
+        read one token at a time
         @param outfile: pics of the parser internals will be written to it if it exists
         @param grammar: the grammar required to parse the input, not a translation scheme
+        @param trace: TRACE_OFF, TRACE_RULES, or TRACE_FULL, what goes to the outfile, 
+        TRACE_FULL if not given.  Without an outfile it is always TRACE_OFF, and nothing 
+        is formatted for tracing at all
         """
         self.token_index = 0
         self.token_list = []
-        if os.path.exists(tokensource):
+        self.token_iter = None
+        if not isinstance(tokensource, basestring):
+            self.token_iter = iter(tokensource)
+        elif os.path.exists(tokensource):
             self.token_list = open(tokensource).read().split()
         else:
             self.token_list = tokensource.strip().split()
         # self.outfile will capture snapshots of the parser executing
         # if it exists, 'accept' and 'reject' will go to stdout as well
         self.outfile = None
-        if outfile: self.outfile = open(outfile, 'w')
+        if outfile: self.outfile = open(outfile, 'w', TRACE_BUFSIZE)
+        self.trace = TRACE_OFF
+        if self.outfile: self.trace = TRACE_FULL if trace is None else trace
             
         # if a grammar is not passed, set the default to gse3
         self.grammar = grammar
         if not self.grammar:
             self.grammar = Grammar.get_gse3()
-        self.stack = Stack()
-        self.stack.multipush([{'name': self.grammar.start_symbol, 'value': ''}, 
-                              {'name': '%', 'value':''}]) 
+        # the parse stack, symbol ids with the top at the end.  Symbols pushed on the stack 
+        # never have a value, token values stay with the current token, so there is no
+        # value stack to go with it
+        ids = self.grammar.symbol_ids
+        self.sym_stack = [ids[Grammar.bottom_marker], ids[self.grammar.start_symbol]]
         self.code = []
         self.data = []
         self.pc = 0
@@ -217,6 +518,8 @@ class Parser:
         # note that tokens are a dictionary with keys 'name' and 'value'
         # the front token of input, advanced by self.next_token()
         self.current_token = None
+        # and its interned id, -1 when there is no current token or it is unknown
+        self.current_id = -1
         
         self.is_parsing = False
         # column width for aligning output
@@ -228,79 +531,118 @@ class Parser:
         self.is_parsing = True
         self.next_token()
         
-        begstr = "Beginning Parse:\n\nstack:    %s\n" % token_stack_str(stack=self.stack, reverse=True)
-        tokstr =  "token:    %s      value:  %s\n" % (self.current_token['name'],
-                                                      self.current_token['value'])
-        write_to(begstr + tokstr, self.outfile)
+        if self.trace >= TRACE_FULL:
+            write_to("Beginning Parse:\n\n" + self.snapshot(), self.outfile)
         
         while self.is_parsing:
             self.execute_one_cycle()        
         if self.outfile:  self.outfile.close()
     
+    def snapshot(self):
+        """Returns the stack and current token as written to the outfile every cycle at
+        TRACE_FULL."""
+        stackstr = "stack:    %s\n" % token_stack_str(stack=self.stack, reverse=True)
+        tokstr =  "token:    %s      value:  %s\n" % (self.current_token['name'],
+                                                      self.current_token['value'])
+        return stackstr + tokstr
+    
+    def get_stack(self):
+        """Returns a Stack of tokens (dicts with keys 'name' and 'value') showing the 
+        parse stack, for snapshots and inspection.  Changing it doesn't change the parser."""
+        stack = Stack()
+        names = self.grammar.symbol_names
+        stack.data = [make_token(names[sym]) for sym in self.sym_stack]
+        return stack
+    stack = property(get_stack)
+    
     def execute_one_cycle(self):
         """Execute one cycle of the parser."""
-        stack = self.stack
         grammar = self.grammar
-        current_token = self.current_token
-        top = stack.top()['name']        
-        if top in grammar.nonterminals:
-            n = grammar.parse_action(top, current_token['name'])
+        sym_stack = self.sym_stack
+        top = sym_stack[-1]
+        kind = grammar.symbol_kinds[top]
+        if kind == NONTERMINAL:
+            n = grammar.id_table[top].get(self.current_id, -1)
             if n == -1:
                 write_to('reject', sys.stdout, self.outfile)
                 self.is_parsing = False
             else:
-                rulestr = "rule %s:   %s" % (n, ' -> '.join( grammar.rules[n]) )
-                write_to(rulestr, self.outfile)                
-                stack.pop()
-                stack.multipush( [{'name': name, 'value': ''} 
-                                  for name in grammar.rules[n][1].strip().split()] )
+                if self.trace:
+                    write_to("rule %s:   %s" % (n, ' -> '.join( grammar.rules[n]) ), 
+                             self.outfile)
+                sym_stack.pop()
+                sym_stack.extend(grammar.rule_pushes[n])
                 
-        elif top in grammar.terminals:
-            if top == current_token['name']:
-                matchstr = "matching: %s" % top               
-                stack.pop()
+        elif kind == TERMINAL:
+            if top == self.current_id:
+                sym_stack.pop()
                 self.next_token()                
-                write_to(matchstr, self.outfile)
+                if self.trace:
+                    write_to("matching: %s" % grammar.symbol_names[top], self.outfile)
 
-            elif current_token['name'] == '#' and top == '%':
+            elif self.current_token['name'] == Grammar.end_marker and \
+                    grammar.symbol_names[top] == Grammar.bottom_marker:
                 write_to('accept', sys.stdout, self.outfile)
                 self.is_parsing = False
             else:
                 write_to('reject', sys.stdout, self.outfile)
                 self.is_parsing = False
-        if self.is_parsing:
-            stackstr = "stack:    %s\n" % token_stack_str(stack=self.stack, reverse=True)
-            tokstr =  "token:    %s      value:  %s\n" % (self.current_token['name'],
-                                                      self.current_token['value'])
-            write_to(stackstr + tokstr, self.outfile)
+        if self.is_parsing and self.trace >= TRACE_FULL:
+            write_to(self.snapshot(), self.outfile)
+        
+    def is_vocab(self, name):
+        """Returns True if name is a terminal or nonterminal of the grammar."""
+        sym = self.grammar.symbol_ids.get(name)
+        return sym is not None and self.grammar.symbol_kinds[sym] != ACTION
+    
+    def set_current_token(self, token):
+        """Sets the current token, a dict with keys 'name' and 'value' or None, and its id."""
+        self.current_token = token
+        self.current_id = -1
+        if token: self.current_id = self.grammar.symbol_ids.get(token['name'], -1)
         
     def next_token(self):
         """Puts the next token from the input stream into self.current_token--or token with name '#'
         on EOF .  Sets it to None on any further calls after EOF."""
-        vocab = self.grammar.terminals + self.grammar.nonterminals
+        if self.token_iter is not None:
+            return self.next_streamed_token()
         try:
             name = None
             if self.token_list: name = self.token_list[self.token_index].strip()
             if not name and not self.token_list:
                 raise IndexError()    
-            if name in vocab:
-                self.current_token = {'name': name, 'value': ''}
+            if self.is_vocab(name):
+                self.set_current_token( {'name': name, 'value': ''} )
             else:
                 msg = 'Parser.next_token():  problem with token, name=%s ' % name
                 raise ValueError(msg)
             try:
                 self.token_index += 1
                 value = convert_from_str( self.token_list[self.token_index].strip() )                      
-                if not value in vocab: 
+                if not (isinstance(value, str) and self.is_vocab(value)): 
                     self.current_token['value'] = value
                     self.token_index += 1
             except IndexError:
                 return
         except IndexError:
             if self.current_token == {'name':'#','value': ''}:
-                self.current_token = None
+                self.set_current_token(None)
             else:
-                self.current_token = {'name':'#','value': ''}
+                self.set_current_token( {'name':'#','value': ''} )
+    
+    def next_streamed_token(self):
+        """next_token() for a token iterator:  the names and values come paired, so there is 
+        no guessing whether a word is a value."""
+        for (name, value) in self.token_iter:
+            if not self.is_vocab(name):
+                raise ValueError('Parser.next_token():  problem with token, name=%s ' % name)
+            if value is None: value = ''
+            self.set_current_token( {'name': name, 'value': value} )
+            return
+        if self.current_token == {'name':'#','value': ''}:
+            self.set_current_token(None)
+        else:
+            self.set_current_token( {'name':'#','value': ''} )
                 
            
 if __name__ == '__main__':   
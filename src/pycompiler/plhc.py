@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+"""The compiled program file, .plhc, the translator writes next to the codefile and the
+vm runs.  See translator.py and vm.py.  It holds the code, the initial data, the symbol
+table and optionally a debug section in one file read with a single read, with no
+token to split or convert on the way in.
+    The file is PROGRAM_MAGIC, struct header_format (version, number of sections), a
+section_format entry (name, offset, length) for each section, then the sections:
+    CNST    the constant pool, a marshalled list of the strings (op names), floats and
+            longs in the code and data
+    CODE    the code from index 1, the cells as int32 values then a tag byte each,
+            INT for a value that is the cell, POOL for an index in the constant pool
+    DATA    the number of data cells from index 1, then chunks of the cells set, each
+            (start, count) and count cells encoded as in memimage.py, overflow in the pool
+    SYMS    the symbol table, marshalled
+    DBUG    optional, marshalled {'source': the source file, 'lines': the source line
+            of each code cell}
+"""
+import sys, os, struct, marshal
+from array import array
+parent_dir = os.path.abspath( os.path.join(__file__, '../..') )
+if not parent_dir in sys.path:
+    sys.path.append(parent_dir)
+__all__ = ['Program', 'read_program', 'write_program', 'is_program', 'ProgramException',
+           'PROGRAM_MAGIC', 'PROGRAM_VERSION']
+
+from globals import *
+from util import *
+from pagedmem import PagedMemory, runs_of
+from memimage import encode_cell, decode_cell, cell_size
+
+class ProgramException(Exception): pass
+
+PROGRAM_MAGIC = 'PLHC'
+PROGRAM_VERSION = 1
+header_format = '<4sHH'
+header_size = struct.calcsize(header_format)
+section_format = '<4sII'
+section_size = struct.calcsize(section_format)
+chunk_format = '<II'
+chunk_size = struct.calcsize(chunk_format)
+# code cell tags
+INT, POOL = 0, 1
+MIN_INT, MAX_INT = -2**31, 2**31 - 1
+
+class Program(object):
+    """A compiled program.  code is indexed from 1 like the vm's, data is the initial
+    data as a PagedMemory, symbols the translator's symbol table, debug None or the
+    debug dictionary."""
+    def __init__(self, code, data, symbols, debug=None):
+        self.code, self.data, self.symbols, self.debug = code, data, symbols, debug
+
+
+def is_program(fname):
+    """Returns True if the file fname is a compiled program."""
+    f = open(fname, 'rb')
+    try:
+        return f.read(len(PROGRAM_MAGIC)) == PROGRAM_MAGIC
+    finally:
+        f.close()
+
+def write_program(fname, code, data, symbols, debug=None):
+    """Writes the program to fname.
+    @param code: the code list, from index 1
+    @param data: the data, a list or a PagedMemory, from index 1
+    @param debug: if given, the dictionary written as the debug section"""
+    pool, pool_index = [], {}
+    def pooled(value):
+        key = (type(value), value)
+        if not key in pool_index:
+            pool_index[key] = len(pool)
+            pool.append(value)
+        return pool_index[key]
+    values, tags = array('i'), bytearray()
+    for cell in code[1:]:
+        if type(cell) is int and MIN_INT <= cell <= MAX_INT:
+            values.append(cell)
+            tags.append(INT)
+        else:
+            values.append(pooled(cell))
+            tags.append(POOL)
+    if sys.byteorder == 'big': values.byteswap()
+    chunks = [struct.pack('<I', len(data) - 1)]
+    cells, start, i = [], 1, 1
+    for (value, count) in runs_of(data, 1):
+        if value is None:
+            if cells: chunks.append(struct.pack(chunk_format, start, len(cells)) + ''.join(cells))
+            cells = []
+            i += count
+            start = i
+        else:
+            cells.append(encode_cell(value, pool))
+            i += 1
+    if cells: chunks.append(struct.pack(chunk_format, start, len(cells)) + ''.join(cells))
+    # the pool goes first but is marshalled last, encode_cell() adds to it
+    sections = [('CODE', values.tostring() + str(tags)), ('DATA', ''.join(chunks)),
+                ('SYMS', marshal.dumps(symbols))]
+    if debug is not None: sections.append( ('DBUG', marshal.dumps(debug)) )
+    sections.insert(0, ('CNST', marshal.dumps(pool)))
+    out = [struct.pack(header_format, PROGRAM_MAGIC, PROGRAM_VERSION, len(sections))]
+    offset = header_size + len(sections) * section_size
+    for (name, body) in sections:
+        out.append(struct.pack(section_format, name, offset, len(body)))
+        offset += len(body)
+    out.extend([body for (name, body) in sections])
+    f = open(fname, 'wb')
+    f.write(''.join(out))
+    f.close()
+
+def read_program(fname):
+    """Returns the Program in the file fname.
+    @raise ProgramException: if it isn't a program this version reads"""
+    buf = open(fname, 'rb').read()
+    if len(buf) < header_size or not buf.startswith(PROGRAM_MAGIC):
+        raise ProgramException('%s is not a compiled program' % fname)
+    magic, version, n_sections = struct.unpack_from(header_format, buf)
+    if version != PROGRAM_VERSION:
+        raise ProgramException('%s is version %d, not %d' % (fname, version, PROGRAM_VERSION))
+    sections = {}
+    for k in range(n_sections):
+        name, offset, length = struct.unpack_from(section_format, buf,
+                                                  header_size + k * section_size)
+        sections[name] = buffer(buf, offset, length)
+    pool = marshal.loads(sections['CNST'])
+    body = sections['CODE']
+    n = len(body) // 5
+    values = array('i')
+    values.fromstring(body[:4 * n])
+    if sys.byteorder == 'big': values.byteswap()
+    code = [None]
+    code.extend([pool[v] if t == POOL else v
+                 for (v, t) in zip(values, bytearray(body[4 * n:]))])
+    body = sections['DATA']
+    data = PagedMemory()
+    data.reserve(struct.unpack_from('<I', body)[0])
+    i = 4
+    while i < len(body):
+        start, count = struct.unpack_from(chunk_format, body, i)
+        i += chunk_size
+        for k in range(count):
+            data[start + k] = decode_cell(body, i + k * cell_size, pool)
+        i += count * cell_size
+    debug = marshal.loads(sections['DBUG']) if 'DBUG' in sections else None
+    return Program(code, data, marshal.loads(sections['SYMS']), debug)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+"""An execution profiler for the vm.  See vm.py.  VmProfiler runs the vm's decoded code
+like VM.run(), counting and timing every instruction by opcode, by pc, and by basic
+block, and counting the branch edges taken.  Run it with VM(profile=True), the results
+are in vm.profiler after the run, as a flat text report() or as json with to_json().
+"""
+import sys, os, json
+from collections import Counter
+from timeit import default_timer
+parent_dir = os.path.abspath( os.path.join(__file__, '../..') )
+if not parent_dir in sys.path:
+    sys.path.append(parent_dir)
+__all__ = ['VmProfiler']
+
+from globals import *
+from util import *
+from vm import VmException
+
+# instructions that end a basic block, the superinstructions ending in a branch included
+block_ends = ['quit', 'br', 'brl', 'brf', 'lit_ldi_br', 'lit_brf']
+
+class VmProfiler:
+    """Profiles the vm's run()s.  A basic block is counted from the instruction it is
+    entered at to the first branch or quit, so a branch into the middle of a block is
+    counted as another block starting there, as RegisterEngine does.  An edge is
+    (pc of the branch, pc executed after it), a branch not taken included.  The
+    counts and times add up over the runs until reset().
+    @param timer: returns the time in seconds, timeit.default_timer by default
+    """
+    def __init__(self, vm, timer=default_timer):
+        self.vm = vm
+        self.timer = timer
+        self.code = None
+        self.reset()
+
+    def reset(self):
+        """Clear the counters, sizing them to the vm's decoded code."""
+        vm = self.vm
+        if vm.decoded_code is not vm.code: vm.decode()
+        self.code = vm.code
+        n_opcodes = len(vm.decoded_instrs)
+        self.op_counts, self.op_times = [0] * n_opcodes, [0.0] * n_opcodes
+        self.pc_counts, self.pc_times = [0] * (len(vm.code) + 1), [0.0] * (len(vm.code) + 1)
+        # block entries to the times entered, the instructions and time spent in them
+        self.block_counts, self.block_instrs, self.block_times = Counter(), Counter(), Counter()
+        self.edges = Counter()
+
+    def run(self):
+        """Executes the decoded code until quit, starting after the vm's pc."""
+        vm = self.vm
+        if vm.decoded_code is not vm.code or self.code is not vm.code: self.reset()
+        opcodes, operands = vm.opcodes, vm.operands
+        instrs, widths = vm.decoded_instrs, vm.decoded_widths
+        names = vm.op_names + vm.op_names
+        ends = [name in block_ends for name in names]
+        op_counts, op_times = self.op_counts, self.op_times
+        pc_counts, pc_times = self.pc_counts, self.pc_times
+        block_counts, block_instrs, block_times = \
+            self.block_counts, self.block_instrs, self.block_times
+        timer = self.timer
+        entry = vm.pc + 1
+        n_instrs, elapsed = 0, 0.0
+        try:
+            while vm.running:
+                pc = vm.pc + 1
+                opcode = opcodes[pc]
+                vm.pc = pc + widths[opcode] - 1
+                start = timer()
+                instrs[opcode](operands[pc])
+                t = timer() - start
+                op_counts[opcode] += 1
+                op_times[opcode] += t
+                pc_counts[pc] += 1
+                pc_times[pc] += t
+                n_instrs += 1
+                elapsed += t
+                if ends[opcode] or not vm.running:
+                    if names[opcode] != 'quit': self.edges[(pc, vm.pc + 1)] += 1
+                    block_counts[entry] += 1
+                    block_instrs[entry] += n_instrs
+                    block_times[entry] += elapsed
+                    entry = vm.pc + 1
+                    n_instrs, elapsed = 0, 0.0
+        except IndexError, msg:
+            msg = str(msg) + '\nself.pc = %d, len(self.code) = %d' % (vm.pc, len(vm.code))
+            raise VmException(msg)
+        finally:
+            # the block the run stopped in, on an exception
+            if n_instrs:
+                block_counts[entry] += 1
+                block_instrs[entry] += n_instrs
+                block_times[entry] += elapsed
+
+    def top_edges(self, n=10):
+        """Returns the n most frequent edges as a list of ((from pc, to pc), count)."""
+        return self.edges.most_common(n)
+
+    def stats(self, n_edges=10):
+        """Returns the profile as a dictionary:
+        {'instructions': count, 'time': seconds,
+         'opcodes': {name: {'count': count, 'time': seconds}},
+         'pcs': {pc: {'op': name, 'count': count, 'time': seconds}},
+         'blocks': {entry: {'count': times entered, 'instructions': count, 'time': seconds}},
+         'edges': [{'from': pc, 'to': pc, 'count': count}]}, the n_edges most frequent
+        Only what was executed is in it."""
+        vm = self.vm
+        names = vm.op_names + vm.op_names
+        opcodes = {}
+        for opcode, count in enumerate(self.op_counts):
+            if not count: continue
+            # an op's constant variant is counted with it
+            entry = opcodes.setdefault(names[opcode], {'count': 0, 'time': 0.0})
+            entry['count'] += count
+            entry['time'] += self.op_times[opcode]
+        pcs = {}
+        for pc, count in enumerate(self.pc_counts):
+            if count:
+                pcs[pc] = {'op': names[vm.opcodes[pc]], 'count': count,
+                           'time': self.pc_times[pc]}
+        blocks = dict( (entry, {'count': count, 'instructions': self.block_instrs[entry],
+                                'time': self.block_times[entry]})
+                       for entry, count in self.block_counts.items() )
+        edges = [{'from': a, 'to': b, 'count': count}
+                 for ((a, b), count) in self.top_edges(n_edges)]
+        return {'instructions': sum(self.op_counts), 'time': sum(self.op_times),
+                'opcodes': opcodes, 'pcs': pcs, 'blocks': blocks, 'edges': edges}
+
+    def to_json(self, fname=None, n_edges=10):
+        """Returns stats() as json, and writes it to fname if given."""
+        text = json.dumps(self.stats(n_edges), indent=1, sort_keys=True)
+        if fname: open(fname, 'w').write(text)
+        return text
+
+    def report(self, n=10):
+        """Returns a flat text report of the n hottest opcodes, pcs, and blocks by time
+        and the n most frequent edges."""
+        stats = self.stats(n)
+        nl = os.linesep
+        def hottest(table):
+            return sorted(table.items(), key=lambda (k, v): (-v['time'], k))[:n]
+        lines = ['instructions %d  time %.6fs' % (stats['instructions'], stats['time']), '',
+                 '%-12s %10s %12s' % ('opcode', 'count', 'time')]
+        for name, s in hottest(stats['opcodes']):
+            lines.append('%-12s %10d %12.6f' % (name, s['count'], s['time']))
+        lines += ['', '%-6s %-12s %10s %12s' % ('pc', 'op', 'count', 'time')]
+        for pc, s in hottest(stats['pcs']):
+            lines.append('%-6d %-12s %10d %12.6f' % (pc, s['op'], s['count'], s['time']))
+        lines += ['', '%-6s %10s %12s %12s' % ('block', 'count', 'instrs', 'time')]
+        for entry, s in hottest(stats['blocks']):
+            lines.append('%-6d %10d %12d %12.6f' % (entry, s['count'], s['instructions'],
+                                                    s['time']))
+        lines += ['', '%-6s %-6s %10s' % ('from', 'to', 'count')]
+        for e in stats['edges']:
+            lines.append('%-6d %-6d %10d' % (e['from'], e['to'], e['count']))
+        return nl.join(lines) + nl
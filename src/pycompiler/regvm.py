@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+"""A register based execution engine for the vm.  See vm.py.  The stack code is
+translated a block at a time into statements on registers, where the registers are
+the data cells themselves for direct addresses (eg the scalar variables of PL/H),
+and temporaries for values that have to be held.  Run it with VM(engine='register').
+"""
+import sys, os, operator
+parent_dir = os.path.abspath( os.path.join(__file__, '../..') )
+if not parent_dir in sys.path:
+    sys.path.append(parent_dir)
+__all__ = ['RegisterEngine', 'Block']
+
+from globals import *
+from util import *
+from vm import VmException
+
+# the binary instructions, as functions of (next, top)
+binary_ops = {'add': operator.add, 'sub': operator.sub, 'mult': operator.mul,
+              'div': operator.div,
+              'eq': lambda a, b: 1 if a == b else 0,
+              'lt': lambda a, b: 1 if a < b else 0,
+              'gt': lambda a, b: 1 if a > b else 0,
+              'ne': lambda a, b: 1 if a != b else 0,
+              'le': lambda a, b: 1 if a <= b else 0,
+              'ge': lambda a, b: 1 if a >= b else 0,
+              'and': lambda a, b: a and b,
+              'or': lambda a, b: a or b,}
+unary_ops = {'neg': operator.neg, 'not': operator.not_}
+
+# kinds of the values on the stack during translation of a block
+CONST, REG, TEMP, EXPR = 0, 1, 2, 3
+
+class Block:
+    """The translation of the stack code starting at entry.  stmts are the statements
+    in order, and exit sets the vm's pc (and running for quit) when they are done.
+    run() executes the block.  length is the number of stack instructions translated.
+    """
+    def __init__(self, entry, stmts, exit, length):
+        self.entry, self.stmts, self.exit, self.length = entry, stmts, exit, length
+        def run():
+            for stmt in stmts: stmt()
+            exit()
+        self.run = run
+
+
+class RegisterEngine:
+    """Runs the vm's code as register blocks.  A block is translated the first time
+    execution reaches its entry, pc 1 and the branch targets visible in the code are
+    translated up front by translate_all().  A block runs to the first branch or quit,
+    so a branch into the middle of one just starts another block there.  Where the
+    code can't be translated (an unknown op, a missing operand) the vm executes that
+    instruction itself, raising the same VmException as the stack engine.
+    """
+    def __init__(self, vm):
+        self.vm = vm
+        self.blocks = {}
+        self.code = self.data = None
+
+    def reset(self):
+        """Forget the blocks if the vm's code or data lists have been replaced."""
+        if self.code is not self.vm.code or self.data is not self.vm.data:
+            self.blocks = {}
+            self.code, self.data = self.vm.code, self.vm.data
+
+    def translate_all(self):
+        """Translates the blocks at pc 1 and the static branch targets, 'brl addr' and
+        'lit addr brf', ahead of running."""
+        self.reset()
+        code = self.code
+        entries = [1]
+        for pc in range(1, len(code) - 1):
+            if code[pc] == 'brl' and type(code[pc+1]) is int:
+                entries.append(code[pc+1])
+            elif code[pc] == 'lit' and pc + 2 < len(code) and code[pc+2] == 'brf' and \
+                    type(code[pc+1]) is int:
+                entries.append(code[pc+1])
+        for entry in entries:
+            if not entry in self.blocks: self.blocks[entry] = self.translate(entry)
+
+    def run(self):
+        """Executes the code until quit, starting after the vm's pc."""
+        vm = self.vm
+        self.translate_all()
+        blocks = self.blocks
+        try:
+            while vm.running:
+                entry = vm.pc + 1
+                try:
+                    block = blocks[entry]
+                except KeyError:
+                    block = blocks[entry] = self.translate(entry)
+                if block: block.run()
+                else: vm.exec_current_instr()
+        except IndexError, msg:
+            msg = str(msg) + '\nself.pc = %d, len(self.code) = %d' % (vm.pc, len(vm.code))
+            raise VmException(msg)
+
+    def translate(self, entry):
+        """Returns the Block starting at entry, or None if the instruction at entry can't
+        be translated."""
+        vm, code, data = self.vm, self.code, self.data
+        immed = vm.immed_op_instructions
+        runtime_stack = vm.stack
+        stack = []              # the values pushed, (kind, value)
+        stmts = []
+        temps = []              # temporaries, set by statements, read by later ones
+
+        def temp():
+            temps.append(None)
+            return len(temps) - 1
+        def getter(node):
+            kind, val = node
+            if kind == CONST: return lambda: val
+            if kind == REG: return lambda: data[val]
+            if kind == TEMP: return lambda: temps[val]
+            return val
+        def hold(i):
+            """Evaluate stack[i] into a temporary now."""
+            kind, val = stack[i]
+            if kind in (CONST, TEMP): return
+            k = temp()
+            g = getter(stack[i])
+            def stmt(): temps[k] = g()
+            stmts.append(stmt)
+            stack[i] = (TEMP, k)
+        def hold_all():
+            """Evaluate everything pending before a statement with side effects, so data
+            is read and errors are raised in the same order as the stack engine."""
+            for i in range(len(stack)): hold(i)
+        def pop():
+            if stack: return stack.pop()
+            # take it off the vm's stack at this point in the block
+            k = temp()
+            def stmt(): temps[k] = runtime_stack.pop()
+            stmts.append(stmt)
+            return (TEMP, k)
+        def flush():
+            """The statement pushing what is left on the vm's stack at the end of a block."""
+            getters = [getter(node) for node in stack]
+            def stmt():
+                for g in getters: runtime_stack.push(g())
+            return stmt
+        def store(addr, value):
+            """Statement setting data[addr] = value, growing data as the stack engine does."""
+            if addr[0] == CONST and type(addr[1]) is int and 0 <= addr[1] < len(data):
+                a = addr[1]
+                if value[0] == CONST:
+                    c = value[1]
+                    def stmt(): data[a] = c
+                elif value[0] == REG:
+                    b = value[1]
+                    def stmt(): data[a] = data[b]
+                else:
+                    g = getter(value)
+                    def stmt(): data[a] = g()
+            else:
+                ga, gv = getter(addr), getter(value)
+                def stmt():
+                    a = ga()
+                    v = gv()
+                    while len(data) <= a: data.append(None)
+                    data[a] = v
+            stmts.append(stmt)
+        def binary(op, a, b):
+            f = binary_ops[op]
+            if a[0] == CONST and b[0] == CONST and not (op == 'div' and b[1] == 0):
+                try:
+                    return (CONST, f(a[1], b[1]))
+                except Exception:
+                    pass
+            if a[0] == REG and b[0] == CONST:
+                x, c = a[1], b[1]
+                return (EXPR, lambda: f(data[x], c))
+            if a[0] == REG and b[0] == REG:
+                x, y = a[1], b[1]
+                return (EXPR, lambda: f(data[x], data[y]))
+            ga = getter(a)
+            if b[0] == CONST:
+                c = b[1]
+                return (EXPR, lambda: f(ga(), c))
+            gb = getter(b)
+            def expr():
+                x = ga()
+                return f(x, gb())
+            return (EXPR, expr)
+
+        def indirect(addr):
+            if addr[0] == CONST: return (REG, addr[1])
+            g = getter(addr)
+            return (EXPR, lambda: data[g()])
+        def unary(op, a):
+            f = unary_ops[op]
+            if a[0] == CONST and type(a[1]) in (int, long, float): return (CONST, f(a[1]))
+            g = getter(a)
+            return (EXPR, lambda: f(g()))
+        def read_input():
+            hold_all()
+            k = temp()
+            def stmt():
+                vm.op_in(None)
+                temps[k] = runtime_stack.pop()
+            stmts.append(stmt)
+            return (TEMP, k)
+        def write_output(value):
+            g = getter(value)
+            hold_all()
+            def stmt():
+                runtime_stack.push(g())
+                vm.op_out(None)
+            stmts.append(stmt)
+        def exit_to(last, running=True):
+            """Exit continuing after last, ie at last + 1."""
+            hold_all()
+            fall_through = flush()
+            def exit():
+                fall_through()
+                vm.pc = last
+                vm.running = running
+            return exit
+        def exit_branch(target):
+            target = getter(target)
+            hold_all()
+            fall_through = flush()
+            def exit():
+                fall_through()
+                vm.pc = target() - 1
+            return exit
+        def exit_brf(target, cond, last):
+            target, cond = getter(target), getter(cond)
+            hold_all()
+            fall_through = flush()
+            def exit():
+                fall_through()
+                c = cond()
+                t = target()
+                if c == 0: vm.pc = t - 1
+                else: vm.pc = last
+            return exit
+
+        pc = entry
+        length = 0
+        exit = None
+        while exit is None:
+            if not (0 < pc < len(code)) or not code[pc] in vm.instr_set or \
+                    (code[pc] in immed and pc + 1 >= len(code)):
+                # let the vm execute it, raising the exception if there is one
+                if length == 0: return None
+                exit = exit_to(pc - 1)
+                break
+            op = code[pc]
+            arg = None
+            if op in immed: arg = code[pc+1]
+            if op == 'lit':
+                stack.append( (CONST, arg) )
+            elif op == 'load':
+                stack.append( (REG, arg) )
+            elif op == 'ldi':
+                stack.append( indirect(pop()) )
+            elif op == 'store':
+                value = pop()
+                hold_all()
+                store( (CONST, arg), value )
+            elif op == 'sti':
+                value = pop()
+                addr = pop()
+                hold_all()
+                store(addr, value)
+            elif op in binary_ops:
+                b = pop()
+                stack.append( binary(op, pop(), b) )
+            elif op in unary_ops:
+                stack.append( unary(op, pop()) )
+            elif op in ('inc', 'dec'):
+                stack.append( binary({'inc': 'add', 'dec': 'sub'}[op], pop(), (CONST, arg)) )
+            elif op == 'in':
+                stack.append( read_input() )
+            elif op == 'out':
+                write_output( pop() )
+            elif op == 'quit':
+                exit = exit_to(pc, running=False)
+            elif op == 'br':
+                exit = exit_branch( pop() )
+            elif op == 'brl':
+                exit = exit_branch( (CONST, arg) )
+            elif op == 'brf':
+                target = pop()
+                exit = exit_brf(target, pop(), pc)
+            else:
+                # an instruction this engine doesn't know, eg one added to the instr_set
+                if length == 0: return None
+                exit = exit_to(pc - 1)
+                break
+            length += 1
+            pc += 2 if op in immed else 1
+        return Block(entry, stmts, exit, length)
@@ -8,7 +8,7 @@
 
 """A scanner for the pycompiler project.
 """
-import sys, os, string, shutil
+import sys, os, string, shutil, re
 parent_dir = os.path.abspath( os.path.join(__file__, '../..') )
 if not parent_dir in sys.path:
     sys.path.append(parent_dir)
@@ -26,6 +26,14 @@ alphanum = letters + digits
 special = sorted( [ch for ch in set(string.printable) - 
                                 set(alphanum).union( set(string.whitespace) )] )
 
+# the master pattern for a token:  an integer, a word, or a special character.
+# The groups are numbered in that order, see Scanner.tokens(). An integer is a run of
+# digits that doesn't run into a letter, otherwise it is part of a word (eg 12abc).
+# Any other character (whitespace, control characters, etc) is skipped over.
+token_pattern = re.compile( r'([0-9]+)(?![A-Za-z0-9])|([A-Za-z0-9]+)|([%s])' % 
+                            ''.join([re.escape(ch) for ch in special]) )
+INT, WORD, SPECIAL = 1, 2, 3
+
 class Scanner:
     def __init__(self, srcfile=None,
                     tokfile='tokfile',
@@ -37,29 +45,43 @@ class Scanner:
         self.tokfile_path = tokfile
         self.tokfile = None
         self.reserved = ['declare', 'put', 'get', 'stop', 'goto', 'if', 'then', 'end', 'do',]
+        # line and column, both starting at 1, of the last token tokens() produced
+        self.line, self.column = 0, 0
         
         
     def scan(self):
         """Scans the sourcefile and produces the tokenfile."""
         self.tokfile = open(self.tokfile_path, 'w')
-        word = ''
+        for (name, value) in self.tokens():
+            self.print_tok(name, value)
+        self.tokfile.close()
+        
+    def tokens(self):
+        """Generator of the (name, value) tokens of the sourcefile, value is None for tokens
+        without one.  The source is read a line at a time, so this can feed a Parser 
+        directly--see Parser's tokensource--without a tokenfile in between.
+        Each line is tokenized in one pass by token_pattern.  While a token is being 
+        consumed, self.line and self.column give its position in the source.
+        """
+        reserved = dict( (word, '$' + word) for word in self.reserved )
+        finditer = token_pattern.finditer
+        lineno = 0
         for line in open(self.srcfile):
-            for ch in line:
-                if ch in alphanum: 
-                    word += ch
+            lineno += 1
+            self.line = lineno
+            for m in finditer(line):
+                self.column = m.start() + 1
+                kind = m.lastindex
+                if kind == SPECIAL:
+                    yield (m.group(), None)
+                elif kind == INT:
+                    yield ('$int', int(m.group()))
                 else:
-                    if word:
-                        try:
-                            self.print_tok('$int', int(word))
-                        except ValueError:
-                            if word in self.reserved: 
-                                self.print_tok('$' + word)
-                            else:
-                                self.print_tok('$id', word)
-                    if ch in special:
-                        self.print_tok(ch)
-                    word = ''
-        self.tokfile.close()
+                    word = m.group()
+                    if word in reserved: 
+                        yield (reserved[word], None)
+                    else:
+                        yield ('$id', word)
         
     def print_tok(self, name, value=None):
         """Print name and value or '' with lineseps to tokenfile."""
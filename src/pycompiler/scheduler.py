@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+"""A cooperative scheduler running many vms in one process.  See vm.py.  Each vm runs
+a quantum of instructions at a time with VM.run_quantum(), round robin.  A vm whose
+input is a QueueInput waits without blocking the others when it executes 'in' with
+nothing queued, and is run again once a value is put on the queue.  Each Session keeps
+the count of instructions its vm executed and the wall clock time it ran.
+"""
+import sys, os
+from collections import deque
+from timeit import default_timer
+parent_dir = os.path.abspath( os.path.join(__file__, '../..') )
+if not parent_dir in sys.path:
+    sys.path.append(parent_dir)
+__all__ = ['Scheduler', 'Session', 'QueueInput', 'InputPending',
+           'READY', 'WAITING', 'DONE', 'FAILED']
+
+from globals import *
+from util import *
+
+class InputPending(Exception):
+    """Raised by QueueInput.read() when there is nothing to read yet."""
+    pass
+
+# the states of a session
+READY, WAITING, DONE, FAILED = 'ready', 'waiting', 'done', 'failed'
+
+class QueueInput:
+    """An input channel, see channels.py, reading the values put on it.  read() raises
+    InputPending while it is empty, and EOFError once it is empty and closed."""
+    def __init__(self, values=()):
+        self.values = deque(values)
+        self.closed = False
+
+    def put(self, value):
+        self.values.append(value)
+
+    def close(self):
+        """No more values will be put."""
+        self.closed = True
+
+    def ready(self):
+        """Returns True if read() won't raise InputPending."""
+        return bool(self.values) or self.closed
+
+    def read(self):
+        if self.values: return self.values.popleft()
+        if self.closed: raise EOFError('QueueInput:  closed')
+        raise InputPending()
+
+
+class Session:
+    """A vm run by the Scheduler, with its accounting:  instructions it executed, time
+    it ran in seconds, and the number of quanta it was given.  state is READY, WAITING
+    (for input), DONE, or FAILED with the exception in error."""
+    def __init__(self, vm, name):
+        self.vm, self.name = vm, name
+        self.state = READY
+        self.error = None
+        self.instructions = 0
+        self.time = 0.0
+        self.quanta = 0
+
+    def __repr__(self):
+        return 'Session(%r, %s, %d instructions, %.6fs)' % (self.name, self.state,
+                                                           self.instructions, self.time)
+
+
+class Scheduler:
+    """Runs the vms added with add() quantum instructions at a time, in turn.  run()
+    runs them until none is ready, rounds() does the same a round at a time.
+    @param timer: returns the time in seconds, timeit.default_timer by default
+    """
+    def __init__(self, quantum=1000, timer=default_timer):
+        self.quantum = quantum
+        self.timer = timer
+        self.sessions = []
+        self.by_name = {}
+
+    def add(self, vm, name=None):
+        """Adds vm, its code and data already loaded (see VM.read_files()), and returns
+        its Session.  The vm starts running after its pc."""
+        if name is None: name = len(self.sessions)
+        if name in self.by_name:
+            raise ValueError('Scheduler:  there is already a session %r' % (name,))
+        session = Session(vm, name)
+        vm.running = True
+        self.sessions.append(session)
+        self.by_name[name] = session
+        return session
+
+    def feed(self, name, *values):
+        """Puts values on the QueueInput of the session name."""
+        for value in values: self.by_name[name].vm.input.put(value)
+
+    def run_session(self, session):
+        """Runs session's vm for a quantum, updating its state and accounting."""
+        vm = session.vm
+        start = self.timer()
+        try:
+            vm.run_quantum(self.quantum)
+            if not vm.running: session.state = DONE
+        except InputPending:
+            # back up to execute the 'in' again when there is input
+            vm.pc -= 1
+            vm.instr_count -= 1
+            session.state = WAITING
+        except Exception, msg:
+            session.state = FAILED
+            session.error = msg
+            vm.running = False
+        session.time += self.timer() - start
+        session.instructions = vm.instr_count
+        session.quanta += 1
+
+    def rounds(self):
+        """A generator running a round at a time, giving each ready session a quantum.
+        Yields the number of sessions run in the round, and stops when none was ready."""
+        while True:
+            n = 0
+            for session in self.sessions:
+                if session.state == WAITING and session.vm.input.ready():
+                    session.state = READY
+                if session.state == READY:
+                    self.run_session(session)
+                    n += 1
+            if not n: return
+            yield n
+
+    def run(self):
+        """Runs the sessions until each is done, failed, or waiting for input.  Returns
+        the sessions waiting, run() again after feeding them."""
+        for n in self.rounds(): pass
+        return [s for s in self.sessions if s.state == WAITING]
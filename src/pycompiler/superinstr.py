@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+"""Superinstructions for the vm.  See vm.py.  A superinstruction does the work of a
+sequence of instructions the translator emits over and over in one dispatch, eg
+'lit A ldi' loading variable A.  fuse() is the loader pass rewriting the decoded code
+to use them, run with VM(superinstructions=True).  profile() counts the n-grams of
+instructions a program executes, and profile_corpus() adds those up over a set of
+programs, which is how the sequences in superinstructions were picked.
+"""
+import sys, os
+from collections import deque, Counter
+parent_dir = os.path.abspath( os.path.join(__file__, '../..') )
+if not parent_dir in sys.path:
+    sys.path.append(parent_dir)
+__all__ = ['superinstructions', 'sequence_width', 'fuse', 'profile', 'profile_corpus']
+
+from globals import *
+from util import *
+
+# the sequences fused and the names of their superinstructions, longest first so the
+# longest sequence starting at an instruction wins.  Each is executed by the vm's
+# op_<name> method, see VM.get_super_instr_set().  Picked from profile_corpus() on
+# selection_sort.plh, where they cut the dispatches by about a third:
+#   lit A ldi        - the value of variable A
+#   lit A ldi br     - goto, A is the label's cell
+#   lit A lit B      - the address and value of an assignment, or an array base
+#   lit A lit B sti  - assignment of a constant
+#   lit A brf        - the branch of an if or while
+#   lit A add        - indexing an array, A its base
+superinstructions = [(('lit', 'ldi', 'br'), 'lit_ldi_br'),
+                     (('lit', 'lit', 'sti'), 'lit_lit_sti'),
+                     (('lit', 'ldi'), 'lit_ldi'),
+                     (('lit', 'lit'), 'lit_lit'),
+                     (('lit', 'brf'), 'lit_brf'),
+                     (('lit', 'add'), 'lit_add'),]
+
+def sequence_width(sequence, immed):
+    """Returns the number of code cells the sequence of ops takes.
+    @param immed: the ops with an immediate operand"""
+    return sum([2 if op in immed else 1 for op in sequence])
+
+def match(code, pc, sequence, immed):
+    """Returns the list of immediate operands of the sequence if it is at pc in code,
+    otherwise None."""
+    args = []
+    for op in sequence:
+        if pc >= len(code) or code[pc] != op: return None
+        if op in immed:
+            if pc + 1 >= len(code): return None
+            args.append(code[pc+1])
+            pc += 2
+        else:
+            pc += 1
+    return args
+
+def fuse(vm):
+    """Rewrites the vm's decoded code, see VM.decode(), so each instruction starting one
+    of the sequences in superinstructions becomes the superinstruction.  Its operand is
+    the tuple of the sequence's immediate operands, in the constant pool.  The rest of
+    the sequence is left decoded as it was, so a branch into the middle of it still
+    executes the same instructions."""
+    code, opcodes, operands, constants = vm.code, vm.opcodes, vm.operands, vm.constants
+    n_ops = len(vm.op_names)
+    immed = vm.immed_op_instructions
+    fused = [(sequence, vm.op_names.index(name)) for (sequence, name) in superinstructions]
+    pc = 1
+    while pc < len(code):
+        if opcodes[pc] % n_ops < 3:
+            # BAD_OP, END_OP or NO_OPERAND_OP, see vm.py
+            pc += 1
+            continue
+        for (sequence, opcode) in fused:
+            args = match(code, pc, sequence, immed)
+            if args is not None:
+                opcodes[pc] = opcode + n_ops
+                operands[pc] = len(constants)
+                constants.append(tuple(args))
+                break
+        pc += 2 if code[pc] in immed else 1
+
+def profile(vm, n=2):
+    """Executes the vm's decoded code until quit, as VM.run() does, and returns a Counter
+    of the n-grams of instructions executed, tuples of their names.  With the vm's
+    superinstructions on, the names are those of the superinstructions dispatched, so
+    profile(vm, 1) counts the dispatches."""
+    if vm.decoded_code is not vm.code: vm.decode()
+    opcodes, operands = vm.opcodes, vm.operands
+    instrs, widths = vm.decoded_instrs, vm.decoded_widths
+    names = vm.op_names + vm.op_names
+    counts = Counter()
+    last = deque(maxlen=n)
+    while vm.running:
+        pc = vm.pc + 1
+        opcode = opcodes[pc]
+        vm.pc = pc + widths[opcode] - 1
+        instrs[opcode](operands[pc])
+        last.append(names[opcode])
+        if len(last) == n: counts[tuple(last)] += 1
+    return counts
+
+def profile_corpus(vms, n=2):
+    """Returns the Counter of n-grams executed over all the vms, each read and ready to
+    run, see profile()."""
+    counts = Counter()
+    for vm in vms:
+        vm.running = True
+        counts.update(profile(vm, n))
+    return counts
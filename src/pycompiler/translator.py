@@ -18,6 +18,10 @@ from globals import *
 from util import *
 #from parser import *
 from pycompiler.parser import *
+from pycompiler.cache import load_compiled
+from pycompiler.optimizer import PeepholeOptimizer
+from pycompiler.pagedmem import PagedMemory, data_lines
+from pycompiler.plhc import write_program
 
 class  TransScheme(Grammar):
     """Translation scheme subclassed from Grammar, a TransScheme has action_symbols
@@ -29,6 +33,10 @@ class  TransScheme(Grammar):
             self.action_symbols = kwargs.pop('action_symbols') 
         Grammar.__init__(self, **kwargs)
     
+    def is_transparent(self, symbol):
+        """Action symbols derive nothing, so FIRST and FOLLOW look straight through them."""
+        return symbol in self.action_symbols
+    
     def __str__(self):
         """Adds action_symbols to Grammar's string representation."""
         lines = Grammar.__str__(self).splitlines(True)
@@ -43,10 +51,7 @@ class  TransScheme(Grammar):
     @staticmethod
     def create_ts(string_or_file):
         """Create a translation scheme from the string or file source."""
-        g = Grammar.create_grammar(string_or_file)
-        ts = TransScheme(terminals=g.terminals, nonterminals=g.nonterminals,
-                         rules=g.rules, parse_actions=g.pa, 
-                         start_symbol=g.start_symbol)
+        kwargs = Grammar.read_grammar(string_or_file)
         ts_string = string_or_file
         if os.path.exists(string_or_file):
             ts_string = open(string_or_file).read()
@@ -54,9 +59,17 @@ class  TransScheme(Grammar):
             if line.find('action_symbols') != -1:
                 rside = line.split('=', 1)[1].strip().replace("'", "")                
                 rside = [s.strip() for s in rside[1:-1].split(',')]
-                ts.action_symbols = [s for s in rside[:] if s]
+                kwargs['action_symbols'] = [s for s in rside[:] if s]
                 break
-        return ts
+        return TransScheme(**kwargs)
+    
+    @staticmethod
+    def load_ts(string_or_file):
+        """Same as create_ts(), but the translation scheme is compiled at most once per 
+        process and cached on disk between processes, see cache.py.  It is shared, so
+        don't modify it.
+        """
+        return load_compiled(string_or_file, TransScheme, TransScheme.create_ts)
     
     
 class  PlhTranslator(Parser):
@@ -68,10 +81,22 @@ class  PlhTranslator(Parser):
     """
     def __init__(self, codefile = 'codefile',
                  datafile = 'datafile',
+                 optimize = False,
+                 programfile = None,
+                 scanner = None,
                  **kwargs):
-        ## codefile and datafile are written out by the translator after parsing
+        """@param optimize: if True, the code is run through the PeepholeOptimizer
+        before it is written out, see optimizer.py
+        @param programfile: the compiled program written with the codefile and datafile,
+        see plhc.py, codefile + '.plhc' if not given
+        @param scanner: the Scanner the tokensource comes from, if given the program 
+        has a debug section with the source line of each code cell"""
+        ## codefile, datafile and programfile are written out by the translator after parsing
         self.codefile, self.datafile = codefile, datafile
-        kwargs['grammar'] = TransScheme.create_ts(os.path.join(grammardir, 'plh.ts'))
+        self.programfile = programfile or codefile + '.plhc'
+        self.optimize = optimize
+        self.scanner = scanner
+        kwargs['grammar'] = TransScheme.load_ts(os.path.join(grammardir, 'plh.ts'))
         Parser.__init__(self, **kwargs)
         
         # the symbol table, a dictionary keyed by identifier name 
@@ -88,14 +113,18 @@ class  PlhTranslator(Parser):
         self.actions_stack = Stack()
         # holds the value of the last token that was parsed
         self.last_token_val = None
-        # make sure code and data arrays (lists) start at index 1
+        # make sure code and data arrays start at index 1, data is paged memory
         self.code = [None]
-        self.data = [None]
+        self.data = PagedMemory()
+        # the source line of each code cell, with a scanner
+        self.lines = [0]
         
     def emit(self, elem):
         """Append elem to code.  Not type specific."""
         self.code.append(elem)
-        write_to('(%s appended to code array)\n' % str(elem),self.outfile)
+        if self.scanner: self.lines.append(self.scanner.line)
+        if self.trace >= TRACE_FULL:
+            write_to('(%s appended to code array)\n' % str(elem),self.outfile)
     
     def lookup_or_add(self, name, **kwargs):
         """Look up identifier by name in the symbol table.  If not found, insert
@@ -105,19 +134,13 @@ class  PlhTranslator(Parser):
         @return: the dictionary keyed to name in the symbol table
         """
         if not name in self.symbols:
-            ## naive memory storage--just append a null value to the list
-            ## and give that as the address for simple variables,
-            ## with the type default type 'intvar'
-            ## for arrays (or other sequences), append the size of the array
+            ## reserve the cells in the paged memory, nothing is allocated until
+            ## a cell is written, see pagedmem.py
+            ## simple variables get one cell, with the default type 'intvar',
+            ## arrays (or other sequences) get size cells
             ## the type will be changed by the update() if in **kwargs
-            self.data.append(None)
-            entry = {'address': len(self.data)-1,
+            entry = {'address': self.data.reserve(max(kwargs.get('size', 1), 1)),
                      'type': 'intvar'}
-            ## add size - 1 memory cells for non simple var.
-            if 'size' in kwargs: 
-                size = kwargs['size'] - 1
-                for i in range(size):
-                    self.data.append(None)
             # add other keys in entry
             entry.update(**kwargs)
             # add entry to symbol table
@@ -128,50 +151,56 @@ class  PlhTranslator(Parser):
     def parse(self):
         """Run the translator and write code and memory to codefile and datafile."""     
         Parser.parse(self) 
-        for (l, f) in [(self.code[1:], self.codefile),
-                       (self.data[1:], self.datafile)]:  
-            if l: open(f, 'w').write("\n".join( [str(elem) for elem in l] ))
+        if self.optimize:
+            self.code = PeepholeOptimizer(self.code, self.data, self.symbols).optimize()
+        if self.code[1:]:
+            open(self.codefile, 'w').write("\n".join( [str(elem) for elem in self.code[1:]] ))
+            debug = None
+            # the optimizer moves the code away from the lines
+            if self.scanner and not self.optimize:
+                debug = {'source': self.scanner.srcfile, 'lines': self.lines}
+            write_program(self.programfile, self.code, self.data, self.symbols, debug)
+        if len(self.data) > 1:
+            open(self.datafile, 'w').write("\n".join(data_lines(self.data, 1)))
         
     def execute_one_cycle(self):
         """Execute one cycle of the translator."""
-        stack = self.stack
         grammar = self.grammar
-        current_token = self.current_token
-        top = stack.top()['name']        
-        if top in grammar.nonterminals:
-            n = grammar.parse_action(top, current_token['name'])
+        sym_stack = self.sym_stack
+        top = sym_stack[-1]
+        kind = grammar.symbol_kinds[top]
+        if kind == NONTERMINAL:
+            n = grammar.id_table[top].get(self.current_id, -1)
             if n == -1:
                 write_to('reject', sys.stdout, self.outfile)
                 self.is_parsing = False
             else:
-                rulestr = "rule %s:   %s" % (n, ' -> '.join( grammar.rules[n]) )
-                write_to(rulestr, self.outfile)                
-                stack.pop()
-                stack.multipush( [{'name': name, 'value': ''} 
-                                  for name in grammar.rules[n][1].strip().split()] )               
-        elif top in grammar.terminals:
-            if top == current_token['name']:
-                matchstr = "matching: %s" % top               
-                stack.pop()
+                if self.trace:
+                    write_to("rule %s:   %s" % (n, ' -> '.join( grammar.rules[n]) ), 
+                             self.outfile)
+                sym_stack.pop()
+                sym_stack.extend(grammar.rule_pushes[n])
+        elif kind == TERMINAL:
+            if top == self.current_id:
+                sym_stack.pop()
                 self.last_token_val = self.current_token['value']
                 self.next_token()                
-                write_to(matchstr, self.outfile)
+                if self.trace:
+                    write_to("matching: %s" % grammar.symbol_names[top], self.outfile)
 
-            elif current_token['name'] == '#' and top == '%':
+            elif self.current_token['name'] == Grammar.end_marker and \
+                    grammar.symbol_names[top] == Grammar.bottom_marker:
                 write_to('accept', sys.stdout, self.outfile)
                 self.is_parsing = False
             else:
                 write_to('reject', sys.stdout, self.outfile)
                 self.is_parsing = False
-        elif top in grammar.action_symbols:
-            exec self.actions[top]
-            stack.pop()
+        elif kind == ACTION:
+            exec self.actions[grammar.symbol_names[top]]
+            sym_stack.pop()
             
-        if self.is_parsing:
-            stackstr = "stack:    %s\n" % token_stack_str(stack=self.stack, reverse=True)
-            tokstr =  "token:    %s      value:  %s\n" % (self.current_token['name'],
-                                                      self.current_token['value'])
-            write_to(stackstr + tokstr, self.outfile)
+        if self.is_parsing and self.trace >= TRACE_FULL:
+            write_to(self.snapshot(), self.outfile)
  
     def symbol_table_str(self):
         """Returns string version of the symbol table."""
@@ -234,7 +263,7 @@ for line in ['lit', address, 'ldi', 'br']: self.emit(line)""",
 '@label': """goto_line = len(self.code)
 label_address = self.lookup_or_add(self.last_token_val, type='label')['address']
 self.data[label_address] = goto_line
-write_to("(label  '%s':  set value of data[%d] to %d)%s" % (self.last_token_val, 
+if self.trace: write_to("(label  '%s':  set value of data[%d] to %d)%s" % (self.last_token_val, 
                                             label_address, goto_line, os.linesep), self.outfile)""",
 
 # use the actions stack for storage
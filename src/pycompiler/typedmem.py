@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+"""Integer specialized data memory and operand stack for the vm.  See vm.py.  IntMemory
+keeps the cells in an array('l') with a bitmap of the cells initialized, and IntStack
+keeps the stack in a preallocated array('l') with a stack pointer.  PL/H programs only
+deal in ints, but the vm allows any value, so the first value that isn't an int (a
+string, a float, a bool from 'not', an int too big for a C long) switches either
+one to a python list holding anything, the generic mode, for the rest of the run.
+Use them with VM(memory='typed').
+"""
+import sys, os
+from array import array
+parent_dir = os.path.abspath( os.path.join(__file__, '../..') )
+if not parent_dir in sys.path:
+    sys.path.append(parent_dir)
+__all__ = ['IntMemory', 'IntStack']
+
+from globals import *
+from util import *
+
+# the values kept in the arrays, bool is an int but prints differently
+int_types = (int, long)
+
+class IntMemory(object):
+    """Data memory indexed like the vm's data list, of the values in the list cells."""
+    def __init__(self, cells=(None,)):
+        self.generic = False
+        self.cells = array('l', [0]) * len(cells)
+        self.initialized = bytearray(len(cells))
+        for i, value in enumerate(cells):
+            if value is not None: self[i] = value
+
+    def to_generic(self):
+        """Switch to a list of python values."""
+        if not self.generic:
+            self.cells = [value for value in self]
+            self.initialized = None
+            self.generic = True
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __getitem__(self, i):
+        if self.generic: return self.cells[i]
+        if type(i) is slice: return [self[k] for k in range(*i.indices(len(self.cells)))]
+        if self.initialized[i]: return self.cells[i]
+        return None
+
+    def __getslice__(self, i, j):
+        return self[slice(i, j)]
+
+    def __setitem__(self, i, value):
+        if not self.generic and type(value) in int_types:
+            try:
+                self.cells[i] = value
+                self.initialized[i] = 1
+                return
+            except OverflowError:
+                pass
+        if value is None and not self.generic:
+            # back to uninitialized
+            self.initialized[i] = 0
+            return
+        self.to_generic()
+        self.cells[i] = value
+
+    def append(self, value):
+        self.extend([value])
+
+    def extend(self, values):
+        """Adds the values at the end, as list.extend()."""
+        n = len(self.cells)
+        if not self.generic:
+            self.cells.extend(array('l', [0]) * len(values))
+            self.initialized.extend(bytearray(len(values)))
+        else:
+            self.cells.extend([None] * len(values))
+        for i, value in enumerate(values):
+            if value is not None: self[n + i] = value
+
+    def __iter__(self):
+        for i in range(len(self.cells)): yield self[i]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'IntMemory(%r)' % list(self)
+
+
+class IntStack(object):
+    """The operand stack, with the same methods as util.Stack.  pop() and top() raise
+    AssertionError on an empty stack like Stack's.  data is a copy of the stack as a
+    list, bottom first."""
+    def __init__(self, capacity=256):
+        self.generic = False
+        self.cells = array('l', [0]) * capacity
+        self.sp = 0
+
+    def to_generic(self):
+        """Switch to a list of python values."""
+        if not self.generic:
+            self.cells = self.cells[:self.sp].tolist()
+            self.generic = True
+
+    def get_data(self):
+        if self.generic: return self.cells
+        return self.cells[:self.sp].tolist()
+    data = property(get_data)
+
+    def __str__(self):
+        return '\t'.join([str(item) for item in self.data])
+
+    def push(self, content):
+        if self.generic:
+            self.cells.append(content)
+            return
+        if type(content) in int_types:
+            try:
+                self.cells[self.sp] = content
+                self.sp += 1
+                return
+            except IndexError:
+                # full, double it
+                self.cells.extend(array('l', [0]) * len(self.cells))
+                return self.push(content)
+            except OverflowError:
+                pass
+        self.to_generic()
+        self.cells.append(content)
+
+    def pop(self):
+        if self.generic:
+            assert self.cells, "Stack:  pop() called on empty stack"
+            return self.cells.pop()
+        if self.sp == 0: raise AssertionError("Stack:  pop() called on empty stack")
+        self.sp -= 1
+        return self.cells[self.sp]
+
+    def top(self):
+        if self.generic:
+            assert self.cells,  "Stack: top() called on empty stack"
+            return self.cells[-1]
+        if self.sp == 0: raise AssertionError("Stack: top() called on empty stack")
+        return self.cells[self.sp - 1]
+
+    def multipush(self, list_of_elements):
+        for i in range(len(list_of_elements)-1, -1, -1):
+            self.push(list_of_elements[i])
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+"""A load time verifier for vm code, so run() can drop the runtime checks.  See vm.py.
+The Verifier follows every path through the code from pc 1, keeping the stack of each
+as abstract values: the constant pushed by a lit, the value of a data cell read by
+ldi at a constant address (the label cells of gotos), or unknown.  It checks that
+    every instruction reached is a known op, with its operand,
+    the stack never underflows and has the same depth wherever paths join,
+    brl and brf branch to an instruction, brf's target being a lit constant,
+    br branches through a lit or a label cell to an instruction,
+    load and store addresses are in data,
+and raises VerifyException otherwise.
+    A label cell could be changed by a store at a computed address, so br, unlike brf,
+is still checked when it runs: its target must be one the verifier followed, entered
+at the stack depth br leaves, or the vm goes on with its checked instructions.
+br_targets holds those depths, and a target of br is followed with the stack values
+unknown.
+"""
+import sys, os
+parent_dir = os.path.abspath( os.path.join(__file__, '../..') )
+if not parent_dir in sys.path:
+    sys.path.append(parent_dir)
+__all__ = ['Verifier', 'VerifyException']
+
+from globals import *
+from util import *
+from vmtrace import stack_effects
+
+class VerifyException(Exception): pass
+
+# abstract stack values, besides ('lit', value) and ('cell', value)
+UNKNOWN = ('unknown',)
+# ops after which the next instruction isn't reached by falling through
+branch_ops = ['br', 'brl', 'brf', 'quit']
+
+class Verifier:
+    """Verifies code, indexed from 1 like the vm's, using data for the addresses and
+    label cells.  After verify():
+        depths is the dictionary of each instruction reached to its stack depth
+        blocks the dictionary of the first pc of each basic block to
+            (stack depth entering it, maximum depth in it)
+        max_depth the maximum depth of the stack
+        br_targets the dictionary of the pcs br can branch to, to the depth at them
+    """
+    def __init__(self, code, data, instr_set, immed_op_instructions):
+        self.code, self.data = code, data
+        self.instr_set = instr_set
+        self.immed = set(immed_op_instructions)
+        self.depths = {}
+        self.blocks = {}
+        self.max_depth = 0
+        self.br_targets = {}
+
+    def verify(self):
+        """Verifies the code.  Returns self.
+        @raise VerifyException: on the first problem found"""
+        code = self.code
+        states = {1: ()}
+        work = [1]
+        leaders = set([1])
+        while work:
+            pc = work.pop()
+            stack = states[pc]
+            if not 0 < pc < len(code):
+                raise VerifyException('pc %d is past the end of the code' % pc)
+            op = code[pc]
+            try:
+                known = op in self.instr_set
+            except TypeError:
+                known = False
+            if not known or not op in stack_effects:
+                raise VerifyException('unknown operator %r at %d' % (op, pc))
+            arg = None
+            width = 1
+            if op in self.immed:
+                if pc + 1 >= len(code):
+                    raise VerifyException('%s at %d is missing its operand' % (op, pc))
+                arg = code[pc+1]
+                width = 2
+            pops, pushes = stack_effects[op]
+            if len(stack) < pops:
+                raise VerifyException('%s at %d pops %d from a stack of %d' %
+                                      (op, pc, pops, len(stack)))
+            popped, rest = stack[len(stack) - pops:], stack[:len(stack) - pops]
+            successors = []
+            if op == 'quit':
+                pass
+            elif op == 'brl':
+                successors.append( (self.target(arg, op, pc), rest) )
+            elif op == 'brf':
+                if popped[1][0] != 'lit':
+                    raise VerifyException('brf at %d has no lit target' % pc)
+                successors.append( (self.target(popped[1][1], op, pc), rest) )
+                successors.append( (pc + 1, rest) )
+            elif op == 'br':
+                if popped[0] == UNKNOWN:
+                    raise VerifyException('br at %d has no lit or label cell target' % pc)
+                target = self.target(popped[0][1], op, pc)
+                if self.br_targets.get(target, len(rest)) != len(rest):
+                    raise VerifyException('br to %d at stack depths %d and %d' %
+                                          (target, self.br_targets[target], len(rest)))
+                self.br_targets[target] = len(rest)
+                successors.append( (target, (UNKNOWN,) * len(rest)) )
+            else:
+                if op in ('load', 'store'): self.address(arg, op, pc)
+                if op == 'lit':
+                    pushed = (('lit', arg),)
+                elif op == 'ldi' and popped[0][0] == 'lit':
+                    pushed = (('cell', self.address(popped[0][1], op, pc)),)
+                else:
+                    pushed = (UNKNOWN,) * pushes
+                successors.append( (pc + width, rest + pushed) )
+            self.depths[pc] = len(stack)
+            self.max_depth = max(self.max_depth, len(stack), len(rest) + pushes)
+            if op in branch_ops:
+                leaders.update([s for (s, state) in successors])
+            for (successor, stack) in successors:
+                if self.merge(states, successor, stack, pc): work.append(successor)
+        self.find_blocks(leaders)
+        return self
+
+    def target(self, target, op, pc):
+        """Returns target if it is the pc of an instruction in the code."""
+        if type(target) is not int or not 0 < target < len(self.code):
+            raise VerifyException('%s at %d branches to %r, outside the code' % (op, pc, target))
+        return target
+
+    def address(self, address, op, pc):
+        """Returns the value in data at address, checking it's in data."""
+        if type(address) is not int or not 0 <= address < len(self.data):
+            raise VerifyException('%s at %d addresses %r, outside data of %d' %
+                                  (op, pc, address, len(self.data)))
+        return self.data[address]
+
+    def merge(self, states, pc, stack, source):
+        """Merges stack into the state at pc.  Returns True if the state changed."""
+        if not pc in states:
+            states[pc] = stack
+            return True
+        old = states[pc]
+        if len(old) != len(stack):
+            raise VerifyException('stack depths %d and %d join at %d, from %d' %
+                                  (len(old), len(stack), pc, source))
+        new = tuple([a if a == b and type(a[-1]) is type(b[-1]) else UNKNOWN
+                     for (a, b) in zip(old, stack)])
+        if new == old: return False
+        states[pc] = new
+        return True
+
+    def find_blocks(self, leaders):
+        """Fills in blocks from the depths of the instructions reached."""
+        leader = None
+        for pc in sorted(self.depths):
+            if pc in leaders or leader is None:
+                leader = pc
+                self.blocks[leader] = (self.depths[pc], self.depths[pc])
+            entry, deepest = self.blocks[leader]
+            self.blocks[leader] = (entry, max(deepest, self.depths[pc]))
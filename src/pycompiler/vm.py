@@ -8,26 +8,120 @@
 
 """Implementation of the virtual machine emulator"""
 
-__all__ = ['VM', 'VmException']
+__all__ = ['VM', 'VmException', 'make_pic']
 
 import os, sys
+from array import array
 from util import *
 from globals import *
+from superinstr import superinstructions, sequence_width, fuse
+from channels import make_input, ConsoleOutput
+from typedmem import IntMemory, IntStack
+from pagedmem import PagedMemory, read_data, write_data
+from memimage import ImageMemory, is_image, write_image
+from plhc import is_program, read_program
 
 class VmException(Exception): pass
+# raised by an unchecked br to a target the verifier didn't follow, see VM.run()
+class LeaveUnchecked(Exception): pass
+
+# opcodes decode() reserves ahead of the instruction set, see VM.decode()
+BAD_OP, END_OP, NO_OPERAND_OP = 0, 1, 2
+# range of an operand stored directly in the operands array, others go in the constant pool
+MIN_OPERAND, MAX_OPERAND = -2**31, 2**31 - 1
+# the ways run() can execute the code
+engines = ['stack', 'register', 'jit']
+# the ways execute() can trace to the outfile
+trace_formats = ['pic', 'delta']
+# the kinds of data memory and stack, see typedmem.py and pagedmem.py
+memory_modes = ['generic', 'typed', 'paged']
+
+def make_pic(stack, data, instruct=None, pc=0):
+    """Returns the picture VM.vm_pic() makes of a vm with the lists stack and data,
+    about to execute instruct at pc, eg 'lit  3', or None for no instruction line."""
+    nl = os.linesep
+    # width of first column
+    col_width = 9
+    s1 = "%-*s %s%s" % (col_width-1, "stack", '\t'.join([str(item) for item in stack]), nl)
+    s2 = "%-*s %s%s" % (col_width-1, "data",
+                      '\t'.join( [str(item) for item in data[1:]] ), nl )   
+    s3 = ""   
+    if instruct is not None:
+        s3 = "%-*s at  %d%s" % (col_width-1, instruct, pc, nl)
+    return "%s%s%s%s" % (s1, s2, s3, nl)
         
 class VM:
     """An instance of the virtual machine simulator."""
     def __init__(self, outfile=None, 
                  codefile='codefile', 
-                 datafile=None):
+                 datafile=None,
+                 engine='stack',
+                 superinstructions=False,
+                 profile=False,
+                 input=None,
+                 output=None,
+                 trace='pic',
+                 trace_ring=None,
+                 memory='generic',
+                 data_image=False,
+                 verify=True):
         """@param outfile: relative or absolute path of file to collect 
         vm snapshots during execution, if not given, no file will be created
-        @param codefile: the code to be read in
+        @param codefile: the code to be read in, a codefile or a compiled program
         @param datafile: if provided, the contents of memory, ie the data array,
         will be written to it
+        @param engine: 'stack', 'register', or 'jit', how run() executes the code, see 
+        regvm.py and jit.py.  With an outfile every instruction is executed by 
+        exec_current_instr() regardless
+        @param superinstructions: if True, run() on the stack engine executes common 
+        sequences of instructions with one dispatch, see superinstr.py
+        @param profile: if True, run() executes the code with a VmProfiler counting and
+        timing the instructions, left in self.profiler, see profiler.py.  The engine
+        isn't used then, and run() itself does no profiling otherwise
+        @param input: where 'in' reads from, an input channel or anything make_input()
+        takes, eg a list of values or a file descriptor, the console by default
+        @param output: the output channel 'out' writes to, eg a BufferedOutput or a 
+        ListOutput, printing to the console by default.  See channels.py
+        @param trace: how execute() traces to the outfile, 'pic' for a vm_pic() before
+        every instruction, 'delta' for the binary trace of vmtrace.py
+        @param trace_ring: with trace='delta', only the last trace_ring instructions
+        are written
+        @param memory: 'generic' for data and stack holding any values, 'typed' for 
+        the int arrays of typedmem.py, data sized from the datafile by read_files(),
+        which fall back to generic on the first value that isn't an int, or 'paged' for
+        the PagedMemory of pagedmem.py, which only allocates the pages written
+        @param data_image: if True, the datafile is written as a binary memory image,
+        see memimage.py.  A datafile that is an image already is always mapped as one,
+        and only the pages written are written back to it
+        @param verify: if True, run() on the stack engine first verifies the code with 
+        the Verifier of verifier.py, and runs verified code with the unchecked 
+        instructions of get_unchecked_instr_set().  Code that doesn't verify runs checked
         """
+        if not engine in engines:
+            raise VmException('Unknown engine %s, not one of %s' % (engine, engines))
+        if not trace in trace_formats:
+            raise VmException('Unknown trace %s, not one of %s' % (trace, trace_formats))
+        if not memory in memory_modes:
+            raise VmException('Unknown memory %s, not one of %s' % (memory, memory_modes))
+        self.memory = memory
+        self.engine = engine
+        # the other engines translate the code an instruction at a time
+        self.superinstructions = superinstructions and engine == 'stack'
+        # the RegisterEngine or TracingJit, made the first time it is run
+        self.register_engine = None
+        self.jit = None
+        self.profile = profile
+        self.profiler = None
+        # instructions executed by run_quantum()
+        self.instr_count = 0
+        # the Verifier of the code run() runs unchecked, or why it doesn't verify
+        self.verify = verify
+        self.verifier = None
+        self.verify_error = None
+        self.unchecked = None
+        self.unchecked_for = (None, None)
         self.stack = Stack()
+        if memory == 'typed': self.stack = IntStack()
         # running is True when the vm is executing
         self.running = False
         # pc is the program counter
@@ -38,12 +132,15 @@ class VM:
         # the same goes for memory, data storage in a list with index 1
         # note, load and store instructions must take care of initializing data, if required
         self.data = [None]
-        # the instruction set for the vm is a dictionary of ops matched to strings containing 
-        # executable statements
+        # the instruction set for the vm is a dictionary of ops matched to the bound methods
+        # executing them, each takes the immediate operand (None if the op has none)
         self.instr_set = self.get_instr_set()
         # contains a string indicating input or output on current instruction
         # that vm_pic will display and remove, or None if no io on curr instr
         self.io_on_previous_instr = None
+        # the channels 'in' and 'out' read and write values through
+        self.input = make_input(input)
+        self.output = output or ConsoleOutput()
         # possible values for above
         self.input_logstring =  "vm input --------> "
         self.output_logstring = "vm output -------> "
@@ -51,9 +148,17 @@ class VM:
         # see read_files for info on the code and data files
         self.codefile = codefile
         self.datafile = datafile
+        self.data_image = data_image
+        # the compiled program the codefile held, if it was one
+        self.program = None
         self.outfile = None
+        # the DeltaTracer execute() uses for trace='delta', made when it runs
+        self.trace, self.trace_ring = trace, trace_ring
+        self.trace_file = None
+        self.tracer = None
         try:
-            if outfile: self.outfile = open(outfile, 'w')
+            if outfile and trace == 'delta': self.trace_file = outfile
+            elif outfile: self.outfile = open(outfile, 'w')
         except Exception, msg:
             print >> sys.stderr, msg
         
@@ -64,6 +169,12 @@ class VM:
         self.immed_op_instructions = ['lit', 'load', 'store',
                                       'brl', 'inc', 'dec'] 
         
+        # the decoded form of self.code run() executes, see decode()
+        self.opcodes = None
+        self.operands = None
+        self.constants = []
+        self.decoded_code = None
+        
     
     def read_files(self): 
         """Read in the code and data files and store them into the code
@@ -73,29 +184,63 @@ class VM:
         code and data lists support these types.
             For this vm, a datafile only needs to be initialized if there is persistent 
         data to be read in.  The data array (list) will be written out to a datafile,
-        however, if one is specified.
+        however, if one is specified.  A line None*N in the datafile is N uninitialized
+        cells, see pagedmem.py.
+            The codefile can be a compiled program instead, see plhc.py, read in one go.
+        Its data is the initial data when there is no datafile to read.
         """
-        for line in open(self.codefile):
-            val = line.split()[0]
-            val = convert_from_str(val)
-            self.code.append(val)
+        if is_program(self.codefile):
+            self.program = read_program(self.codefile)
+            self.code = self.program.code
+        else:
+            for line in open(self.codefile):
+                val = line.split()[0]
+                val = convert_from_str(val)
+                self.code.append(val)
             
+        if self.memory == 'paged': self.data = PagedMemory(self.data)
         if self.datafile and os.path.exists(self.datafile):
-            for line in open(self.datafile):
-                val = line.split()[0]
-                self.data.append( convert_from_str(val) )         
+            if is_image(self.datafile):
+                self.data_image = True
+                self.data = ImageMemory(self.datafile)
+            else:
+                read_data(self.datafile, self.data)
+        elif self.program:
+            self.data = self.program.data
+            if self.memory != 'paged': self.data = self.data.tolist()
+        if self.memory == 'typed':
+            image = self.data
+            self.data = IntMemory(image)
+            # written back whole by write_image()
+            if isinstance(image, ImageMemory): image.map.close()
+        self.decode()
             
     def execute(self):
-        """Run the vm."""
+        """Run the vm.  Without an outfile the decoded fast path, run(), is used,
+        otherwise every instruction goes through exec_current_instr() to be logged,
+        by the DeltaTracer for trace='delta'.
+        The output channel is flushed when it stops."""
         self.read_files()
         self.running = True
-        if self.outfile: self.outfile.write(self.vm_pic())
-        while self.running:
-            self.exec_current_instr()            
-        if self.datafile:
-            out = open(self.datafile, 'w')
-            for line in self.data: out.write(str(line) + os.linesep)
-            out.close()
+        try:
+            if self.outfile: 
+                self.outfile.write(self.vm_pic())
+                while self.running:
+                    self.exec_current_instr()            
+            elif self.trace_file:
+                from vmtrace import DeltaTracer
+                self.tracer = DeltaTracer(self, self.trace_file, self.trace_ring)
+                self.tracer.run()
+            else:
+                self.run()
+        finally:
+            self.output.flush()
+        if isinstance(self.data, ImageMemory):
+            self.data.sync()
+        elif self.datafile and self.data_image:
+            write_image(self.data, self.datafile)
+        elif self.datafile:
+            write_data(self.data, self.datafile)
             
     def exec_current_instr(self):
         """Executes one cycle of execution.  Increments the program counter and executes
@@ -114,7 +259,10 @@ class VM:
                 outstring += self.vm_pic()
                 self.outfile.write(outstring)
             
-            exec self.instr_set[op]
+            instr = self.instr_set[op]
+            arg = None
+            if op in self.immed_op_instructions: arg = self.immed_op()
+            instr(arg)
         except KeyError, msg:
             msg = 'Unknown operator %s' % msg
             raise VmException(msg)
@@ -122,6 +270,175 @@ class VM:
             msg = str(msg) + '\nself.pc = %d, len(self.code) = %d' % (self.pc, len(self.code))
             raise VmException(msg)
         
+    def decode(self):
+        """Decodes self.code into the int arrays run() executes.  Both arrays are indexed
+        like self.code, so a branch target is the same offset in either form.
+            self.opcodes holds the opcode of the instruction at each position, its number 
+        in self.op_names.  Positions that aren't an instruction (index 0, operands, junk) 
+        get BAD_OP, and a sentinel END_OP is added past the end, so both raise VmException
+        only if they are ever executed.  An immediate op missing its operand at the end
+        of the code gets NO_OPERAND_OP.
+            self.operands holds the immediate operand of the instruction at the same 
+        position, 0 for instructions without one.  Operands that aren't ints in the 
+        range of array('i') (floats, strings, big ints) are appended to self.constants
+        instead and the op gets the opcode of its constant variant, which is the op's
+        opcode + len(self.op_names), with the index of the constant as operand.
+            With self.superinstructions, fuse() then rewrites the decoded code to use
+        the superinstructions, see superinstr.py.
+            Call decode() again after modifying self.code (read_files() calls it).
+        """
+        code = self.code
+        self.op_names = [None, None, None] + sorted(self.instr_set)
+        opcode_of = dict( (op, n) for n, op in enumerate(self.op_names) if op )
+        # the superinstructions only get opcodes, they never appear in the code
+        self.op_names += [name for (sequence, name) in superinstructions]
+        n_ops = len(self.op_names)
+        immed = set(self.immed_op_instructions)
+        self.constants = constants = []
+        opcodes = array('i', [BAD_OP]) * (len(code) + 1)
+        operands = array('i', [0]) * (len(code) + 1)
+        opcodes[len(code)] = END_OP
+        for pc in range(1, len(code)):
+            op = code[pc]
+            try:
+                opcode = opcode_of[op]
+            except (KeyError, TypeError):
+                continue
+            if op in immed:
+                if pc + 1 >= len(code):
+                    opcode = NO_OPERAND_OP
+                else:
+                    arg = code[pc+1]
+                    if type(arg) is int and MIN_OPERAND <= arg <= MAX_OPERAND:
+                        operands[pc] = arg
+                    else:
+                        operands[pc] = len(constants)
+                        constants.append(arg)
+                        opcode += n_ops
+            opcodes[pc] = opcode
+        self.opcodes, self.operands = opcodes, operands
+        self.decoded_code = code
+        
+        # the methods and widths indexed by opcode for run()
+        def bad_op(arg):
+            raise VmException('Unknown operator %r' % (self.code[self.pc],))
+        def end_op(arg):
+            raise VmException('pc past end of code, len(self.code) = %d' % len(self.code))
+        def no_operand_op(arg):
+            raise VmException('%s at %d is missing its operand' % (self.code[self.pc], self.pc))
+        def constant_op(instr):
+            return lambda arg: instr(constants[arg])
+        instr_set = dict(self.instr_set)
+        instr_set.update(self.get_super_instr_set())
+        instrs = [bad_op, end_op, no_operand_op] + \
+                 [instr_set[op] for op in self.op_names[3:]]
+        widths = [1] * n_ops
+        for opcode in range(3, n_ops):
+            if self.op_names[opcode] in immed: widths[opcode] = 2
+        for (sequence, name) in superinstructions:
+            widths[self.op_names.index(name)] = sequence_width(sequence, immed)
+        self.decoded_instrs = instrs + [constant_op(instr) for instr in instrs]
+        self.decoded_widths = widths + widths
+        if self.superinstructions: fuse(self)
+    
+    def run(self):
+        """Executes the decoded code until quit, starting after self.pc.  The loop only
+        indexes the int arrays made by decode(), which is called first if self.code has
+        been replaced since it was decoded.  Verified code runs unchecked, see 
+        unchecked_instrs(), until a br to a target the verifier didn't follow.
+        With engine='register' the RegisterEngine
+        runs the code instead, and with engine='jit' the TracingJit.  With profile the
+        VmProfiler runs it."""
+        if self.profile:
+            if not self.profiler:
+                from profiler import VmProfiler
+                self.profiler = VmProfiler(self)
+            self.profiler.run()
+            return
+        if self.engine == 'register':
+            if not self.register_engine:
+                from regvm import RegisterEngine
+                self.register_engine = RegisterEngine(self)
+            self.register_engine.run()
+            return
+        if self.engine == 'jit':
+            if not self.jit:
+                from jit import TracingJit
+                self.jit = TracingJit(self)
+            self.jit.run()
+            return
+        if self.decoded_code is not self.code: self.decode()
+        opcodes, operands = self.opcodes, self.operands
+        instrs, widths = self.decoded_instrs, self.decoded_widths
+        if self.verify: instrs = self.unchecked_instrs() or instrs
+        try:
+            while self.running:
+                try:
+                    while self.running:
+                        pc = self.pc + 1
+                        opcode = opcodes[pc]
+                        self.pc = pc + widths[opcode] - 1
+                        instrs[opcode](operands[pc])
+                except LeaveUnchecked:
+                    # the rest runs checked, from the target
+                    instrs = self.decoded_instrs
+        except IndexError, msg:
+            msg = str(msg) + '\nself.pc = %d, len(self.code) = %d' % (self.pc, len(self.code))
+            raise VmException(msg)
+        
+    def unchecked_instrs(self):
+        """Returns the decoded instructions with the unchecked instructions in place of
+        the checked ones if the code verifies, or None with the reason in 
+        self.verify_error.  Verified once for the decoded code and data."""
+        if self.unchecked_for[0] is self.decoded_code and self.unchecked_for[1] is self.data:
+            return self.unchecked
+        from verifier import Verifier, VerifyException
+        self.unchecked_for = (self.decoded_code, self.data)
+        self.unchecked = self.verifier = self.verify_error = None
+        # the unchecked instructions work on the list of a Stack
+        if not isinstance(self.stack, Stack):
+            self.verify_error = 'the stack is not a Stack'
+            return None
+        try:
+            self.verifier = Verifier(self.code, self.data, self.instr_set,
+                                     self.immed_op_instructions).verify()
+        except VerifyException, msg:
+            self.verify_error = str(msg)
+            return None
+        unchecked = self.get_unchecked_instr_set(self.verifier.br_targets)
+        constants = self.constants
+        def constant_op(instr):
+            return lambda arg: instr(constants[arg])
+        n_ops = len(self.op_names)
+        self.unchecked = instrs = list(self.decoded_instrs)
+        for (opcode, op) in enumerate(self.op_names):
+            if op in unchecked:
+                instrs[opcode] = unchecked[op]
+                instrs[opcode + n_ops] = constant_op(unchecked[op])
+        return instrs
+        
+    def run_quantum(self, quantum):
+        """Executes at most quantum instructions of the decoded code, as run() does on
+        the stack engine, stopping early on quit.  Returns the number executed, which
+        is added to self.instr_count, also if an instruction raises."""
+        if self.decoded_code is not self.code: self.decode()
+        opcodes, operands = self.opcodes, self.operands
+        instrs, widths = self.decoded_instrs, self.decoded_widths
+        n = 0
+        try:
+            while self.running and n < quantum:
+                pc = self.pc + 1
+                opcode = opcodes[pc]
+                self.pc = pc + widths[opcode] - 1
+                n += 1
+                instrs[opcode](operands[pc])
+        except IndexError, msg:
+            msg = str(msg) + '\nself.pc = %d, len(self.code) = %d' % (self.pc, len(self.code))
+            raise VmException(msg)
+        finally:
+            self.instr_count += n
+        return n
+        
     def immed_op(self):
         """Increments program counter and returns value of next code line."""
         self.pc = self.pc + 1
@@ -129,121 +446,226 @@ class VM:
     
     def vm_pic(self):
         """Returns a string containing a 3 line picture of the vm's state followed by a blank line."""
-        nl = os.linesep
-        # width of first column
-        col_width = 9
-        s1 = "%-*s %s%s" % (col_width-1, "stack", self.stack.__str__(), nl) 
-        s2 = "%-*s %s%s" % (col_width-1, "data",
-                          '\t'.join( [str(item) for item in self.data[1:]] ), nl )   
-        s3 = ""   
         instruct = self.code[self.pc]
         if instruct in self.instr_set.keys():
             if instruct in self.immed_op_instructions:
                 instruct = "%s  %s" % (instruct, self.code[self.pc + 1])
-            s3 = "%-*s at  %d%s" % (col_width-1, instruct, self.pc, nl)
-        
-        return "%s%s%s%s" % (s1, s2, s3, nl)
+        else:
+            instruct = None
+        return make_pic(self.stack.data, self.data, instruct, self.pc)
     
         
     def get_instr_set(self):
-        """Returns the instruction set as a dictionary of instructions as keys matched to executable
-        code."""
-
+        """Returns the instruction set as a dictionary of instructions as keys matched to the
+        methods executing them."""
         instr_set = {
-'quit':  """self.running = False""",
-'lit':   """self.stack.push( self.immed_op() )""",
-
+'quit': self.op_quit, 'lit': self.op_lit,
 ## storage instructions
-'load':  """self.stack.push( self.data[ self.immed_op() ] )""",
-'store': """address = self.immed_op()
-while len(self.data) <= address: self.data.append(None)
-self.data[address] = self.stack.pop()""",
-
-'ldi':   """self.stack.push( self.data[self.stack.pop()] )""",
-
-'sti':   """top = self.stack.pop()
-next = self.stack.pop()
-while len(self.data) <= next: self.data.append(None)
-self.data[ next ] = top""",
-
+'load': self.op_load, 'store': self.op_store, 'ldi': self.op_ldi, 'sti': self.op_sti,
 ## arithmetic instructions
-'add':  """self.stack.push(self.stack.pop() + self.stack.pop())""",
-
-'sub':  """top = self.stack.pop()
-self.stack.push(self.stack.pop() - top)""",
-
-'mult': """self.stack.push(self.stack.pop() * self.stack.pop())""",
-
-# div raises ZeroDivisionError exception if necessary
-'div':  """top = self.stack.pop()
-if top == 0:  raise ZeroDivisionError
-self.stack.push(self.stack.pop() / top)""",
-
-'neg':  """self.stack.push( -self.stack.pop() )""",
-
+'add': self.op_add, 'sub': self.op_sub, 'mult': self.op_mult, 'div': self.op_div, 
+'neg': self.op_neg,
 ## relational instructions
-'eq':   """top = self.stack.pop()
-self.stack.push(1 if self.stack.pop() == top else 0)""",
-
-'lt':   """top = self.stack.pop()
-self.stack.push(1 if self.stack.pop() < top else 0)""",
-
-'gt':   """top = self.stack.pop()
-self.stack.push(1 if self.stack.pop() > top else 0)""",
-
-'ne':   """top = self.stack.pop()
-self.stack.push(1 if self.stack.pop() != top else 0)""",
-
-'le':   """top = self.stack.pop()
-self.stack.push(1 if self.stack.pop() <= top else 0)""",
-
-'ge':   """top = self.stack.pop()
-self.stack.push(1 if self.stack.pop() >= top else 0)""",
-
+'eq': self.op_eq, 'lt': self.op_lt, 'gt': self.op_gt, 'ne': self.op_ne, 
+'le': self.op_le, 'ge': self.op_ge,
 ## branch instructions
-'br':   """self.pc = self.stack.pop() - 1""",
-'brl':  """self.pc = self.immed_op() - 1""",
-'brf':   """top = self.stack.pop()
-if self.stack.pop() == 0:  self.pc = top - 1""",
-
+'br': self.op_br, 'brl': self.op_brl, 'brf': self.op_brf,
 ## io instructions
-# in converts input to int if possible, otherwise it pushes a string
-'in':   """input = raw_input('> ')
-self.io_on_previous_instr = "%s%s" % (self.input_logstring, input)
-self.stack.push( convert_from_str(input) )""",
-
-# out outputs top of stack + newline to stdout
-'out':  """output = self.stack.pop()
-print output
-self.io_on_previous_instr = "%s%s" % (self.output_logstring, output)
-""",
-    
+'in': self.op_in, 'out': self.op_out,
 ## logical instructions
-'and':  """top = self.stack.pop()
-self.stack.push( self.stack.pop() and top )""",
-
-'or':   """top = self.stack.pop()
-self.stack.push( self.stack.pop() or top )""",
-
-'not':  """self.stack.push( not (self.stack.pop()) )""",
-
+'and': self.op_and, 'or': self.op_or, 'not': self.op_not,
 ## increment and decrement
-'inc':  """self.stack.push( self.stack.pop() + self.immed_op() )""",
-'dec':  """self.stack.push( self.stack.pop() - self.immed_op() )""",
-
+'inc': self.op_inc, 'dec': self.op_dec,
         }
-        ### Note--the code below works, but unless we are running a *long*
-        ##    program, or store the compiled code, it actually takes
-        ##    longer to execute because of the compile time, I believe
-        ##    So I'm commenting out
-        ###
-        # compile the code for efficiency, note that '\r\n' newlines
-        # on Windows must be converted to '\n' (silly Windows :) )
-#        for statements in instr_set.values():
-#            statements.replace('\r\n', '\n')
-#            compile(statements, '<string>', 'exec')
-        
         return instr_set
+    
+    def get_super_instr_set(self):
+        """Returns the superinstructions as a dictionary of their names matched to the
+        methods executing them.  Only run() executes them, each takes the tuple of the
+        immediate operands of the sequence it replaces, see superinstr.py."""
+        return {'lit_ldi_br': self.op_lit_ldi_br, 'lit_lit_sti': self.op_lit_lit_sti,
+                'lit_ldi': self.op_lit_ldi, 'lit_lit': self.op_lit_lit, 
+                'lit_brf': self.op_lit_brf, 'lit_add': self.op_lit_add,}
+    
+    def get_unchecked_instr_set(self, br_targets):
+        """Returns a dictionary of ops matched to functions executing them without the 
+        checks verified code doesn't need, on the list of the stack and on data: no empty
+        stack assertions, and load and store addresses known to be in data.  br still 
+        checks its target is one of br_targets, entered at the stack depth it leaves, 
+        as does the lit_ldi_br superinstruction, and raises LeaveUnchecked with the pc
+        set to the target if it isn't."""
+        stack, data = self.stack.data, self.data
+        push, pop = stack.append, stack.pop
+        vm = self
+        def lit(arg):   push(arg)
+        def load(arg):  push(data[arg])
+        def store(arg): data[arg] = pop()
+        def ldi(arg):   push(data[pop()])
+        def sti(arg):
+            top = pop()
+            next = pop()
+            if len(data) <= next: data.extend( [None] * (next + 1 - len(data)) )
+            data[next] = top
+        def add(arg):   push(pop() + pop())
+        def sub(arg):
+            top = pop()
+            push(pop() - top)
+        def mult(arg):  push(pop() * pop())
+        def div(arg):
+            top = pop()
+            if top == 0:  raise ZeroDivisionError
+            push(pop() / top)
+        def neg(arg):   push(-pop())
+        def eq(arg):
+            top = pop()
+            push(1 if pop() == top else 0)
+        def lt(arg):
+            top = pop()
+            push(1 if pop() < top else 0)
+        def gt(arg):
+            top = pop()
+            push(1 if pop() > top else 0)
+        def ne(arg):
+            top = pop()
+            push(1 if pop() != top else 0)
+        def le(arg):
+            top = pop()
+            push(1 if pop() <= top else 0)
+        def ge(arg):
+            top = pop()
+            push(1 if pop() >= top else 0)
+        def branch(target):
+            vm.pc = target - 1
+            if br_targets.get(target) != len(stack): raise LeaveUnchecked
+        def br(arg):    branch(pop())
+        def brl(arg):   vm.pc = arg - 1
+        def brf(arg):
+            top = pop()
+            if pop() == 0:  vm.pc = top - 1
+        def and_(arg):
+            top = pop()
+            push(pop() and top)
+        def or_(arg):
+            top = pop()
+            push(pop() or top)
+        def not_(arg):  push(not pop())
+        def inc(arg):   push(pop() + arg)
+        def dec(arg):   push(pop() - arg)
+        ## the superinstructions
+        def lit_ldi_br(args):  branch(data[args[0]])
+        def lit_lit_sti(args):
+            if len(data) <= args[0]: data.extend( [None] * (args[0] + 1 - len(data)) )
+            data[args[0]] = args[1]
+        def lit_ldi(args):  push(data[args[0]])
+        def lit_lit(args):
+            push(args[0])
+            push(args[1])
+        def lit_brf(args):
+            if pop() == 0:  vm.pc = args[0] - 1
+        def lit_add(args):  push(args[0] + pop())
+        return {'lit': lit, 'load': load, 'store': store, 'ldi': ldi, 'sti': sti,
+                'add': add, 'sub': sub, 'mult': mult, 'div': div, 'neg': neg,
+                'eq': eq, 'lt': lt, 'gt': gt, 'ne': ne, 'le': le, 'ge': ge,
+                'br': br, 'brl': brl, 'brf': brf, 'and': and_, 'or': or_, 'not': not_,
+                'inc': inc, 'dec': dec,
+                'lit_ldi_br': lit_ldi_br, 'lit_lit_sti': lit_lit_sti, 'lit_ldi': lit_ldi,
+                'lit_lit': lit_lit, 'lit_brf': lit_brf, 'lit_add': lit_add}
+    
+    ## the instructions--arg is the immediate operand, None for instructions without one
+    def op_quit(self, arg):  self.running = False
+    def op_lit(self, arg):   self.stack.push(arg)
+    
+    ## storage instructions
+    def op_load(self, arg):  self.stack.push( self.data[arg] )
+    def op_store(self, arg):
+        if len(self.data) <= arg: self.data.extend( [None] * (arg + 1 - len(self.data)) )
+        self.data[arg] = self.stack.pop()
+    def op_ldi(self, arg):   self.stack.push( self.data[self.stack.pop()] )
+    def op_sti(self, arg):
+        top = self.stack.pop()
+        next = self.stack.pop()
+        if len(self.data) <= next: self.data.extend( [None] * (next + 1 - len(self.data)) )
+        self.data[ next ] = top
+    
+    ## arithmetic instructions
+    def op_add(self, arg):   self.stack.push(self.stack.pop() + self.stack.pop())
+    def op_sub(self, arg):
+        top = self.stack.pop()
+        self.stack.push(self.stack.pop() - top)
+    def op_mult(self, arg):  self.stack.push(self.stack.pop() * self.stack.pop())
+    # div raises ZeroDivisionError exception if necessary
+    def op_div(self, arg):
+        top = self.stack.pop()
+        if top == 0:  raise ZeroDivisionError
+        self.stack.push(self.stack.pop() / top)
+    def op_neg(self, arg):   self.stack.push( -self.stack.pop() )
+    
+    ## relational instructions
+    def op_eq(self, arg):
+        top = self.stack.pop()
+        self.stack.push(1 if self.stack.pop() == top else 0)
+    def op_lt(self, arg):
+        top = self.stack.pop()
+        self.stack.push(1 if self.stack.pop() < top else 0)
+    def op_gt(self, arg):
+        top = self.stack.pop()
+        self.stack.push(1 if self.stack.pop() > top else 0)
+    def op_ne(self, arg):
+        top = self.stack.pop()
+        self.stack.push(1 if self.stack.pop() != top else 0)
+    def op_le(self, arg):
+        top = self.stack.pop()
+        self.stack.push(1 if self.stack.pop() <= top else 0)
+    def op_ge(self, arg):
+        top = self.stack.pop()
+        self.stack.push(1 if self.stack.pop() >= top else 0)
+    
+    ## branch instructions
+    def op_br(self, arg):    self.pc = self.stack.pop() - 1
+    def op_brl(self, arg):   self.pc = arg - 1
+    def op_brf(self, arg):
+        top = self.stack.pop()
+        if self.stack.pop() == 0:  self.pc = top - 1
+    
+    ## io instructions
+    # in pushes the next value from the input channel, on the console it converts 
+    # input to int if possible, otherwise it pushes a string
+    def op_in(self, arg):
+        input = self.input.read()
+        if self.outfile: self.io_on_previous_instr = "%s%s" % (self.input_logstring, input)
+        self.stack.push(input)
+    # out writes top of stack to the output channel, on the console + newline to stdout
+    def op_out(self, arg):
+        output = self.stack.pop()
+        self.output.write(output)
+        if self.outfile: self.io_on_previous_instr = "%s%s" % (self.output_logstring, output)
+    
+    ## logical instructions
+    def op_and(self, arg):
+        top = self.stack.pop()
+        self.stack.push( self.stack.pop() and top )
+    def op_or(self, arg):
+        top = self.stack.pop()
+        self.stack.push( self.stack.pop() or top )
+    def op_not(self, arg):   self.stack.push( not (self.stack.pop()) )
+    
+    ## increment and decrement
+    def op_inc(self, arg):   self.stack.push( self.stack.pop() + arg )
+    def op_dec(self, arg):   self.stack.push( self.stack.pop() - arg )
+    
+    ## superinstructions--args is the tuple of the immediate operands
+    def op_lit_ldi_br(self, args):  self.pc = self.data[args[0]] - 1
+    def op_lit_lit_sti(self, args):
+        if len(self.data) <= args[0]:
+            self.data.extend( [None] * (args[0] + 1 - len(self.data)) )
+        self.data[ args[0] ] = args[1]
+    def op_lit_ldi(self, args):  self.stack.push( self.data[args[0]] )
+    def op_lit_lit(self, args):
+        self.stack.push(args[0])
+        self.stack.push(args[1])
+    def op_lit_brf(self, args):
+        if self.stack.pop() == 0:  self.pc = args[0] - 1
+    def op_lit_add(self, args):  self.stack.push( args[0] + self.stack.pop() )
      
         
 if __name__ == '__main__':
@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+"""A binary delta trace of the vm's execution.  See vm.py.  Where vm_pic() writes the
+whole stack and data for every instruction, DeltaTracer records only what changed:
+the pc, the op and its operand, the values popped and pushed, and the data cells
+written.  The trace costs the same per instruction however big the data is.  In ring
+mode only the last N instructions are kept, in memory, and written when the run
+stops.  Run it with VM(outfile=..., trace='delta').
+    TraceReader reads a trace back, and pic(step) reconstructs the vm_pic() view
+before any step, render() the whole classic outfile.
+
+The file is TRACE_MAGIC, the op names, the number of the first step recorded, a
+snapshot of the pc, stack and data before it, then a record per instruction:
+    pc, op, flags, pops, pushes, writes    struct record_format
+    the operand                            if flags & HAS_ARG
+    the values popped, top last
+    the values pushed, top last
+    (address, old value, new value)        for each cell written
+    the length of data before              if flags & GREW
+Values are a type tag and the value, see write_value().
+"""
+import sys, os, struct
+from collections import deque
+parent_dir = os.path.abspath( os.path.join(__file__, '../..') )
+if not parent_dir in sys.path:
+    sys.path.append(parent_dir)
+__all__ = ['DeltaTracer', 'TraceReader', 'TraceException', 'TRACE_MAGIC']
+
+from globals import *
+from util import *
+from vm import VmException, make_pic
+
+class TraceException(Exception): pass
+
+TRACE_MAGIC = 'PLHT\x01'
+record_format = '<iHBIII'
+record_size = struct.calcsize(record_format)
+# record flags
+HAS_ARG, GREW = 1, 2
+
+# the values each op pops and pushes, an op not here (eg one added to the
+# instr_set) is recorded as popping the whole stack and pushing the whole stack after
+stack_effects = {'quit': (0, 0), 'lit': (0, 1), 'load': (0, 1), 'store': (1, 0),
+                 'ldi': (1, 1), 'sti': (2, 0),
+                 'add': (2, 1), 'sub': (2, 1), 'mult': (2, 1), 'div': (2, 1), 'neg': (1, 1),
+                 'eq': (2, 1), 'lt': (2, 1), 'gt': (2, 1), 'ne': (2, 1), 'le': (2, 1),
+                 'ge': (2, 1), 'br': (1, 0), 'brl': (0, 0), 'brf': (2, 0),
+                 'in': (0, 1), 'out': (1, 0), 'and': (2, 1), 'or': (2, 1), 'not': (1, 1),
+                 'inc': (1, 1), 'dec': (1, 1),}
+
+def write_value(value, out):
+    """Appends the encoding of value to the list of strings out."""
+    t = type(value)
+    if value is None: out.append('N')
+    elif t is bool: out.append('T' if value else 'F')
+    elif t in (int, long) and -2**63 <= value < 2**63: out.append('i' + struct.pack('<q', value))
+    elif t is float: out.append('d' + struct.pack('<d', value))
+    else:
+        tag, s = ('l', str(value)) if t is long else ('s', str(value))
+        out.append(tag + struct.pack('<I', len(s)) + s)
+
+def read_value(buf, i):
+    """Returns (value, index after it) for the value encoded at buf[i]."""
+    tag = buf[i]
+    if tag == 'N': return None, i + 1
+    if tag == 'T': return True, i + 1
+    if tag == 'F': return False, i + 1
+    if tag == 'i': return struct.unpack_from('<q', buf, i + 1)[0], i + 9
+    if tag == 'd': return struct.unpack_from('<d', buf, i + 1)[0], i + 9
+    if tag in 'ls':
+        n = struct.unpack_from('<I', buf, i + 1)[0]
+        s = buf[i+5:i+5+n]
+        return (long(s) if tag == 'l' else s), i + 5 + n
+    raise TraceException('bad value tag %r at %d' % (tag, i))
+
+def write_values(values, out):
+    out.append(struct.pack('<I', len(values)))
+    for value in values: write_value(value, out)
+
+def read_values(buf, i):
+    n = struct.unpack_from('<I', buf, i)[0]
+    i += 4
+    values = []
+    for k in range(n):
+        value, i = read_value(buf, i)
+        values.append(value)
+    return values, i
+
+
+class DeltaTracer:
+    """Executes the vm's code with exec_current_instr(), recording each instruction,
+    a tuple (pc, op, arg, pops, pushes, writes, old data length or None).
+    @param fname: the trace file
+    @param ring: if given, only the last ring instructions are kept
+    """
+    def __init__(self, vm, fname, ring=None):
+        self.vm = vm
+        self.fname = fname
+        self.ring = ring
+        self.records = deque(maxlen=ring) if ring else None
+        self.steps = 0
+        self.op_names = sorted(vm.instr_set)
+        self.op_index = dict( (op, n) for n, op in enumerate(self.op_names) )
+        self.out = None
+        if not ring:
+            self.out = open(fname, 'wb')
+            self.write_header(0, vm.pc, vm.stack.data, vm.data)
+
+    def write_header(self, first_step, pc, stack, data):
+        out = [TRACE_MAGIC]
+        write_values(self.op_names, out)
+        out.append(struct.pack('<ii', first_step, pc))
+        write_values(stack, out)
+        write_values(data, out)
+        self.out.write(''.join(out))
+
+    def write_record(self, record):
+        pc, op, arg, pops, pushes, writes, old_len = record
+        flags = (HAS_ARG if arg is not None else 0) | (GREW if old_len is not None else 0)
+        out = [struct.pack(record_format, pc, self.op_index[op], flags,
+                           len(pops), len(pushes), len(writes))]
+        if arg is not None: write_value(arg, out)
+        for value in pops: write_value(value, out)
+        for value in pushes: write_value(value, out)
+        for (addr, old, new) in writes:
+            out.append(struct.pack('<i', addr))
+            write_value(old, out)
+            write_value(new, out)
+        if old_len is not None: out.append(struct.pack('<i', old_len))
+        self.out.write(''.join(out))
+
+    def step(self):
+        """Executes and records the next instruction."""
+        vm = self.vm
+        code, stack, data = vm.code, vm.stack.data, vm.data
+        pc = vm.pc + 1
+        op = code[pc] if 0 < pc < len(code) else None
+        arg = None
+        if op in vm.immed_op_instructions and pc + 1 < len(code): arg = code[pc+1]
+        effect = stack_effects.get(op)
+        n_pops = effect[0] if effect else len(stack)
+        pops = stack[len(stack) - n_pops:]
+        old_len = len(data)
+        if op == 'store': addr = arg
+        elif op == 'sti' and len(stack) >= 2: addr = stack[-2]
+        else: addr = None
+        if effect:
+            old = data[addr] if type(addr) is int and 0 <= addr < old_len else None
+        else:
+            before = data[:]
+        vm.exec_current_instr()
+        if effect:
+            pushes = stack[len(stack) - effect[1]:] if effect[1] else []
+            writes = [(addr, old, data[addr])] if addr is not None else []
+        else:
+            pushes = stack[:]
+            writes = [(a, before[a] if a < old_len else None, data[a])
+                      for a in range(len(data)) if a >= old_len or data[a] != before[a]]
+        record = (pc, op, arg, pops, pushes, writes,
+                  old_len if len(data) != old_len else None)
+        self.steps += 1
+        if self.out: self.write_record(record)
+        else: self.records.append(record)
+
+    def run(self):
+        """Executes the code until quit, then writes the rest of the trace and closes it."""
+        try:
+            while self.vm.running:
+                self.step()
+        finally:
+            self.close()
+
+    def close(self):
+        """Writes out the ring, from the state before its first record, found by undoing
+        the records from the vm's state now.  If an instruction raised an exception
+        part way, what it had done is not undone."""
+        if self.records is not None:
+            stack, data = self.vm.stack.data[:], self.vm.data[:]
+            pc = self.vm.pc
+            for (rpc, op, arg, pops, pushes, writes, old_len) in reversed(self.records):
+                for (addr, old, new) in reversed(writes): data[addr] = old
+                if old_len is not None: del data[old_len:]
+                if pushes: del stack[len(stack) - len(pushes):]
+                stack.extend(pops)
+                pc = rpc - 1
+            self.out = open(self.fname, 'wb')
+            self.write_header(self.steps - len(self.records), pc, stack, data)
+            for record in self.records: self.write_record(record)
+            self.records = None
+        if self.out:
+            self.out.close()
+
+
+class TraceReader:
+    """Reads a trace file written by DeltaTracer.  records is the list of
+    (pc, op, arg, pops, pushes, writes, old data length or None), first_step the number
+    of the first, and pc, stack, data the state before it."""
+    def __init__(self, fname):
+        buf = open(fname, 'rb').read()
+        if not buf.startswith(TRACE_MAGIC):
+            raise TraceException('%s is not a vm trace' % fname)
+        i = len(TRACE_MAGIC)
+        op_names, i = read_values(buf, i)
+        self.first_step, self.pc = struct.unpack_from('<ii', buf, i)
+        self.stack, i = read_values(buf, i + 8)
+        self.data, i = read_values(buf, i)
+        self.records = []
+        while i < len(buf):
+            pc, op, flags, n_pops, n_pushes, n_writes = struct.unpack_from(record_format, buf, i)
+            i += record_size
+            arg = None
+            if flags & HAS_ARG: arg, i = read_value(buf, i)
+            values = []
+            for k in range(n_pops + n_pushes):
+                value, i = read_value(buf, i)
+                values.append(value)
+            writes = []
+            for k in range(n_writes):
+                addr = struct.unpack_from('<i', buf, i)[0]
+                old, i = read_value(buf, i + 4)
+                new, i = read_value(buf, i)
+                writes.append( (addr, old, new) )
+            old_len = None
+            if flags & GREW:
+                old_len = struct.unpack_from('<i', buf, i)[0]
+                i += 4
+            self.records.append( (pc, op_names[op], arg, values[:n_pops], values[n_pops:],
+                                  writes, old_len) )
+
+    def states(self):
+        """Yields (step, record, stack, data) with the state before each record, and
+        last (step after the last, None, stack, data).  The lists are reused."""
+        stack, data = self.stack[:], self.data[:]
+        step = self.first_step
+        for record in self.records:
+            yield step, record, stack, data
+            pc, op, arg, pops, pushes, writes, old_len = record
+            if pops: del stack[len(stack) - len(pops):]
+            stack.extend(pushes)
+            for (addr, old, new) in writes:
+                while len(data) <= addr: data.append(None)
+                data[addr] = new
+            step += 1
+        yield step, None, stack, data
+
+    def pic(self, step):
+        """Returns the vm_pic() of the state before step executed."""
+        for (n, record, stack, data) in self.states():
+            if n == step:
+                if record is None: return make_pic(stack, data)
+                return make_pic(stack, data, instr_str(record), record[0])
+        raise TraceException('step %d is not in the trace, it has %d to %d' %
+                             (step, self.first_step, self.first_step + len(self.records)))
+
+    def render(self, out):
+        """Writes the outfile the vm would have written for the steps in the trace to
+        the file out, including the input and output logged."""
+        nl = os.linesep
+        io = None
+        if self.first_step == 0: out.write(make_pic(self.stack, self.data))
+        for (n, record, stack, data) in self.states():
+            if record is None: break
+            if io: out.write(io + 2 * nl)
+            out.write(make_pic(stack, data, instr_str(record), record[0]))
+            pc, op, arg, pops, pushes, writes, old_len = record
+            # as VM.input_logstring and output_logstring
+            io = None
+            if op == 'in': io = "vm input --------> %s" % pushes[-1]
+            elif op == 'out': io = "vm output -------> %s" % pops[-1]
+
+def instr_str(record):
+    """Returns the instruction of record as vm_pic() shows it."""
+    pc, op, arg = record[:3]
+    if arg is not None: return '%s  %s' % (op, arg)
+    return op
@@ -0,0 +1,135 @@
+#!/usr/bin/env  python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+import os, sys, StringIO, glob
+import unittest
+from pycompiler.globals import *
+from pycompiler.util import *
+from pycompiler.vm import VM
+from pycompiler.aot import *
+from pycompiler.aot import read_list
+from pycompiler.memimage import *
+from pycompiler.translator import *
+from pycompiler.scanner import *
+
+class TestAotCompiler(unittest.TestCase):
+
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.codefile = os.path.join(tempdir, 'aot_codefile')
+        self.datafile = os.path.join(tempdir, 'aot_datafile')
+        self.remove_files()
+
+    def tearDown(self):
+        unittest.TestCase.tearDown(self)
+        self.remove_files()
+
+    def remove_files(self):
+        for f in glob.glob(self.codefile + '*') + glob.glob(self.datafile + '*'):
+            os.remove(f)
+
+    def translate(self, srcfile):
+        old_stdout = sys.stdout
+        try:
+            sys.stdout = StringIO.StringIO()
+            trans = PlhTranslator(tokensource=Scanner(srcfile=srcfile).tokens(),
+                                  codefile=self.codefile, datafile=self.datafile)
+            trans.parse()
+        finally:
+            sys.stdout = old_stdout
+        return trans
+
+    def capture(self, function, input, *args):
+        """Returns (stdout, return value) of function(*args) reading input."""
+        old_stdout, old_stdin = sys.stdout, sys.stdin
+        try:
+            sys.stdout = StringIO.StringIO()
+            sys.stdin = StringIO.StringIO(input)
+            ret = function(*args)
+            return sys.stdout.getvalue(), ret
+        finally:
+            sys.stdout, sys.stdin = old_stdout, old_stdin
+
+    def test_blocks(self):
+        code = [None, 'in', 'store', 1, 'load', 1, 'lit', 12, 'brf', 'lit', 1, 'out',
+                'load', 1, 'out', 'quit']
+        compiler = AotCompiler(code)
+        self.assertEqual(compiler.leaders, [1, 9, 12])
+        self.assertEqual([len(block) for block in compiler.blocks()], [5, 2, 3])
+
+    def test_runs_like_the_vm(self):
+        self.translate(os.path.join(srcfiledir, 'selection_sort.plh'))
+        data = open(self.datafile).read()
+        input = '5\n3\n9\n1\n4\n'
+        vm = VM(codefile=self.codefile, datafile=self.datafile)
+        vm_out, ret = self.capture(vm.execute, input)
+        open(self.datafile, 'w').write(data)
+        aot_out, aot_data = self.capture(run_codefile, input, self.codefile, self.datafile)
+        self.assertEqual(aot_out, vm_out)
+        self.assertEqual(aot_data, vm.data)
+        self.assertTrue(os.path.exists(aot_path(self.codefile)))
+
+    def test_module_is_cached_next_to_the_codefile(self):
+        self.translate(os.path.join(srcfiledir, 'selection_sort.plh'))
+        module = load_codefile(self.codefile, self.datafile)
+        path = aot_path(self.codefile)
+        source = open(path).read()
+        self.assertNotEqual(source.find('def block_1(data, stack):'), -1)
+        self.assertNotEqual(source.find("CODE_KEY = '%s'" % module.CODE_KEY), -1)
+        # the variables in the datafile changing doesn't recompile
+        open(path, 'a').write('\n# still the cached module\n')
+        data = open(self.datafile).read().split('\n')
+        self.assertEqual(data[6], 'None')
+        data[6] = '42'
+        open(self.datafile, 'w').write('\n'.join(data))
+        load_codefile(self.codefile, self.datafile)
+        self.assertNotEqual(open(path).read().find('# still the cached module'), -1)
+        # changing the code does
+        open(self.codefile, 'a').write('\nquit')
+        load_codefile(self.codefile, self.datafile)
+        self.assertEqual(open(path).read().find('# still the cached module'), -1)
+
+    def test_data_shorter_than_compiled_for(self):
+        srcfile = self.codefile + '_src.plh'
+        open(srcfile, 'w').write('x=5; put x; stop;')
+        self.translate(srcfile)
+        vm_out, ret = self.capture(VM(codefile=self.codefile).execute, '')
+        self.assertEqual(self.capture(run_codefile, '', self.codefile, self.datafile)[0],
+                         vm_out)
+        # the module compiled for the datafile isn't the one run without it
+        module = load_codefile(self.codefile, self.datafile)
+        self.assertEqual(self.capture(run_codefile, '', self.codefile)[0], vm_out)
+        self.assertEqual(self.capture(module.run, '')[0], vm_out)
+
+    def test_image_datafile(self):
+        # adds 1 to data[1] and outputs it
+        code = ['load', 1, 'lit', 1, 'add', 'store', 1, 'load', 1, 'out', 'quit']
+        open(self.codefile, 'w').write('\n'.join([str(c) for c in code]))
+        write_image([None, 7, 'abc', 3.5], self.datafile)
+        data = read_list(self.datafile)
+        self.assertEqual(data, [None, 7, 'abc', 3.5])
+        data.close()
+        for expected in (['8\n', [None, 8, 'abc', 3.5]], ['9\n', [None, 9, 'abc', 3.5]]):
+            out, data = self.capture(run_codefile, '', self.codefile, self.datafile)
+            self.assertEqual([out, data], expected)
+            data.close()
+            self.assertTrue(is_image(self.datafile))
+
+    def test_errors_when_reached(self):
+        source = AotCompiler([None, 'lit', 1, 'out', 'quit', 'kilroy']).generate()
+        module = {}
+        exec source in module
+        out, data = self.capture(module['run'], '')
+        self.assertEqual(out, '1\n')
+        source = AotCompiler([None, 'lit', 1, 'kilroy', 'quit']).generate()
+        exec source in module
+        self.assertRaises(module['AotException'], module['run'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env  python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+import os, sys, StringIO
+import unittest
+from pycompiler.globals import *
+from pycompiler.util import *
+from pycompiler.batch import *
+from pycompiler.channels import *
+from pycompiler.vm import *
+
+class TestBatchExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.srcfile = os.path.join(srcfiledir, 'selection_sort.plh')
+        self.inputs = [[5, 3, 9, 1, 4], [20, 19, 18, 17, 16], [1, 2, 3, 4, 5]]
+        self.workdir = os.path.join(tempdir, 'test_batch_files')
+        self.old_stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.old_stdout
+
+    def add_jobs(self, batch):
+        for n, input in enumerate(self.inputs):
+            batch.add(self.srcfile, input, name='sort%d' % n)
+        # not enough input
+        batch.add(self.srcfile, [1, 2], name='short')
+
+    def check_results(self, results):
+        results = dict( (r['name'], r) for r in results )
+        self.assertEqual(sorted(results), ['short', 'sort0', 'sort1', 'sort2'])
+        for n, input in enumerate(self.inputs):
+            result = results['sort%d' % n]
+            self.assertEqual(result['status'], 0)
+            self.assertEqual(result['error'], None)
+            self.assertEqual(result['output'], ''.join(['%d\n' % i for i in sorted(input)]))
+            # the same count as running it alone
+            vm = VM(input=input, output=ListOutput())
+            trans_code, trans_data = self.batch.programs[0]
+            vm.code, vm.data = trans_code, list(trans_data)
+            vm.running = True
+            while vm.running: vm.run_quantum(100)
+            self.assertEqual(result['instructions'], vm.instr_count)
+        self.assertEqual(results['short']['status'], 1)
+        self.assertTrue(results['short']['error'].startswith('EOFError'))
+        self.assertEqual(results['short']['output'], '')
+
+    def test_compiles_each_source_once(self):
+        self.batch = BatchExecutor(processes=0, workdir=self.workdir)
+        self.add_jobs(self.batch)
+        self.assertEqual(len(self.batch.programs), 1)
+        self.assertEqual([job[1] for job in self.batch.jobs], [0, 0, 0, 0])
+
+    def test_run_in_process(self):
+        self.batch = BatchExecutor(processes=0, workdir=self.workdir)
+        self.add_jobs(self.batch)
+        self.check_results(list(self.batch.run()))
+
+    def test_run_on_a_pool(self):
+        self.batch = BatchExecutor(processes=2, workdir=self.workdir)
+        self.add_jobs(self.batch)
+        self.check_results(list(self.batch.run()))
+
+    def test_instruction_budget(self):
+        self.batch = BatchExecutor(processes=0, workdir=self.workdir, budget=10)
+        self.batch.add(self.srcfile, self.inputs[0])
+        result = list(self.batch.run())[0]
+        self.assertEqual(result['status'], 1)
+        self.assertTrue(result['error'].startswith('BatchException'))
+
+
+if __name__ == '__main__':
+    unittest.main()
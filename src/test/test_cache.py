@@ -0,0 +1,91 @@
+#!/usr/bin/env  python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+import os, sys, glob, shutil
+import unittest
+from pycompiler.globals import *
+from pycompiler.parser import *
+from pycompiler.translator import *
+from pycompiler import cache
+
+class TestGrammarCache(unittest.TestCase):
+
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.cachedir = os.path.join(tempdir, 'test_cache')
+        if os.path.exists(self.cachedir): shutil.rmtree(self.cachedir)
+        self.gfile = os.path.join(grammardir, 'gse3')
+        cache.clear_memo()
+
+    def tearDown(self):
+        unittest.TestCase.tearDown(self)
+        cache.clear_memo()
+
+    def load(self, source, cls=Grammar, create=Grammar.create_grammar):
+        return cache.load_compiled(source, cls, create, directory=self.cachedir)
+
+    def test_memo_loads_once_per_process(self):
+        g1 = self.load(self.gfile)
+        g2 = self.load(open(self.gfile).read())
+        self.assertTrue(g1 is g2)
+        self.assertEqual(len(glob.glob(os.path.join(self.cachedir, 'Grammar.*'))), 1)
+
+    def test_memo_hit_hashes_nothing(self):
+        gfile = os.path.join(self.cachedir, 'gse3')
+        os.mkdir(self.cachedir)
+        shutil.copy(self.gfile, gfile)
+        g1 = self.load(gfile)
+        old_cache_key = cache.cache_key
+        def no_hashing(*args):
+            self.fail('source hashed on a memo hit')
+        try:
+            cache.cache_key = no_hashing
+            self.assertTrue(self.load(gfile) is g1)
+        finally:
+            cache.cache_key = old_cache_key
+        # a changed file is hashed again
+        open(gfile, 'a').write('\n')
+        os.utime(gfile, (0, 0))
+        self.assertFalse(self.load(gfile) is g1)
+
+    def test_cache_file_round_trip(self):
+        g1 = self.load(self.gfile)
+        cache.clear_memo()
+        calls = []
+        def create(source):
+            calls.append(source)
+            return Grammar.create_grammar(source)
+        g2 = self.load(self.gfile, create=create)
+        self.assertEqual(calls, [])
+        self.assertFalse(g1 is g2)
+        self.assertEqual(g2.parse_table, g1.parse_table)
+        self.assertEqual(g2.rules, g1.rules)
+        self.assertEqual(g2.rhs, g1.rhs)
+        self.assertEqual(g2.first, g1.first)
+
+    def test_key_depends_on_content_and_class(self):
+        text = open(self.gfile).read()
+        self.assertNotEqual(cache.cache_key(text, Grammar),
+                            cache.cache_key(text + '\n', Grammar))
+        self.assertNotEqual(cache.cache_key(text, Grammar),
+                            cache.cache_key(text, TransScheme))
+
+    def test_load_ts(self):
+        tsfile = os.path.join(grammardir, 'plh.ts')
+        ts = self.load(tsfile, TransScheme, TransScheme.create_ts)
+        cache.clear_memo()
+        ts2 = self.load(tsfile, TransScheme, TransScheme.create_ts)
+        self.assertTrue(isinstance(ts2, TransScheme))
+        self.assertEqual(ts2.action_symbols, ts.action_symbols)
+        self.assertEqual(ts2.parse_table, TransScheme.create_ts(tsfile).parse_table)
+        # the translator shares the process wide translation scheme
+        self.assertTrue(TransScheme.load_ts(tsfile) is TransScheme.load_ts(tsfile))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env  python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+import os, sys, StringIO
+import unittest
+from pycompiler.globals import *
+from pycompiler.util import *
+from pycompiler.cfg import *
+from pycompiler.cfg import INITIAL
+from pycompiler.translator import *
+from pycompiler.scanner import *
+
+class TestControlFlowGraph(unittest.TestCase):
+
+    def test_selection_sort(self):
+        old_stdout = sys.stdout
+        try:
+            sys.stdout = StringIO.StringIO()
+            trans = PlhTranslator(
+                tokensource=Scanner(srcfile=os.path.join(srcfiledir,
+                                                         'selection_sort.plh')).tokens(),
+                codefile=os.path.join(tempdir, 'cfg_codefile'),
+                datafile=os.path.join(tempdir, 'cfg_datafile'))
+            trans.parse()
+        finally:
+            sys.stdout = old_stdout
+        for f in (trans.codefile, trans.datafile, trans.programfile):
+            os.remove(f)
+        cfg = ControlFlowGraph(trans.code, trans.data, trans.symbols)
+        labels = dict( (name, trans.data[entry['address']])
+                       for (name, entry) in trans.symbols.items() if entry['type'] == 'label' )
+        self.assertEqual(cfg.unresolved, [])
+        # each label starts a loop, the nextj loop inside the nexti loop
+        self.assertEqual(sorted(cfg.loops), sorted(labels.values()))
+        self.assertTrue(cfg.loops[labels['nextj']] < cfg.loops[labels['nexti']])
+        self.assertFalse(cfg.loops[labels['in']] & cfg.loops[labels['nexti']])
+        for (tail, header) in cfg.back_edges:
+            self.assertTrue(cfg.dominates(header, tail))
+        self.assertTrue(cfg.dominates(labels['in'], labels['nextj']))
+        self.assertFalse(cfg.dominates(labels['nextj'], labels['in']))
+        self.assertEqual(cfg.idom[cfg.rpo[0]], None)
+        # the second quit the translator emits is unreachable
+        self.assertEqual(cfg.order[-1], len(trans.code) - 1)
+        self.assertFalse(cfg.order[-1] in cfg.rpo)
+        # x(i) is read through computed addresses, i and j through constant ones
+        i = trans.symbols['i']['address']
+        self.assertTrue(len(cfg.uses[i]) > 1)
+        self.assertTrue(cfg.computed_uses and cfg.computed_defs)
+        self.assertEqual(cfg.defs[i][0][1], 1)
+
+    def test_diamond(self):
+        # if in then x = 1 else x = 2;  out x
+        code = [None, 'in', 'lit', 11, 'brf',           # 1
+                'lit', 1, 'store', 1, 'brl', 15,        # 5
+                'lit', 2, 'store', 1,                   # 11
+                'load', 1, 'out', 'quit']               # 15
+        cfg = ControlFlowGraph(code, [None, 0])
+        self.assertEqual(cfg.order, [1, 5, 11, 15])
+        self.assertEqual(cfg.blocks[1].succs, [11, 5])
+        self.assertEqual(sorted(cfg.blocks[15].preds), [5, 11])
+        self.assertEqual(cfg.block_of(9).start, 5)
+        self.assertEqual(cfg.idom, {1: None, 5: 1, 11: 1, 15: 1})
+        self.assertEqual((cfg.loops, cfg.back_edges), ({}, []))
+        self.assertEqual(cfg.defs, {1: [(7, 1), (13, 2)]})
+        self.assertEqual(cfg.uses, {1: [15]})
+        self.assertEqual(cfg.reaching_defs(15), set([7, 13]))
+        self.assertEqual(cfg.use_defs, {15: [7, 13]})
+        self.assertEqual(cfg.def_uses, {7: [15], 13: [15]})
+
+    def test_reaching_defs_around_a_loop(self):
+        # x = 0;  loop:  out x;  x = in;  if x then goto loop
+        code = [None, 'lit', 0, 'store', 1,             # 1
+                'load', 1, 'out', 'in', 'store', 1,     # 5
+                'load', 1, 'lit', 20, 'brf',            # 11
+                'lit', 2, 'ldi', 'br',                  # 16
+                'quit']                                 # 20
+        cfg = ControlFlowGraph(code, [None, 0, 5])
+        self.assertEqual(cfg.label_cells, set([2]))
+        self.assertEqual(cfg.order, [1, 5, 16, 20])
+        self.assertEqual(cfg.targets, {15: [20], 19: [5]})
+        self.assertEqual(cfg.loops, {5: set([5, 16])})
+        self.assertEqual(cfg.back_edges, [(16, 5)])
+        self.assertEqual(cfg.reaching_defs(5), set([3, 9]))
+        self.assertEqual(cfg.reaching_defs(11), set([9]))
+        self.assertEqual(cfg.uses[2], [18])
+        self.assertEqual(cfg.use_defs, {5: [3, 9], 11: [9], 18: [INITIAL]})
+        self.assertEqual(cfg.def_uses, {3: [5], 9: [5, 11]})
+
+    def test_label_cells(self):
+        # the goto at 9 branches to 11, or to 15 if the store at 3 changed the label
+        code = [None, 'lit', 15, 'store', 1, 'in', 'lit', 1, 'ldi', 'br',   # 1
+                'quit', 'lit', 1, 'out', 'quit', 'lit', 2, 'out', 'quit']  # 10
+        cfg = ControlFlowGraph(code, [None, 11])
+        self.assertEqual(cfg.targets[9], [11, 15])
+        self.assertEqual(cfg.unresolved, [])
+        self.assertEqual(cfg.order, [1, 10, 11, 15])
+        self.assertEqual(cfg.rpo, [1, 15, 11])
+        # a store of an unknown value makes the goto unresolved, and it could branch
+        # to any instruction
+        cfg = ControlFlowGraph([None, 'in', 'store', 1, 'lit', 1, 'ldi', 'br',
+                                'quit', 'lit', 1, 'out', 'quit'], [None, 9])
+        self.assertEqual(cfg.unresolved, [7])
+        self.assertEqual(cfg.order, [1, 2, 4, 6, 7, 8, 9, 11, 12])
+        self.assertEqual(cfg.targets[7], cfg.order)
+        self.assertEqual(cfg.blocks[7].succs, cfg.order)
+        self.assertEqual(cfg.uses[1], [6])
+
+    def test_unresolved_brf(self):
+        # the brf target is computed, 5 + 6 = 11, skipping the 'out' of 1
+        code = [None, 'in', 'lit', 5, 'in', 'add', 'brf', 'lit', 1, 'out', 'lit', 2, 'out', 'quit']
+        cfg = ControlFlowGraph(code, [None])
+        self.assertEqual(cfg.unresolved, [6])
+        self.assertTrue(10 in cfg.blocks[6].succs)
+        self.assertEqual(cfg.rpo[0], 1)
+        self.assertEqual(sorted(cfg.rpo), cfg.order)
+        # the brf could branch back to the top, a loop
+        self.assertEqual(sorted(cfg.loops[1]), [1, 2, 4, 5, 6])
+
+    def test_computed_stores(self):
+        # a store at a computed address may change the label, unless the symbols say
+        # which cells are labels
+        code = [None, 'in', 'in', 'sti', 'lit', 1, 'ldi', 'br', 'quit', 'lit', 1, 'out', 'quit']
+        self.assertEqual(ControlFlowGraph(code, [None, 9]).unresolved, [7])
+        symbols = {'l': {'type': 'label', 'address': 1}}
+        cfg = ControlFlowGraph(code, [None, 9], symbols)
+        self.assertEqual((cfg.unresolved, cfg.targets[7]), ([], [9]))
+        self.assertEqual(cfg.computed_defs, [3])
+
+    def test_bad_code(self):
+        self.assertRaises(CfgException, ControlFlowGraph, [None, 'in', 'lit'], [None])
+        self.assertRaises(CfgException, ControlFlowGraph, [None, 'brl', 2, 'quit'], [None])
+        self.assertRaises(CfgException, ControlFlowGraph,
+                          [None, 'lit', 1, 'ldi', 'br'], [None, 99])
+
+    def test_large_program(self):
+        # a chain of 20000 loops, nothing recurses on the size of the code
+        code = [None]
+        while len(code) < 200000:
+            start = len(code)
+            code += ['in', 'store', 1, 'load', 1, 'lit', start + 10, 'brf', 'brl', start]
+        code.append('quit')
+        cfg = ControlFlowGraph(code, [None, 0])
+        self.assertEqual(len(cfg.loops), 20000)
+        self.assertEqual(len(cfg.rpo), 40001)
+        self.assertEqual(cfg.reaching_defs(len(code) - 8), set([len(code) - 10]))
+
+
+if __name__ == '__main__':
+    unittest.main()
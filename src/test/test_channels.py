@@ -0,0 +1,125 @@
+#!/usr/bin/env  python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+import os, sys, StringIO
+import unittest
+from array import array
+from pycompiler.globals import *
+from pycompiler.util import *
+from pycompiler.vm import *
+from pycompiler.channels import *
+from pycompiler.interpreter import *
+
+# read n, then read and print n values doubled
+doubler = ['in', 'store', 1,
+           'load', 1, 'lit', 0, 'gt', 'lit', 26, 'brf',
+           'in', 'lit', 2, 'mult', 'out', 'load', 1, 'dec', 1, 'store', 1, 'brl', 4,
+           'quit', 'quit']
+
+def run_code(code, engine='stack', **vm_args):
+    vm = VM(engine=engine, **vm_args)
+    vm.code = [None] + code
+    vm.running = True
+    vm.run()
+    vm.output.flush()
+    return vm
+
+class TestInputChannels(unittest.TestCase):
+
+    def test_list_input_from_an_array(self):
+        channel = ListInput(array('i', [3, -4]))
+        self.assertEqual([channel.read(), channel.read()], [3, -4])
+        self.assertRaises(EOFError, channel.read)
+
+    def test_iterator_input(self):
+        channel = IteratorInput(xrange(2))
+        self.assertEqual([channel.read(), channel.read()], [0, 1])
+        self.assertRaises(EOFError, channel.read)
+
+    def test_file_input_with_values_split_across_blocks(self):
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, '12 345\n-6\n  7.5 abc\n89')
+        os.close(write_fd)
+        try:
+            channel = FileInput(read_fd, bufsize=3)
+            values = []
+            while True:
+                try: values.append(channel.read())
+                except EOFError: break
+        finally:
+            os.close(read_fd)
+        self.assertEqual(values, [12, 345, -6, 7.5, 'abc', 89])
+
+    def test_make_input(self):
+        self.assertTrue(isinstance(make_input(None), ConsoleInput))
+        self.assertTrue(isinstance(make_input([1]), ListInput))
+        self.assertTrue(isinstance(make_input(array('i')), ListInput))
+        self.assertTrue(isinstance(make_input(iter([1])), IteratorInput))
+        channel = ListInput([1])
+        self.assertTrue(make_input(channel) is channel)
+
+    def test_console_input_is_the_default(self):
+        old_stdout, old_stdin = sys.stdout, sys.stdin
+        try:
+            sys.stdout = StringIO.StringIO()
+            sys.stdin = StringIO.StringIO('1\n5\n')
+            run_code(doubler)
+            self.assertEqual(sys.stdout.getvalue(), '> > 10\n')
+        finally:
+            sys.stdout, sys.stdin = old_stdout, old_stdin
+
+
+class TestOutputChannels(unittest.TestCase):
+
+    def test_buffered_output_writes_in_blocks(self):
+        out = StringIO.StringIO()
+        channel = BufferedOutput(out, bufsize=8)
+        channel.write(123)
+        channel.write('ab')
+        self.assertEqual(out.getvalue(), '')
+        channel.write(4.5)
+        self.assertEqual(out.getvalue(), '123\nab\n4.5\n')
+        channel.write(6)
+        channel.flush()
+        self.assertEqual(out.getvalue(), '123\nab\n4.5\n6\n')
+
+    def test_list_output(self):
+        channel = ListOutput()
+        channel.write(1)
+        channel.write(2)
+        self.assertEqual(channel.values, [1, 2])
+
+    def test_vm_runs_without_a_console_on_every_engine(self):
+        for engine in ('stack', 'register', 'jit'):
+            output = ListOutput()
+            run_code(doubler, engine, input=[3, 1, 2, 3], output=output)
+            self.assertEqual(output.values, [2, 4, 6])
+
+    def test_vm_raises_EOFError_when_input_runs_out(self):
+        self.assertRaises(EOFError, run_code, doubler, input=[3, 1], output=ListOutput())
+
+    def test_execute_flushes_buffered_output(self):
+        codefile = os.path.join(tempdir, 'channels_codefile')
+        open(codefile, 'w').write('\n'.join([str(c) for c in doubler]) + '\n')
+        out = StringIO.StringIO()
+        try:
+            VM(codefile=codefile, input=[2, 10, 20], output=BufferedOutput(out)).execute()
+        finally:
+            os.remove(codefile)
+        self.assertEqual(out.getvalue(), '20\n40\n')
+
+    def test_interpreter_with_input(self):
+        outputdir = os.path.join(tempdir, 'channels_interp_files')
+        out = PlhInterpreter(outputdir=outputdir).run_file(
+            os.path.join(srcfiledir, 'selection_sort.plh'), interactive=False,
+            input=[5, 3, 9, 1, 4])
+        self.assertEqual(out, '1\n3\n4\n5\n9\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env  python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+import os, sys, StringIO, random
+import unittest
+from pycompiler.globals import *
+from pycompiler.util import *
+from pycompiler.vm import *
+from pycompiler.jit import *
+from pycompiler.translator import *
+from pycompiler.scanner import *
+
+# count to 1000 in data[1]
+counting_loop = ['lit', 0, 'store', 1,
+                 'lit', 1, 'lit', 1, 'ldi', 'lit', 1, 'add', 'sti',
+                 'lit', 1, 'ldi', 'lit', 1000, 'lt', 'lit', 25, 'brf', 'brl', 5, 'quit']
+
+def run_code(code, engine, data=None, input='', **jit_args):
+    """Runs the list code on a vm with the engine, returns (stdout, vm)."""
+    old_stdout, old_stdin = sys.stdout, sys.stdin
+    try:
+        sys.stdout = StringIO.StringIO()
+        sys.stdin = StringIO.StringIO(input)
+        vm = VM(engine=engine)
+        if engine == 'jit': vm.jit = TracingJit(vm, **jit_args)
+        vm.code = [None] + code
+        vm.data = [None] + (data or [])
+        vm.running = True
+        vm.run()
+        return sys.stdout.getvalue(), vm
+    finally:
+        sys.stdout, sys.stdin = old_stdout, old_stdin
+
+class TestTracingJit(unittest.TestCase):
+
+    def assertSameRun(self, code, data=None, input='', **jit_args):
+        stack_out, stack_vm = run_code(code, 'stack', data, input)
+        jit_out, jit_vm = run_code(code, 'jit', data, input, **jit_args)
+        self.assertEqual(jit_out, stack_out)
+        self.assertEqual(jit_vm.data, stack_vm.data)
+        self.assertEqual(jit_vm.stack.data, stack_vm.stack.data)
+        self.assertEqual(jit_vm.pc, stack_vm.pc)
+        return jit_out, jit_vm
+
+    def test_hot_loop_is_compiled(self):
+        out, vm = self.assertSameRun(counting_loop, [None])
+        self.assertEqual(vm.data[1], 1000)
+        self.assertEqual(vm.jit.traces.keys(), [5])
+        source = vm.jit.sources[5]
+        self.assertNotEqual(source.find('while 1:'), -1)
+        # the loop exit is a guard on the brf
+        self.assertNotEqual(source.find('== 0:'), -1)
+
+    def test_cold_loop_is_not_compiled(self):
+        out, vm = self.assertSameRun(counting_loop, [None], threshold=5000)
+        self.assertEqual(vm.jit.traces, {})
+
+    def test_too_long_trace_is_blacklisted(self):
+        out, vm = self.assertSameRun(counting_loop, [None], max_length=3)
+        self.assertEqual(vm.jit.traces, {})
+        self.assertEqual(vm.jit.blacklist, set([5]))
+
+    def test_big_sort_with_nested_loops(self):
+        src = open(os.path.join(srcfiledir, 'selection_sort.plh')).read()
+        src = src.replace('declare x(5)', 'declare x(60)').replace('numtosort=5',
+                                                                   'numtosort=60')
+        srcfile = os.path.join(tempdir, 'jit_sort.plh')
+        codefile = os.path.join(tempdir, 'jit_codefile')
+        datafile = os.path.join(tempdir, 'jit_datafile')
+        open(srcfile, 'w').write(src)
+        old_stdout = sys.stdout
+        try:
+            sys.stdout = StringIO.StringIO()
+            trans = PlhTranslator(tokensource=Scanner(srcfile=srcfile).tokens(),
+                                  codefile=codefile, datafile=datafile)
+            trans.parse()
+        finally:
+            sys.stdout = old_stdout
+            for f in (srcfile, codefile, datafile):
+                if os.path.exists(f): os.remove(f)
+        numbers = [random.randint(-1000, 1000) for i in range(60)]
+        input = ''.join(['%d\n' % n for n in numbers])
+        out, vm = self.assertSameRun(trans.code[1:], trans.data[1:], input, threshold=5)
+        self.assertEqual([int(line) for line in out.split('> ')[-1].split()],
+                         sorted(numbers))
+        self.assertTrue(vm.jit.traces)
+
+
+if __name__ == '__main__':
+    unittest.main()
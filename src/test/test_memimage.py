@@ -0,0 +1,128 @@
+#!/usr/bin/env  python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+import os, sys
+import unittest
+from pycompiler.globals import *
+from pycompiler.util import *
+from pycompiler.vm import *
+from pycompiler.pagedmem import *
+from pycompiler.memimage import *
+from pycompiler.channels import *
+
+# adds 1 to data[1], a counter kept between runs
+counter = ['load', 1, 'lit', 1, 'add', 'store', 1, 'load', 1, 'out', 'quit']
+
+class TestImageMemory(unittest.TestCase):
+
+    def setUp(self):
+        self.imagefile = os.path.join(tempdir, 'memimage_image')
+
+    def tearDown(self):
+        if os.path.exists(self.imagefile): os.remove(self.imagefile)
+
+    def test_values_round_trip(self):
+        cells = [None, 1, -2**62, 2**63, 2.5, 'abc', True, False, None]
+        write_image(cells, self.imagefile)
+        self.assertTrue(is_image(self.imagefile))
+        memory = ImageMemory(self.imagefile)
+        self.assertEqual(memory, cells)
+        self.assertEqual([type(value) for value in memory], [type(value) for value in cells])
+        self.assertEqual(memory.pages, {})
+        memory.map.close()
+
+    def test_writes_back_only_dirty_pages(self):
+        data = PagedMemory(page_size=4)
+        data.reserve(100000)
+        data[1], data[99999] = 10, 20
+        write_image(data, self.imagefile, page_size=4)
+        size = os.path.getsize(self.imagefile)
+        before = open(self.imagefile, 'rb').read()
+        memory = ImageMemory(self.imagefile)
+        self.assertEqual((len(memory), memory.page_size, memory[1], memory[99999]),
+                         (100001, 4, 10, 20))
+        memory[50001] = 7
+        self.assertEqual(memory.pages.keys(), [12500])
+        memory.sync()
+        self.assertEqual(memory.pages, {})
+        self.assertEqual(memory[50001], 7)
+        after = open(self.imagefile, 'rb').read()
+        self.assertEqual(len(after), size)
+        changed = [i for i in range(size) if before[i] != after[i]]
+        # a tag and the low byte of the int in the dirty page
+        self.assertEqual(len(changed), 2)
+        memory.map.close()
+
+    def test_growth_and_overflow(self):
+        write_image([None, 'abc', 3], self.imagefile)
+        memory = ImageMemory(self.imagefile)
+        memory.extend([None] * 3000)
+        memory.append(2**70)
+        memory[2] = 'def'
+        memory.sync()
+        expected = [None, 'abc', 'def'] + [None] * 3000 + [2**70]
+        self.assertEqual(memory, expected)
+        memory.close()
+        memory = ImageMemory(self.imagefile)
+        self.assertEqual(memory, expected)
+        self.assertEqual(memory.copy(), expected)
+        memory.close()
+
+    def test_not_an_image(self):
+        open(self.imagefile, 'w').write('1\n2\n')
+        self.assertFalse(is_image(self.imagefile))
+
+
+class TestVmImage(unittest.TestCase):
+
+    def setUp(self):
+        self.codefile = os.path.join(tempdir, 'memimage_codefile')
+        self.datafile = os.path.join(tempdir, 'memimage_datafile')
+        open(self.codefile, 'w').write('\n'.join([str(c) for c in counter]))
+        open(self.datafile, 'w').write('0\n' + 'None*5000\n')
+
+    def tearDown(self):
+        for f in (self.codefile, self.datafile):
+            if os.path.exists(f): os.remove(f)
+
+    def run_vm(self, **vm_args):
+        vm = VM(codefile=self.codefile, datafile=self.datafile, output=ListOutput(),
+                **vm_args)
+        vm.execute()
+        return vm
+
+    def test_datafile_persists_as_an_image(self):
+        vm = self.run_vm(data_image=True)
+        self.assertEqual(vm.output.values, [1])
+        self.assertTrue(is_image(self.datafile))
+        outputs = []
+        for (engine, memory) in [('stack', 'generic'), ('register', 'paged'),
+                                 ('jit', 'generic'), ('stack', 'typed')]:
+            vm = self.run_vm(engine=engine, memory=memory)
+            outputs.extend(vm.output.values)
+            self.assertTrue(is_image(self.datafile))
+        self.assertEqual(outputs, [2, 3, 4, 5])
+        memory = ImageMemory(self.datafile)
+        self.assertEqual(len(memory), 5002)
+        self.assertEqual(memory[1], 5)
+        memory.map.close()
+
+    def test_unchanged_image_is_not_written(self):
+        code = ['load', 1, 'out', 'quit']
+        open(self.codefile, 'w').write('\n'.join([str(c) for c in code]))
+        write_image([None, 41], self.datafile)
+        before = os.stat(self.datafile).st_mtime, open(self.datafile, 'rb').read()
+        os.utime(self.datafile, (0, 0))
+        vm = self.run_vm()
+        self.assertEqual(vm.output.values, [41])
+        self.assertEqual(os.stat(self.datafile).st_mtime, 0)
+        self.assertEqual(open(self.datafile, 'rb').read(), before[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env  python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+import os, sys, StringIO
+import unittest
+from pycompiler.globals import *
+from pycompiler.util import *
+from pycompiler.optimizer import *
+from pycompiler.translator import *
+from pycompiler.scanner import *
+from pycompiler.vm import VM
+
+def optimized(code, data=None, symbols=None):
+    return PeepholeOptimizer([None] + code, data or [None], symbols or {}).optimize()[1:]
+
+class TestPeepholeOptimizer(unittest.TestCase):
+
+    def test_fold_constants(self):
+        self.assertEqual(optimized(['lit', 2, 'lit', 3, 'mult', 'lit', 4, 'add', 'out', 'quit']),
+                         ['lit', 10, 'out', 'quit'])
+        self.assertEqual(optimized(['lit', 2, 'neg', 'lit', 3, 'lt', 'out', 'quit']),
+                         ['lit', 1, 'out', 'quit'])
+        # division by zero is left for the vm to raise
+        self.assertEqual(optimized(['lit', 2, 'lit', 0, 'div', 'out', 'quit']),
+                         ['lit', 2, 'lit', 0, 'div', 'out', 'quit'])
+
+    def test_direct_load_and_store(self):
+        # x = x + y
+        self.assertEqual(optimized(['lit', 1, 'lit', 1, 'ldi', 'lit', 2, 'ldi', 'add', 'sti',
+                                    'quit']),
+                         ['load', 1, 'load', 2, 'add', 'store', 1, 'quit'])
+        # x(i) = 5, the address is computed so sti stays
+        self.assertEqual(optimized(['lit', 3, 'lit', 1, 'ldi', 'add', 'lit', 5, 'sti', 'quit']),
+                         ['load', 1, 'inc', 3, 'lit', 5, 'sti', 'quit'])
+
+    def test_immediate_add_and_sub(self):
+        self.assertEqual(optimized(['load', 1, 'lit', 1, 'add', 'load', 2, 'lit', 7, 'sub',
+                                    'quit']),
+                         ['load', 1, 'inc', 1, 'load', 2, 'dec', 7, 'quit'])
+
+    def test_goto_through_label_cell_becomes_brl(self):
+        # :top: put 1; goto top;
+        symbols = {'top': {'address': 1, 'type': 'label'}}
+        data = [None, 1]
+        code = optimized(['lit', 1, 'out', 'lit', 1, 'ldi', 'br', 'quit'], data, symbols)
+        self.assertEqual(code, ['lit', 1, 'out', 'brl', 1])
+        self.assertEqual(data, [None, 1])
+
+    def test_branch_targets_are_relocated(self):
+        # if x = 0 then put 1; :done: stop;
+        symbols = {'done': {'address': 2, 'type': 'label'}}
+        data = [None, 0, 14]
+        code = ['lit', 1, 'ldi', 'lit', 0, 'eq', 'lit', 14, 'brf', 'lit', 1, 'out', 'quit',
+                'quit']
+        self.assertEqual(optimized(code, data, symbols),
+                         ['load', 1, 'lit', 0, 'eq', 'lit', 13, 'brf', 'lit', 1, 'out', 'quit',
+                          'quit'])
+        self.assertEqual(data, [None, 0, 13])
+
+    def test_no_rewrite_across_a_branch_target(self):
+        symbols = {'l': {'address': 1, 'type': 'label'}}
+        # data[1] = 3 is the address of the second lit, so the adds aren't folded into
+        # 'lit 5', but 'lit 3 add' starting at the target can still become 'inc 3'
+        code = optimized(['lit', 2, 'lit', 3, 'add', 'out', 'lit', 1, 'ldi', 'br'],
+                         [None, 3], symbols)
+        self.assertEqual(code, ['lit', 2, 'inc', 3, 'out', 'brl', 3])
+
+    def test_dead_code_after_quit(self):
+        self.assertEqual(optimized(['lit', 1, 'out', 'quit', 'lit', 2, 'out', 'quit']),
+                         ['lit', 1, 'out', 'quit'])
+
+    def test_computed_branch_leaves_code_alone(self):
+        code = ['lit', 4, 'lit', 1, 'add', 'br', 'quit']
+        old_stderr = sys.stderr
+        try:
+            sys.stderr = StringIO.StringIO()
+            self.assertEqual(optimized(code), code)
+        finally:
+            sys.stderr = old_stderr
+
+
+class TestOptimizedTranslation(unittest.TestCase):
+
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.srcfile = os.path.join(srcfiledir, 'selection_sort.plh')
+        self.files = {}
+
+    def tearDown(self):
+        unittest.TestCase.tearDown(self)
+        for f in self.files.values():
+            if os.path.exists(f): os.remove(f)
+
+    def translate(self, optimize):
+        codefile = os.path.join(tempdir, 'optimizer_codefile%d' % optimize)
+        datafile = os.path.join(tempdir, 'optimizer_datafile%d' % optimize)
+        self.files[codefile] = codefile
+        self.files[datafile] = datafile
+        scanner = Scanner(srcfile=self.srcfile)
+        old_stdout = sys.stdout
+        try:
+            sys.stdout = StringIO.StringIO()
+            trans = PlhTranslator(tokensource=scanner.tokens(), codefile=codefile,
+                                  datafile=datafile, optimize=optimize)
+            trans.parse()
+        finally:
+            sys.stdout = old_stdout
+        return trans
+
+    def run_vm(self, trans, input):
+        """Returns (stdout, number of instructions executed)"""
+        old_stdout, old_stdin = sys.stdout, sys.stdin
+        try:
+            sys.stdout = StringIO.StringIO()
+            sys.stdin = StringIO.StringIO(input)
+            vm = VM(codefile=trans.codefile)
+            vm.read_files()
+            vm.data = list(trans.data)
+            vm.running = True
+            count = 0
+            while vm.running:
+                vm.exec_current_instr()
+                count += 1
+            return sys.stdout.getvalue(), count
+        finally:
+            sys.stdout, sys.stdin = old_stdout, old_stdin
+
+    def test_optimizer_is_opt_in(self):
+        self.assertEqual(self.translate(False).code[-2:], ['quit', 'quit'])
+
+    def test_optimized_sort_runs_the_same_in_fewer_cycles(self):
+        plain, opt = self.translate(False), self.translate(True)
+        self.assertTrue(len(opt.code) < len(plain.code))
+        lit_ldi = [i for i in range(1, len(opt.code)-2)
+                   if opt.code[i] == 'lit' and opt.code[i+2] == 'ldi']
+        self.assertEqual(lit_ldi, [])
+        input = '5\n3\n9\n1\n4\n'
+        plain_out, plain_count = self.run_vm(plain, input)
+        opt_out, opt_count = self.run_vm(opt, input)
+        self.assertEqual(opt_out, plain_out)
+        self.assertTrue(opt_out.endswith('1\n3\n4\n5\n9\n'))
+        self.assertTrue(opt_count < plain_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env  python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+import os, sys, StringIO
+import unittest
+from pycompiler.globals import *
+from pycompiler.util import *
+from pycompiler.vm import *
+from pycompiler.pagedmem import *
+from pycompiler.channels import *
+from pycompiler.translator import *
+from pycompiler.scanner import *
+
+# a big array only touched at its ends
+big_array = """declare x(1000000);
+x(1)=7;
+x(1000000)=x(1)*6;
+put x(1000000);
+put x(500000);
+stop;"""
+
+class TestPagedMemory(unittest.TestCase):
+
+    def test_reserve_allocates_nothing(self):
+        memory = PagedMemory(page_size=4)
+        self.assertEqual(memory.reserve(1000000), 1)
+        self.assertEqual(len(memory), 1000001)
+        self.assertEqual(memory[999999], None)
+        memory[999999] = None
+        self.assertEqual(memory.pages, {})
+        memory[10] = 3
+        memory[-1] = 4
+        self.assertEqual(sorted(memory.pages), [2, 250000])
+        self.assertEqual((memory[10], memory[1000000], memory[9]), (3, 4, None))
+        self.assertRaises(IndexError, memory.__getitem__, 1000001)
+        self.assertRaises(IndexError, memory.__setitem__, 1000001, 1)
+
+    def test_list_methods(self):
+        memory = PagedMemory([None, 1, None], page_size=2)
+        memory.append('abc')
+        memory.extend([None] * 3 + [2.5])
+        cells = [None, 1, None, 'abc', None, None, None, 2.5]
+        self.assertEqual(memory, cells)
+        self.assertEqual(list(memory), cells)
+        self.assertEqual(memory[1:4], cells[1:4])
+        self.assertEqual(memory[::3], cells[::3])
+        self.assertEqual(list(memory.runs(1)), [(1, 1), (None, 1), ('abc', 1), (None, 3),
+                                                (2.5, 1)])
+        copy = memory.copy()
+        copy[1] = 5
+        self.assertEqual(memory[1], 1)
+        self.assertNotEqual(memory, copy)
+
+
+class TestDatafile(unittest.TestCase):
+
+    def setUp(self):
+        self.datafile = os.path.join(tempdir, 'pagedmem_datafile')
+
+    def tearDown(self):
+        if os.path.exists(self.datafile): os.remove(self.datafile)
+
+    def test_runs_of_None_are_one_line(self):
+        cells = [None, 1] + [None] * (RUN_MIN - 1) + [2] + [None] * 100000 + ['x']
+        memory = PagedMemory(cells)
+        for data in (cells, memory):
+            self.assertEqual(data_lines(data, 1),
+                             ['1'] + ['None'] * (RUN_MIN - 1) + ['2', 'None*100000', 'x'])
+            write_data(data, self.datafile)
+            self.assertEqual(read_data(self.datafile, [None])[1:], cells)
+            paged = read_data(self.datafile, PagedMemory())
+            self.assertEqual(paged[1:], cells)
+            self.assertEqual(len(paged.pages), 2)
+
+
+class TestBigDeclarations(unittest.TestCase):
+
+    def setUp(self):
+        self.srcfile = os.path.join(tempdir, 'pagedmem.plh')
+        self.codefile = os.path.join(tempdir, 'pagedmem_codefile')
+        self.datafile = os.path.join(tempdir, 'pagedmem_datafile')
+        open(self.srcfile, 'w').write(big_array)
+
+    def tearDown(self):
+        for f in (self.srcfile, self.codefile, self.datafile):
+            if os.path.exists(f): os.remove(f)
+
+    def test_translate_and_run(self):
+        old_stdout = sys.stdout
+        try:
+            sys.stdout = StringIO.StringIO()
+            trans = PlhTranslator(tokensource=Scanner(srcfile=self.srcfile).tokens(),
+                                  codefile=self.codefile, datafile=self.datafile)
+            trans.parse()
+        finally:
+            sys.stdout = old_stdout
+        self.assertEqual(len(trans.data), 1000002)
+        self.assertEqual(trans.data.pages, {})
+        self.assertEqual(open(self.datafile).read(), 'None*1000001')
+        for memory in ('paged', 'generic'):
+            open(self.datafile, 'w').write('None*1000001')
+            vm = VM(codefile=self.codefile, datafile=self.datafile, output=ListOutput(),
+                    memory=memory)
+            vm.execute()
+            self.assertEqual(vm.output.values, [42, None])
+            self.assertEqual(open(self.datafile).read().split(),
+                             ['None', 'None', '7', 'None*999998', '42'])
+        self.assertEqual(len(vm.data), 1000002)
+        self.assertEqual(len(VM(memory='paged').data), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
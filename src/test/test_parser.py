@@ -203,6 +203,30 @@ $int
         self.assertEqual(parser.current_token['name'], '$id')
         self.assertEqual(parser.current_token['value'], 'numtosort')
 
+    def test_tokens_from_iterator(self):
+        # a value that is also a token name is no problem when the tokens come paired
+        parser = pycompiler.parser.Parser(tokensource=[('$id', 'mt'), ('+', None), ('$id', 'e')])
+        parser.next_token()
+        self.assertEqual(parser.current_token, make_token('$id', 'mt'))
+        parser.next_token()
+        self.assertEqual(parser.current_token, make_token('+'))
+        parser.next_token()
+        self.assertEqual(parser.current_token, make_token('$id', 'e'))
+        parser.next_token()
+        self.assertEqual(parser.current_token, make_token('#'))
+        parser.next_token()
+        self.assertEqual(parser.current_token, None)
+        
+        parser = pycompiler.parser.Parser(tokensource=iter([('$id', 'mt'), ('+', None), 
+                                                            ('$id', 'e')]))
+        old_stdout = sys.stdout
+        try:
+            sys.stdout = StringIO.StringIO()
+            parser.parse()
+            self.assertNotEqual( sys.stdout.getvalue().find('accept'), -1 )
+        finally:
+            sys.stdout = old_stdout
+
         
 class TestGrammar(unittest.TestCase):
     
@@ -286,7 +310,54 @@ class TestGrammar(unittest.TestCase):
         self.assertEqual(index, 3)
         index = self.parser.grammar.parse_action(('t'), (')'))
         self.assertEqual(index, -1)
-    
+
+    def test_grammar_parse_table(self):
+        g = self.parser.grammar
+        self.assertEqual(g.parse_table['mf'], {'*': 5, '+': 6, ')': 6, '#': 6})
+        self.assertEqual(g.parse_table['f'], {'$id': 7, '(': 8})
+        self.assertEqual(g.conflicts, [])
+        # not a nonterminal
+        self.assertEqual(g.parse_action('$id', '$id'), -1)
+
+    def test_interned_symbols(self):
+        g = self.parser.grammar
+        ids = g.symbol_ids
+        for name in g.terminals:
+            self.assertEqual(g.symbol_kinds[ids[name]], TERMINAL)
+            self.assertEqual(g.symbol_names[ids[name]], name)
+        for name in g.nonterminals:
+            self.assertEqual(g.symbol_kinds[ids[name]], NONTERMINAL)
+        # right sides are pushed in reverse
+        self.assertEqual(g.rule_pushes[5], (ids['mf'], ids['f'], ids['*']))
+        self.assertEqual(g.rule_pushes[3], ())
+        self.assertEqual(g.id_table[ids['mt']], {ids['+']: 2, ids[')']: 3, ids['#']: 3})
+        self.assertEqual(g.id_table[ids['$id']], None)
+        # the parse stack holds ids
+        self.assertEqual(self.parser.sym_stack, [ids['%'], ids['goal']])
+
+    def test_grammar_reports_ll1_conflicts(self):
+        gstring = """
+start_symbol = a
+terminals = [ $x, +, #, % ]
+nonterminals = [ a, b ]
+
+rules:
+a -> b        { $x }
+b -> $x       { $x }
+b -> $x + b   { $x, + }
+"""
+        old_stderr = sys.stderr
+        try:
+            sys.stderr = StringIO.StringIO()
+            g = Grammar.create_grammar(gstring)
+            self.assertNotEqual(sys.stderr.getvalue().find('conflict'), -1)
+        finally:
+            sys.stderr = old_stderr
+        self.assertEqual(g.conflicts, [('b', '$x', 1, 2)])
+        # the first matching rule is kept
+        self.assertEqual(g.parse_action('b', '$x'), 1)
+        self.assertEqual(g.parse_action('b', '+'), 2)
+
     def test_grammar_has_string_representation(self):
         ## using the gse3 grammar as with other examples
         g = self.parser.grammar
@@ -402,6 +473,100 @@ mt    -> , t mt            { \,, +}
         self.assertEqual( have_equal_contents(g.pa[1], [',', '+']), True)
 
 
+class TestGrammarSets(unittest.TestCase):
+
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.g = Grammar.get_gse3()
+
+    def tearDown(self):
+        unittest.TestCase.tearDown(self)
+
+    def test_first_and_follow_gse3(self):
+        g = self.g
+        self.assertEqual(g.first['e'], set(['$id', '(']))
+        self.assertEqual(g.first['mt'], set(['+']))
+        self.assertEqual(g.nullable, set(['mt', 'mf']))
+        self.assertEqual(g.follow['goal'], set(['#']))
+        self.assertEqual(g.follow['e'], set([')', '#']))
+        self.assertEqual(g.follow['f'], set(['*', '+', ')', '#']))
+        for i in range(len(g.rules)):
+            self.assertEqual(g.predict[i], set(g.pa[i]))
+        self.assertEqual(g.pa_mismatches, [])
+
+    def test_grammar_without_parse_actions_gets_predict_sets(self):
+        g = Grammar.create_grammar(os.path.join(grammardir, 'phrase_project_g_no_pa'))
+        g_pa = Grammar.create_grammar(os.path.join(grammardir, 'phrase_project_grammar'))
+        for i in range(len(g.rules)):
+            self.assertEqual(set(g.pa[i]), set(g_pa.pa[i]))
+        p = Parser(tokensource='int x ; x = x * ( x + x ) ;', grammar=g)
+        old_stdout = sys.stdout
+        try:
+            sys.stdout = StringIO.StringIO()
+            p.parse()
+            self.assertNotEqual( sys.stdout.getvalue().find('accept'), -1 )
+        finally:
+            sys.stdout = old_stdout
+
+    def test_hand_written_sets_are_checked(self):
+        gstring = """
+start_symbol = goal
+terminals = [$id, +, *, (, ), #, %]
+nonterminals = [goal, e, t, mt, f, mf]
+
+rules:
+goal -> e        { $id, ( }
+e -> t mt        { $id, ( }
+mt -> + t mt     { + }
+mt ->            { ), #, * }
+t -> f mf        { $id }
+mf -> * f mf     { * }
+mf ->            { +, ), # }
+f -> $id         { $id }
+f -> ( e )       { ( }
+"""
+        old_stderr = sys.stderr
+        try:
+            sys.stderr = StringIO.StringIO()
+            g = Grammar.create_grammar(gstring)
+            # only the missing token is an error
+            self.assertNotEqual(sys.stderr.getvalue().find('rule 4'), -1)
+            self.assertEqual(sys.stderr.getvalue().find('rule 3'), -1)
+        finally:
+            sys.stderr = old_stderr
+        self.assertEqual(g.pa_mismatches, [(3, [], ['*']), (4, ['('], [])])
+        # the hand written set is used
+        self.assertEqual(g.parse_action('t', '('), -1)
+
+    def test_add_rule_matches_full_recompute(self):
+        g = self.g
+        i = g.add_rule('f', '- f')
+        self.assertEqual(i, 9)
+        self.assertEqual(g.pa[9], ['-'])
+        self.assertEqual(g.parse_action('e', '-'), 1)
+        self.assertEqual(g.parse_action('f', '-'), 9)
+        full = Grammar(terminals=g.terminals, nonterminals=g.nonterminals,
+                       rules=g.rules, parse_actions=[], start_symbol=g.start_symbol)
+        self.assertEqual(g.first, full.first)
+        self.assertEqual(g.follow, full.follow)
+        self.assertEqual(g.nullable, full.nullable)
+        self.assertEqual(g.predict, full.predict)
+        # a new nullable nonterminal changes FOLLOW sets through the rules using it,
+        # whether it is used before its rules are added or after
+        for order in ([('goal', 'e bang'), ('bang', ''), ('bang', '! bang')],
+                      [('bang', ''), ('bang', '! bang'), ('goal', 'e bang')]):
+            g = Grammar.get_gse3()
+            for (lhs, rhs) in order: g.add_rule(lhs, rhs)
+            full = Grammar(terminals=g.terminals, nonterminals=g.nonterminals,
+                           rules=g.rules, parse_actions=[], start_symbol=g.start_symbol)
+            self.assertEqual(g.first, full.first)
+            self.assertEqual(g.follow, full.follow)
+            self.assertEqual(g.nullable, full.nullable)
+            self.assertEqual(g.predict, full.predict)
+            self.assertEqual(g.follow['e'], set([')', '#', '!']))
+            self.assertEqual(g.parse_action('mt', '!'), 3)
+
+
 class TestExecuteParser(unittest.TestCase):
     
     def setUp(self):
@@ -691,6 +856,42 @@ $id
                 
             self.assertEqual(found, True)
     
+    def test_trace_rules_writes_no_snapshots(self):
+        tokfname = os.path.join(tokfiledir, 'tokfile.simple.accept')
+        outfname = os.path.join(tempdir, 'parserout_trace_rules')
+        p = pycompiler.parser.Parser(tokensource = tokfname,
+                                     outfile = outfname, trace = TRACE_RULES)
+        p.parse()
+        lines = open(outfname).read()
+        self.assertNotEqual(lines.find('rule'), -1)
+        self.assertNotEqual(lines.find('matching: $id'), -1)
+        self.assertEqual(lines.find('stack:'), -1)
+        
+    def test_trace_off_formats_nothing(self):
+        tokfname = os.path.join(tokfiledir, 'tokfile.simple.accept')
+        def no_tracing(*args, **kwargs):
+            self.fail('snapshot formatted with tracing off')
+        codefile = os.path.join(tempdir, 'trace_codefile')
+        datafile = os.path.join(tempdir, 'trace_datafile')
+        old_snapshot = pycompiler.parser.Parser.snapshot
+        old_stdout = sys.stdout
+        try:
+            pycompiler.parser.Parser.snapshot = no_tracing
+            sys.stdout = StringIO.StringIO()
+            p = pycompiler.parser.Parser(tokensource = tokfname)
+            self.assertEqual(p.trace, TRACE_OFF)
+            p.parse()
+            t = PlhTranslator(tokensource = '$stop ; #', codefile = codefile,
+                              datafile = datafile)
+            t.parse()
+            self.assertEqual(sys.stdout.getvalue().split(), ['accept', 'accept'])
+        finally:
+            pycompiler.parser.Parser.snapshot = old_snapshot
+            sys.stdout = old_stdout
+            # parse() writes the program file next to the codefile too
+            for f in (codefile, datafile, codefile + '.plhc'):
+                if os.path.exists(f): os.remove(f)
+
 
 class TestPhraseProjectGrammar(unittest.TestCase):
     
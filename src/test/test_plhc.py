@@ -0,0 +1,100 @@
+#!/usr/bin/env  python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+import os, sys, StringIO, struct
+import unittest
+from pycompiler.globals import *
+from pycompiler.util import *
+from pycompiler.vm import *
+from pycompiler.plhc import *
+from pycompiler.pagedmem import *
+from pycompiler.channels import *
+from pycompiler.translator import *
+from pycompiler.scanner import *
+
+class TestProgramFile(unittest.TestCase):
+
+    def setUp(self):
+        self.codefile = os.path.join(tempdir, 'plhc_codefile')
+        self.datafile = os.path.join(tempdir, 'plhc_datafile')
+        self.programfile = self.codefile + '.plhc'
+
+    def tearDown(self):
+        for f in (self.codefile, self.datafile, self.programfile):
+            if os.path.exists(f): os.remove(f)
+
+    def translate(self, srcfile, **kwargs):
+        old_stdout = sys.stdout
+        try:
+            sys.stdout = StringIO.StringIO()
+            scanner = Scanner(srcfile=srcfile)
+            trans = PlhTranslator(tokensource=scanner.tokens(), codefile=self.codefile,
+                                  datafile=self.datafile, scanner=scanner, **kwargs)
+            trans.parse()
+        finally:
+            sys.stdout = old_stdout
+        return trans
+
+    def test_translator_writes_the_program(self):
+        srcfile = os.path.join(srcfiledir, 'selection_sort.plh')
+        trans = self.translate(srcfile)
+        self.assertTrue(is_program(self.programfile))
+        self.assertFalse(is_program(self.codefile))
+        program = read_program(self.programfile)
+        self.assertEqual(program.code, trans.code)
+        self.assertEqual(program.data, trans.data)
+        self.assertEqual(program.symbols, trans.symbols)
+        self.assertEqual(program.debug['source'], srcfile)
+        lines = program.debug['lines']
+        self.assertEqual(len(lines), len(trans.code))
+        self.assertEqual(lines[1], 2)
+        self.assertEqual(lines[-1], 24)
+        self.assertEqual(lines, sorted(lines))
+        self.assertEqual(self.translate(srcfile, optimize=True).lines[-1], 24)
+        self.assertEqual(read_program(self.programfile).debug, None)
+
+    def test_vm_runs_the_program(self):
+        trans = self.translate(os.path.join(srcfiledir, 'selection_sort.plh'))
+        os.remove(self.datafile)
+        for memory in ('generic', 'paged', 'typed'):
+            for engine in ('stack', 'register', 'jit'):
+                vm = VM(codefile=self.programfile, input=[5, 3, 9, 1, 4],
+                        output=ListOutput(), engine=engine, memory=memory)
+                vm.execute()
+                self.assertEqual(vm.output.values, [1, 3, 4, 5, 9])
+        vm = VM(codefile=self.programfile, datafile=self.datafile, input=[5, 3, 9, 1, 4],
+                output=ListOutput())
+        vm.execute()
+        # the datafile the vm writes starts with data[0]
+        self.assertEqual(read_data(self.datafile, []), vm.data)
+
+    def test_values_round_trip(self):
+        code = [None, 'lit', 'abc', 'lit', 2.5, 'lit', 2**40, 'lit', -2**31, 'out', 'quit']
+        data = PagedMemory()
+        data.reserve(100000)
+        data[3], data[50000], data[50001] = 1, 'xyz', 2**70
+        symbols = {'x': {'address': 1, 'type': 'array', 'size': 100000}}
+        write_program(self.programfile, code, data, symbols)
+        self.assertTrue(os.path.getsize(self.programfile) < 400)
+        program = read_program(self.programfile)
+        self.assertEqual(program.code, code)
+        self.assertEqual(program.data, data)
+        self.assertEqual(program.data.pages.keys(), [0, 48])
+        self.assertEqual(program.symbols, symbols)
+
+    def test_not_a_program(self):
+        open(self.programfile, 'w').write('lit\n1\n')
+        self.assertRaises(ProgramException, read_program, self.programfile)
+        write_program(self.programfile, [None, 'quit'], [None], {})
+        buf = open(self.programfile, 'rb').read()
+        open(self.programfile, 'wb').write(buf[:4] + struct.pack('<H', 99) + buf[6:])
+        self.assertRaises(ProgramException, read_program, self.programfile)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env  python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+import os, sys, StringIO, json
+import unittest
+from pycompiler.globals import *
+from pycompiler.util import *
+from pycompiler.vm import *
+from pycompiler.profiler import *
+
+# count to 10 in data[1], the loop is the block at 5
+counting_loop = ['lit', 0, 'store', 1,
+                 'lit', 1, 'lit', 1, 'ldi', 'lit', 1, 'add', 'sti',
+                 'lit', 1, 'ldi', 'lit', 10, 'lt', 'lit', 25, 'brf', 'brl', 5, 'quit']
+
+class FakeTimer:
+    """Each call is a second after the last."""
+    def __init__(self): self.now = 0
+    def __call__(self):
+        self.now += 1
+        return float(self.now)
+
+def profile_code(code, data=None, **vm_args):
+    vm = VM(profile=True, **vm_args)
+    vm.code = [None] + code
+    vm.data = [None] + (data or [])
+    vm.decode()
+    vm.profiler = VmProfiler(vm, timer=FakeTimer())
+    vm.running = True
+    vm.run()
+    return vm
+
+class TestVmProfiler(unittest.TestCase):
+
+    def test_off_by_default(self):
+        vm = VM()
+        vm.code = [None] + counting_loop
+        vm.running = True
+        vm.run()
+        self.assertEqual(vm.profiler, None)
+        self.assertEqual(vm.data[1], 10)
+
+    def test_counts_by_opcode_pc_and_block(self):
+        vm = profile_code(counting_loop)
+        self.assertEqual(vm.data[1], 10)
+        stats = vm.profiler.stats()
+        # 2 instructions before the loop, 13 in each of 10 trips less the brl on the
+        # last, and quit
+        self.assertEqual(stats['instructions'], 2 + 10 * 13 - 1 + 1)
+        # each instruction takes a second on the fake timer
+        self.assertEqual(stats['time'], stats['instructions'])
+        self.assertEqual(stats['opcodes']['brf'], {'count': 10, 'time': 10.0})
+        self.assertEqual(stats['pcs'][22], {'op': 'brf', 'count': 10, 'time': 10.0})
+        self.assertEqual(stats['pcs'][23]['count'], 9)
+        # entered at 1 and run to the brf, then the brl alone, then the loop
+        self.assertEqual(sorted(stats['blocks']), [1, 5, 23, 25])
+        self.assertEqual(stats['blocks'][1]['instructions'], 14)
+        self.assertEqual(stats['blocks'][5], {'count': 9, 'instructions': 108,
+                                              'time': 108.0})
+        self.assertEqual(stats['blocks'][25]['count'], 1)
+
+    def test_top_edges(self):
+        vm = profile_code(counting_loop)
+        self.assertEqual(sorted(vm.profiler.top_edges(3)), [((22, 23), 9), ((22, 25), 1),
+                                                            ((23, 5), 9)])
+        self.assertEqual(vm.profiler.top_edges(1)[0][1], 9)
+
+    def test_json_and_text_report(self):
+        vm = profile_code(counting_loop)
+        fname = os.path.join(tempdir, 'profile.json')
+        try:
+            text = vm.profiler.to_json(fname)
+            self.assertEqual(json.load(open(fname)), json.loads(text))
+        finally:
+            if os.path.exists(fname): os.remove(fname)
+        stats = json.loads(text)
+        self.assertEqual(stats['pcs']['22']['count'], 10)
+        self.assertEqual(stats['edges'][2], {'from': 22, 'to': 25, 'count': 1})
+        report = vm.profiler.report(n=3)
+        self.assertTrue(report.startswith('instructions 132  time 132.000000s'))
+        self.assertTrue(find_without_whitespace(report, 'block count instrs time\n'
+                                                        '5 9 108 108.000000'))
+
+    def test_superinstructions_are_profiled_by_name(self):
+        vm = profile_code(counting_loop, superinstructions=True)
+        self.assertEqual(vm.data[1], 10)
+        self.assertEqual(vm.profiler.stats()['opcodes']['lit_brf']['count'], 10)
+
+    def test_errors_match_the_stack_engine(self):
+        self.assertRaises(VmException, profile_code, ['lit', 1, 'kilroy', 'quit'])
+        self.assertRaises(VmException, profile_code, ['brl', 40])
+
+
+if __name__ == '__main__':
+    unittest.main()
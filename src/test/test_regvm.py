@@ -0,0 +1,105 @@
+#!/usr/bin/env  python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+import os, sys, StringIO
+import unittest
+from pycompiler.globals import *
+from pycompiler.util import *
+from pycompiler.vm import *
+from pycompiler.regvm import *
+from pycompiler.translator import *
+from pycompiler.scanner import *
+
+def run_code(code, engine, data=None, input=''):
+    """Runs the list code on a vm with the engine, returns (stdout, vm)."""
+    old_stdout, old_stdin = sys.stdout, sys.stdin
+    try:
+        sys.stdout = StringIO.StringIO()
+        sys.stdin = StringIO.StringIO(input)
+        vm = VM(engine=engine)
+        vm.code = [None] + code
+        vm.data = [None] + (data or [])
+        vm.running = True
+        vm.run()
+        return sys.stdout.getvalue(), vm
+    finally:
+        sys.stdout, sys.stdin = old_stdout, old_stdin
+
+class TestRegisterEngine(unittest.TestCase):
+
+    def assertSameRun(self, code, data=None, input=''):
+        stack_out, stack_vm = run_code(code, 'stack', data, input)
+        reg_out, reg_vm = run_code(code, 'register', data, input)
+        self.assertEqual(reg_out, stack_out)
+        self.assertEqual(reg_vm.data, stack_vm.data)
+        self.assertEqual(reg_vm.stack.data, stack_vm.stack.data)
+        self.assertEqual(reg_vm.pc, stack_vm.pc)
+        return reg_out
+
+    def test_unknown_engine(self):
+        self.assertRaises(VmException, VM, engine='turbo')
+
+    def test_statement_is_one_register_statement(self):
+        # temp=x(i), x at 1, i at 8, temp at 13
+        code = ['lit', 13, 'lit', 1, 'lit', 8, 'ldi', 'add', 'ldi', 'sti', 'quit']
+        vm = VM(engine='register')
+        vm.code = [None] + code
+        vm.data = [None, 10, 20, 30, None, None, None, None, 2, None, None, None, None, None]
+        engine = RegisterEngine(vm)
+        engine.reset()
+        block = engine.translate(1)
+        self.assertEqual(len(block.stmts), 1)
+        self.assertEqual(block.length, 8)
+        self.assertEqual(self.assertSameRun(code, vm.data[1:]), '')
+        out, vm = run_code(code, 'register', vm.data[1:])
+        self.assertEqual(vm.data[13], 30)
+
+    def test_values_left_on_the_stack_across_blocks(self):
+        self.assertEqual(self.assertSameRun(['lit', 1, 'lit', 2, 'brl', 7, 'add', 'out',
+                                             'lit', 5, 'quit']), '3\n')
+
+    def test_reads_before_a_store_see_the_old_value(self):
+        self.assertEqual(self.assertSameRun(['load', 1, 'lit', 1, 'lit', 5, 'sti', 'out',
+                                             'quit'], [7]), '7\n')
+
+    def test_input_and_brf_loop(self):
+        # read n, then count down from n, printing each
+        code = ['in', 'store', 1,
+                'load', 1, 'out', 'load', 1, 'dec', 1, 'store', 1,
+                'load', 1, 'lit', 0, 'gt', 'lit', 24, 'brf', 'brl', 4, 'quit', 'quit']
+        self.assertEqual(self.assertSameRun(code, [None], '3\n'), '> 3\n2\n1\n')
+
+    def test_errors_match_the_stack_engine(self):
+        self.assertRaises(VmException, run_code, ['lit', 1, 'kilroy', 'quit'], 'register')
+        self.assertRaises(VmException, run_code, ['lit', 1, 'lit'], 'register')
+        self.assertRaises(VmException, run_code, ['brl', 40], 'register')
+        self.assertRaises(ZeroDivisionError, run_code, ['lit', 1, 'lit', 0, 'div', 'quit'],
+                          'register')
+
+    def test_selection_sort_on_both_engines(self):
+        srcfile = os.path.join(srcfiledir, 'selection_sort.plh')
+        for optimize in (False, True):
+            codefile = os.path.join(tempdir, 'regvm_codefile')
+            datafile = os.path.join(tempdir, 'regvm_datafile')
+            old_stdout = sys.stdout
+            try:
+                sys.stdout = StringIO.StringIO()
+                trans = PlhTranslator(tokensource=Scanner(srcfile=srcfile).tokens(),
+                                      codefile=codefile, datafile=datafile,
+                                      optimize=optimize)
+                trans.parse()
+            finally:
+                sys.stdout = old_stdout
+                for f in (codefile, datafile):
+                    if os.path.exists(f): os.remove(f)
+            out = self.assertSameRun(trans.code[1:], trans.data[1:], '5\n3\n9\n1\n4\n')
+            self.assertTrue(out.endswith('1\n3\n4\n5\n9\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -98,6 +98,46 @@ $int
 #        scanner = Scanner(srcfile=self.srcfile, tokfile=self.tokfile)
 #        self.assertEqual(scanner.tokfile_equiv_w_cpp_scanner(), True)
         
+    def test_tokens_generator(self):
+        open(self.srcfile, 'w').write('declare x(5);\nput x(0);')
+        scanner = Scanner(srcfile=self.srcfile, tokfile=self.tokfile)
+        self.assertEqual(list(scanner.tokens()), 
+                         [('$declare', None), ('$id', 'x'), ('(', None), ('$int', 5), 
+                          (')', None), (';', None), ('$put', None), ('$id', 'x'), 
+                          ('(', None), ('$int', 0), (')', None), (';', None)])
+
+    def test_tokens_words_ints_and_positions(self):
+        open(self.srcfile, 'w').write('if x12 = 12abc\n  then 007 _\x01stop;')
+        scanner = Scanner(srcfile=self.srcfile, tokfile=self.tokfile)
+        result = []
+        for (name, value) in scanner.tokens():
+            result.append( (name, value, scanner.line, scanner.column) )
+        self.assertEqual(result, [('$if', None, 1, 1), ('$id', 'x12', 1, 4), 
+                                  ('=', None, 1, 8), ('$id', '12abc', 1, 10),
+                                  ('$then', None, 2, 3), ('$int', 7, 2, 8),
+                                  ('_', None, 2, 12), ('$stop', None, 2, 14), 
+                                  (';', None, 2, 18)])
+
+    def test_tokens_feed_translator_directly(self):
+        srcfile = os.path.join(srcfiledir, 'selection_sort.plh')
+        scanner = Scanner(srcfile=srcfile, tokfile=self.tokfile)
+        scanner.scan()
+        codefile = os.path.join(tempdir, 'scanner_codefile')
+        datafile = os.path.join(tempdir, 'scanner_datafile')
+        old_stdout = sys.stdout
+        try:
+            sys.stdout = StringIO.StringIO()
+            from_file = PlhTranslator(tokensource=self.tokfile, codefile=codefile, 
+                                      datafile=datafile)
+            from_file.parse()
+            streamed = PlhTranslator(tokensource=scanner.tokens(), codefile=codefile, 
+                                     datafile=datafile)
+            streamed.parse()
+        finally:
+            sys.stdout = old_stdout
+        self.assertEqual(streamed.code, from_file.code)
+        self.assertEqual(streamed.symbols, from_file.symbols)
+
         
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,90 @@
+#!/usr/bin/env  python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+import os, sys
+import unittest
+from pycompiler.globals import *
+from pycompiler.util import *
+from pycompiler.vm import *
+from pycompiler.channels import *
+from pycompiler.scheduler import *
+
+# read n, then read and print n values doubled
+doubler = ['in', 'store', 1,
+           'load', 1, 'lit', 0, 'gt', 'lit', 26, 'brf',
+           'in', 'lit', 2, 'mult', 'out', 'load', 1, 'dec', 1, 'store', 1, 'brl', 4,
+           'quit', 'quit']
+# count to 100 in data[1], 13 instructions a trip
+counting_loop = ['lit', 0, 'store', 1,
+                 'lit', 1, 'lit', 1, 'ldi', 'lit', 1, 'add', 'sti',
+                 'lit', 1, 'ldi', 'lit', 100, 'lt', 'lit', 25, 'brf', 'brl', 5, 'quit']
+
+def make_vm(code, input=None):
+    vm = VM(input=input, output=ListOutput())
+    vm.code = [None] + code
+    return vm
+
+class TestScheduler(unittest.TestCase):
+
+    def test_many_vms_run_to_completion(self):
+        scheduler = Scheduler(quantum=50)
+        for i in range(200):
+            scheduler.add(make_vm(counting_loop))
+        self.assertEqual(scheduler.run(), [])
+        for session in scheduler.sessions:
+            self.assertEqual(session.state, DONE)
+            self.assertEqual(session.vm.data[1], 100)
+            self.assertEqual(session.instructions, 2 + 100 * 13 - 1 + 1)
+            self.assertEqual(session.quanta, 1302 / 50 + 1)
+            self.assertTrue(session.time > 0)
+
+    def test_round_robin_is_fair(self):
+        scheduler = Scheduler(quantum=10)
+        first = scheduler.add(make_vm(counting_loop))
+        second = scheduler.add(make_vm(counting_loop))
+        rounds = scheduler.rounds()
+        for i in range(5): self.assertEqual(rounds.next(), 2)
+        self.assertEqual(first.instructions, 50)
+        self.assertEqual(second.instructions, 50)
+
+    def test_waiting_for_input_does_not_block_the_others(self):
+        scheduler = Scheduler(quantum=5)
+        waiter = scheduler.add(make_vm(doubler, QueueInput()), 'waiter')
+        counter = scheduler.add(make_vm(counting_loop), 'counter')
+        self.assertEqual(scheduler.run(), [waiter])
+        self.assertEqual(waiter.state, WAITING)
+        self.assertEqual(waiter.instructions, 0)
+        self.assertEqual(counter.state, DONE)
+        scheduler.feed('waiter', 2, 10)
+        self.assertEqual(scheduler.run(), [waiter])
+        self.assertEqual(waiter.vm.output.values, [20])
+        scheduler.feed('waiter', 21)
+        self.assertEqual(scheduler.run(), [])
+        self.assertEqual(waiter.state, DONE)
+        self.assertEqual(waiter.vm.output.values, [20, 42])
+
+    def test_closed_input_and_errors_fail_only_their_session(self):
+        scheduler = Scheduler()
+        input = QueueInput([1])
+        input.close()
+        closed = scheduler.add(make_vm(doubler, input))
+        bad = scheduler.add(make_vm(['lit', 1, 'kilroy', 'quit']))
+        good = scheduler.add(make_vm(counting_loop))
+        scheduler.run()
+        self.assertEqual((closed.state, bad.state, good.state), (FAILED, FAILED, DONE))
+        self.assertTrue(isinstance(closed.error, EOFError))
+        self.assertTrue(isinstance(bad.error, VmException))
+
+    def test_names_are_unique(self):
+        scheduler = Scheduler()
+        scheduler.add(make_vm(counting_loop), 'a')
+        self.assertRaises(ValueError, scheduler.add, make_vm(counting_loop), 'a')
+
+
+if __name__ == '__main__':
+    unittest.main()
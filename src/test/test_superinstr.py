@@ -0,0 +1,117 @@
+#!/usr/bin/env  python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+import os, sys, StringIO
+import unittest
+from pycompiler.globals import *
+from pycompiler.util import *
+from pycompiler.vm import *
+from pycompiler.superinstr import *
+from pycompiler.translator import *
+from pycompiler.scanner import *
+
+def make_vm(code, data=None, superinstructions=False):
+    vm = VM(superinstructions=superinstructions)
+    vm.code = [None] + code
+    vm.data = [None] + (data or [])
+    vm.decode()
+    vm.running = True
+    return vm
+
+def run_code(code, data=None, input='', superinstructions=False):
+    """Runs the list code on the stack engine, returns (stdout, vm, dispatches)."""
+    old_stdout, old_stdin = sys.stdout, sys.stdin
+    try:
+        sys.stdout = StringIO.StringIO()
+        sys.stdin = StringIO.StringIO(input)
+        vm = make_vm(code, data, superinstructions)
+        dispatches = sum(profile(vm, 1).values())
+        return sys.stdout.getvalue(), vm, dispatches
+    finally:
+        sys.stdout, sys.stdin = old_stdout, old_stdin
+
+class TestSuperinstructions(unittest.TestCase):
+
+    def assertSameRun(self, code, data=None, input=''):
+        """Returns the dispatches without and with superinstructions."""
+        out, vm, plain = run_code(code, data, input)
+        super_out, super_vm, fused = run_code(code, data, input, superinstructions=True)
+        self.assertEqual(super_out, out)
+        self.assertEqual(super_vm.data, vm.data)
+        self.assertEqual(super_vm.stack.data, vm.stack.data)
+        self.assertEqual(super_vm.pc, vm.pc)
+        return plain, fused
+
+    def test_fuse_rewrites_only_the_first_instruction(self):
+        code = ['lit', 3, 'ldi', 'lit', 1, 'lit', 7, 'sti', 'quit']
+        vm = make_vm(code, superinstructions=True)
+        n_ops = len(vm.op_names)
+        self.assertEqual(vm.op_names[vm.opcodes[1] - n_ops], 'lit_ldi')
+        self.assertEqual(vm.constants[vm.operands[1]], (3,))
+        self.assertEqual(vm.decoded_widths[vm.opcodes[1]], 3)
+        self.assertEqual(vm.op_names[vm.opcodes[4] - n_ops], 'lit_lit_sti')
+        self.assertEqual(vm.constants[vm.operands[4]], (1, 7))
+        # the inner instructions keep their decoding
+        self.assertEqual(vm.op_names[vm.opcodes[3]], 'ldi')
+        self.assertEqual(vm.op_names[vm.opcodes[6]], 'lit')
+        self.assertEqual(vm.op_names[vm.opcodes[8]], 'sti')
+
+    def test_off_by_default_and_for_other_engines(self):
+        code = ['lit', 3, 'ldi', 'quit']
+        self.assertEqual(make_vm(code).op_names[make_vm(code).opcodes[1]], 'lit')
+        self.assertFalse(VM(engine='jit', superinstructions=True).superinstructions)
+
+    def test_superinstructions_are_not_in_the_instr_set(self):
+        vm = make_vm(['lit_ldi', 3, 'quit'], superinstructions=True)
+        self.assertRaises(VmException, vm.run)
+        vm = make_vm(['lit_ldi', 3, 'quit'], superinstructions=True)
+        self.assertRaises(VmException, vm.exec_current_instr)
+
+    def test_goto_and_branch_into_a_sequence(self):
+        # the brl goes to the ldi in the middle of lit 7 ldi
+        code = ['lit', 1, 'brl', 7, 'lit', 7, 'ldi', 'out', 'lit', 8, 'ldi', 'br',
+                'quit', 'quit']
+        data = [2, None, None, None, None, None, 30, 13]
+        plain, fused = self.assertSameRun(code, data)
+        self.assertTrue(fused < plain)
+
+    def test_add_keeps_operand_order(self):
+        # lit_lit then lit_add, add is top + next
+        code = ['lit', 'a', 'lit', 'b', 'lit', 'c', 'add', 'out', 'out', 'quit']
+        self.assertSameRun(code)
+        self.assertEqual(run_code(code, superinstructions=True)[0], 'cb\na\n')
+
+    def test_ngram_profile(self):
+        counts = profile(make_vm(['lit', 1, 'lit', 2, 'add', 'store', 1, 'quit']), 2)
+        self.assertEqual(counts, {('lit', 'lit'): 1, ('lit', 'add'): 1, ('add', 'store'): 1,
+                                  ('store', 'quit'): 1})
+        counts = profile_corpus([make_vm(['lit', 1, 'ldi', 'quit'], [5]),
+                                 make_vm(['lit', 1, 'ldi', 'lit', 1, 'quit'], [5])], 2)
+        self.assertEqual(counts[('lit', 'ldi')], 2)
+        self.assertEqual(counts[('ldi', 'quit')], 1)
+
+    def test_selection_sort_with_fewer_dispatches(self):
+        srcfile = os.path.join(srcfiledir, 'selection_sort.plh')
+        codefile = os.path.join(tempdir, 'superinstr_codefile')
+        datafile = os.path.join(tempdir, 'superinstr_datafile')
+        old_stdout = sys.stdout
+        try:
+            sys.stdout = StringIO.StringIO()
+            trans = PlhTranslator(tokensource=Scanner(srcfile=srcfile).tokens(),
+                                  codefile=codefile, datafile=datafile)
+            trans.parse()
+        finally:
+            sys.stdout = old_stdout
+            for f in (codefile, datafile):
+                if os.path.exists(f): os.remove(f)
+        plain, fused = self.assertSameRun(trans.code[1:], trans.data[1:], '5\n3\n9\n1\n4\n')
+        self.assertTrue(fused < plain * 3 / 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
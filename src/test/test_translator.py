@@ -110,6 +110,13 @@ class TestTranslatorAndTSCreation(unittest.TestCase):
         self.assertEqual( find_without_whitespace(ts_str, expected), True)
         #print ts_str
     
+    def test_action_symbols_interned_as_actions(self):
+        ids = self.ts.symbol_ids
+        for a in self.ts.action_symbols:
+            self.assertEqual(self.ts.symbol_kinds[ids[a]], ACTION)
+        self.assertEqual(self.ts.symbol_kinds[ids['$id']], TERMINAL)
+        self.assertEqual(self.ts.symbol_kinds[ids['fact']], NONTERMINAL)
+
     def test_emit(self):
         tokstring = '$id x = $int 7 ;'
         self.create_tokfile(tokstring)
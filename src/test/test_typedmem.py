@@ -0,0 +1,126 @@
+#!/usr/bin/env  python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+import os, sys, StringIO
+import unittest
+from pycompiler.globals import *
+from pycompiler.util import *
+from pycompiler.vm import *
+from pycompiler.typedmem import *
+from pycompiler.channels import *
+from pycompiler.translator import *
+from pycompiler.scanner import *
+
+class TestIntMemory(unittest.TestCase):
+
+    def test_uninitialized_cells_are_None(self):
+        memory = IntMemory([None, 5, None, -7])
+        self.assertEqual(len(memory), 4)
+        self.assertEqual(list(memory), [None, 5, None, -7])
+        self.assertEqual(memory[1:3], [5, None])
+        memory[2] = 3
+        memory[1] = None
+        self.assertEqual(list(memory), [None, None, 3, -7])
+        self.assertFalse(memory.generic)
+        self.assertRaises(IndexError, memory.__getitem__, 4)
+
+    def test_extend(self):
+        memory = IntMemory()
+        memory.extend([None, None, 4])
+        memory.append(6)
+        self.assertEqual(memory, [None, None, None, 4, 6])
+
+    def test_falls_back_to_generic(self):
+        for value in ('abc', 2.5, True, 2**70):
+            memory = IntMemory([None, 1])
+            memory[0] = value
+            self.assertTrue(memory.generic)
+            self.assertEqual(list(memory), [value, 1])
+            self.assertTrue(type(memory[0]) is type(value))
+            memory.append(None)
+            self.assertEqual(memory[1:], [1, None])
+
+
+class TestIntStack(unittest.TestCase):
+
+    def test_push_pop_and_grow(self):
+        stack = IntStack(capacity=2)
+        for i in range(5): stack.push(i)
+        self.assertEqual(stack.data, [0, 1, 2, 3, 4])
+        self.assertEqual(stack.top(), 4)
+        self.assertEqual([stack.pop() for i in range(5)], [4, 3, 2, 1, 0])
+        self.assertRaises(AssertionError, stack.pop)
+        self.assertRaises(AssertionError, stack.top)
+
+    def test_falls_back_to_generic(self):
+        stack = IntStack()
+        stack.push(1)
+        stack.push(False)
+        self.assertTrue(stack.generic)
+        self.assertEqual(str(stack), '1\tFalse')
+        self.assertTrue(stack.pop() is False)
+        self.assertEqual(stack.pop(), 1)
+        self.assertRaises(AssertionError, stack.pop)
+
+
+class TestTypedVm(unittest.TestCase):
+
+    def setUp(self):
+        self.codefile = os.path.join(tempdir, 'typedmem_codefile')
+        self.datafile = os.path.join(tempdir, 'typedmem_datafile')
+
+    def tearDown(self):
+        for f in (self.codefile, self.datafile):
+            if os.path.exists(f): os.remove(f)
+
+    def run_files(self, data, memory, **vm_args):
+        open(self.datafile, 'w').write('\n'.join([str(d) for d in data]))
+        vm = VM(codefile=self.codefile, datafile=self.datafile, output=ListOutput(),
+                memory=memory, **vm_args)
+        vm.execute()
+        return vm, open(self.datafile).read()
+
+    def test_selection_sort_stays_typed(self):
+        old_stdout = sys.stdout
+        try:
+            sys.stdout = StringIO.StringIO()
+            trans = PlhTranslator(
+                tokensource=Scanner(srcfile=os.path.join(srcfiledir,
+                                                         'selection_sort.plh')).tokens(),
+                codefile=self.codefile, datafile=self.datafile)
+            trans.parse()
+        finally:
+            sys.stdout = old_stdout
+        for engine in ('stack', 'register', 'jit'):
+            generic, generic_file = self.run_files(trans.data[1:], 'generic',
+                                                   input=[5, 3, 9, 1, 4], engine=engine)
+            typed, typed_file = self.run_files(trans.data[1:], 'typed',
+                                               input=[5, 3, 9, 1, 4], engine=engine)
+            self.assertEqual(typed.output.values, [1, 3, 4, 5, 9])
+            self.assertEqual(typed.data, generic.data)
+            self.assertEqual(typed_file, generic_file)
+            self.assertFalse(typed.data.generic)
+            self.assertFalse(typed.stack.generic)
+
+    def test_mixed_values_fall_back(self):
+        code = ['lit', 'abc', 'store', 1, 'lit', 2, 'lit', 1.5, 'sti', 'load', 1, 'out',
+                'lit', 3, 'not', 'out', 'quit']
+        open(self.codefile, 'w').write('\n'.join([str(c) for c in code]))
+        generic, generic_file = self.run_files([7, 8], 'generic')
+        typed, typed_file = self.run_files([7, 8], 'typed')
+        self.assertEqual(typed.output.values, ['abc', False])
+        self.assertEqual(typed.data, generic.data)
+        self.assertEqual(typed_file, generic_file)
+        self.assertTrue(typed.data.generic)
+
+    def test_unknown_memory(self):
+        self.assertRaises(VmException, VM, memory='compressed')
+
+
+if __name__ == '__main__':
+    unittest.main()
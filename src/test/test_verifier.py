@@ -0,0 +1,141 @@
+#!/usr/bin/env  python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+import os, sys, StringIO
+import unittest
+from pycompiler.globals import *
+from pycompiler.util import *
+from pycompiler.vm import *
+from pycompiler.verifier import *
+from pycompiler.channels import *
+from pycompiler.translator import *
+from pycompiler.scanner import *
+
+# goto through the label cell data[1] to 9, which outputs 1, unless 'in' reads the
+# address 1, and the store at it sends the goto to the quit at 12 instead
+relabel = ['in', 'lit', 12, 'sti', 'lit', 1, 'ldi', 'br',
+           'lit', 1, 'out', 'quit', 'lit', 2, 'out', 'quit']
+
+def verifier(code, data=None):
+    vm = VM()
+    return Verifier([None] + code, [None] + (data or []), vm.instr_set,
+                    vm.immed_op_instructions)
+
+def make_vm(code, data=None, **vm_args):
+    vm = VM(output=ListOutput(), **vm_args)
+    vm.code = [None] + code
+    vm.data = [None] + (data or [])
+    vm.running = True
+    return vm
+
+class TestVerifier(unittest.TestCase):
+
+    def test_selection_sort(self):
+        old_stdout = sys.stdout
+        try:
+            sys.stdout = StringIO.StringIO()
+            trans = PlhTranslator(
+                tokensource=Scanner(srcfile=os.path.join(srcfiledir,
+                                                         'selection_sort.plh')).tokens(),
+                codefile=os.path.join(tempdir, 'verifier_codefile'),
+                datafile=os.path.join(tempdir, 'verifier_datafile'))
+            trans.parse()
+        finally:
+            sys.stdout = old_stdout
+        v = Verifier(trans.code, trans.data, VM().instr_set,
+                     VM().immed_op_instructions).verify()
+        self.assertEqual(v.max_depth, 3)
+        labels = [trans.data[entry['address']] for entry in trans.symbols.values()
+                  if entry['type'] == 'label']
+        self.assertEqual(v.br_targets, dict( (label, 0) for label in labels ))
+        for label in labels:
+            self.assertEqual(v.blocks[label][0], 0)
+        self.assertEqual(max([deepest for (entry, deepest) in v.blocks.values()]), 3)
+        # the second quit the translator emits is never reached
+        self.assertFalse(len(trans.code) - 1 in v.depths)
+        for f in (trans.codefile, trans.datafile, trans.programfile):
+            os.remove(f)
+
+    def test_blocks_and_depths(self):
+        code = ['lit', 1, 'lit', 2, 'lt', 'lit', 11, 'brf', 'in', 'out', 'lit', 5, 'quit']
+        v = verifier(code).verify()
+        self.assertEqual(v.blocks, {1: (0, 2), 9: (0, 1), 11: (0, 1)})
+        self.assertEqual(v.depths[8], 2)
+        self.assertEqual(v.max_depth, 2)
+        self.assertEqual(v.br_targets, {})
+
+    def test_rejects(self):
+        for (code, data, message) in [
+                (['lit', 1, 'kilroy', 'quit'], [], 'unknown operator'),
+                (['add', 'quit'], [], 'pops 2 from a stack of 0'),
+                (['lit', 1, 'brl', 1], [], 'join at 1'),
+                (['in', 'in', 'brf', 'quit'], [], 'no lit target'),
+                (['in', 'br', 'quit'], [], 'no lit or label cell target'),
+                (['lit', 1, 'ldi', 'br', 'quit'], [99], 'branches to 99'),
+                (['load', 3, 'quit'], [1], 'addresses 3'),
+                (['lit', 1, 'out'], [], 'past the end'),
+                (['lit'], [], 'missing its operand'),
+                (['lit', 1, 'lit', 0, 'br', 'quit'], [], 'branches to 0'),
+                (['in', 'lit', 10, 'brf', 'lit', 14, 'br', 'quit', 'quit',
+                  'in', 'lit', 14, 'br', 'quit'], [], 'br to 14 at stack depths'),
+                ]:
+            v = verifier(code, data)
+            try:
+                v.verify()
+                self.fail('%s verified' % code)
+            except VerifyException, msg:
+                self.assertTrue(message in str(msg), '%s: %s' % (code, msg))
+        # only what is reached is verified
+        verifier(['brl', 4, 'kilroy', 'quit']).verify()
+
+
+class TestUncheckedVm(unittest.TestCase):
+
+    def test_verified_code_runs_unchecked(self):
+        for superinstructions in (False, True):
+            vm = make_vm(relabel, [9], input=[2], superinstructions=superinstructions)
+            vm.run()
+            self.assertEqual(vm.verify_error, None)
+            self.assertEqual(vm.verifier.br_targets, {9: 0})
+            self.assertEqual(vm.output.values, [1])
+            self.assertEqual(vm.data, [None, 9, 12])
+
+    def test_br_to_an_unverified_target_goes_on_checked(self):
+        for superinstructions in (False, True):
+            vm = make_vm(relabel, [9], input=[1], superinstructions=superinstructions)
+            vm.run()
+            self.assertEqual(vm.verify_error, None)
+            self.assertEqual(vm.output.values, [])
+            self.assertEqual(vm.pc, 12)
+
+    def test_unverified_code_runs_checked(self):
+        vm = make_vm(['in', 'br', 'quit', 'lit', 4, 'out', 'quit'], input=[4])
+        vm.run()
+        self.assertTrue('no lit or label cell target' in vm.verify_error)
+        self.assertEqual(vm.output.values, [4])
+        vm = make_vm(['lit', 1, 'add', 'quit'])
+        self.assertRaises(AssertionError, vm.run)
+        vm = make_vm(['lit', 1, 'out', 'quit'], verify=False)
+        vm.run()
+        self.assertEqual((vm.verifier, vm.output.values), (None, [1]))
+
+    def test_verified_once_for_the_code_and_data(self):
+        vm = make_vm(['load', 1, 'out', 'quit'], [5])
+        vm.run()
+        verified = vm.verifier
+        vm.pc, vm.running = 0, True
+        vm.run()
+        self.assertTrue(vm.verifier is verified)
+        vm.pc, vm.running = 0, True
+        vm.data = [None]
+        self.assertRaises(VmException, vm.run)
+        self.assertTrue('addresses 1' in vm.verify_error)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -181,6 +181,79 @@ quit"""
         self.assertRaises(VmException, self.run_code_through_vm, code, '')
         
         
+class TestVmDispatch(unittest.TestCase):
+    
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        create_default_data_file()
+        create_file('codefile', [])
+        self.vM = pycompiler.vm.VM(datafile='datafile')
+        self.vM.read_files()
+        
+    def load(self, code):
+        self.vM.code = [None] + code
+        self.vM.pc = 0
+        self.vM.running = True
+        
+    def test_instr_set_holds_methods(self):
+        for op, instr in self.vM.instr_set.items():
+            self.assertTrue(callable(instr), op)
+        self.assertEqual(self.vM.instr_set['add'], self.vM.op_add)
+        
+    def test_decode_to_int_arrays_with_the_same_offsets(self):
+        self.load(['lit', 7, 'inc', 2, 'quit'])
+        self.vM.decode()
+        opcodes, operands, names = self.vM.opcodes, self.vM.operands, self.vM.op_names
+        self.assertEqual((opcodes.typecode, operands.typecode), ('i', 'i'))
+        self.assertEqual(len(opcodes), len(self.vM.code) + 1)
+        self.assertEqual([names[op] for op in opcodes[1:-1]], 
+                         ['lit', None, 'inc', None, 'quit'])
+        self.assertEqual(list(operands[1:-1]), [7, 0, 2, 0, 0])
+        self.assertEqual(opcodes[-1], pycompiler.vm.END_OP)
+        self.assertEqual(self.vM.constants, [])
+        
+    def test_decode_puts_other_operands_in_constant_pool(self):
+        self.load(['lit', 'hello', 'lit', 3.14, 'lit', 2**40, 'lit', -5, 'quit'])
+        self.vM.decode()
+        self.assertEqual(self.vM.constants, ['hello', 3.14, 2**40])
+        self.assertEqual(list(self.vM.operands[1:8:2]), [0, 1, 2, -5])
+        n_ops = len(self.vM.op_names)
+        lit = self.vM.op_names.index('lit')
+        self.assertEqual(list(self.vM.opcodes[1:8:2]), [lit + n_ops] * 3 + [lit])
+        self.vM.run()
+        self.assertEqual(self.vM.stack.data, ['hello', 3.14, 2**40, -5])
+        
+    def test_read_files_decodes(self):
+        self.assertTrue(self.vM.decoded_code is self.vM.code)
+        
+    def test_run_matches_single_stepping(self):
+        code = ['lit', 3, 'store', 1, 'load', 1, 'dec', 1, 'store', 1, 'load', 1,
+                'lit', 0, 'gt', 'lit', 21, 'brf', 'brl', 5, 'load', 1, 'lit', 9, 'add', 'quit']
+        self.load(code)
+        self.vM.run()
+        fast = (self.vM.stack.data, self.vM.data, self.vM.pc)
+        self.setUp()
+        self.load(code)
+        while self.vM.running:
+            self.vM.exec_current_instr()
+        self.assertEqual(fast, (self.vM.stack.data, self.vM.data, self.vM.pc))
+        self.assertEqual(self.vM.stack.data, [9])
+        
+    def test_run_raises_VmException_on_bad_operator_only_when_reached(self):
+        self.load(['brl', 4, 'kilroy', 'quit'])
+        self.vM.run()
+        self.load(['lit', 1, 'kilroy', 'quit'])
+        self.assertRaises(VmException, self.vM.run)
+        
+    def test_run_raises_VmException_running_off_the_end(self):
+        self.load(['lit', 1])
+        self.assertRaises(VmException, self.vM.run)
+        self.load(['lit'])
+        self.assertRaises(VmException, self.vM.run)
+        self.load(['brl', 10, 'quit'])
+        self.assertRaises(VmException, self.vM.run)
+        
+
 class TestVmPic(unittest.TestCase):
     
     def setUp(self):
@@ -0,0 +1,111 @@
+#!/usr/bin/env  python
+##
+# Dave Rogers
+# dave at drogers dot us
+# This software is for instructive purposes.  Use at your own risk - not meant to be robust at all.
+# Feel free to use anything, credit is appreciated if warranted.
+##
+
+import os, sys, StringIO
+import unittest
+from pycompiler.globals import *
+from pycompiler.util import *
+from pycompiler.vm import *
+from pycompiler.vmtrace import *
+from pycompiler.channels import *
+from pycompiler.translator import *
+from pycompiler.scanner import *
+
+class TestDeltaTrace(unittest.TestCase):
+
+    def setUp(self):
+        self.codefile = os.path.join(tempdir, 'vmtrace_codefile')
+        self.datafile = os.path.join(tempdir, 'vmtrace_datafile')
+        self.picfile = os.path.join(tempdir, 'vmtrace_pic')
+        self.tracefile = os.path.join(tempdir, 'vmtrace_trace')
+        old_stdout = sys.stdout
+        try:
+            sys.stdout = StringIO.StringIO()
+            self.trans = PlhTranslator(
+                tokensource=Scanner(srcfile=os.path.join(srcfiledir,
+                                                         'selection_sort.plh')).tokens(),
+                codefile=self.codefile, datafile=self.datafile)
+            self.trans.parse()
+        finally:
+            sys.stdout = old_stdout
+
+    def tearDown(self):
+        for f in (self.codefile, self.datafile, self.picfile, self.tracefile):
+            if os.path.exists(f): os.remove(f)
+
+    def run_vm(self, code=None, data=None, **vm_args):
+        """Runs the code, the sort by default, and returns the vm."""
+        if code:
+            open(self.codefile, 'w').write('\n'.join([str(c) for c in code]))
+        datafile = None
+        if data:
+            open(self.datafile, 'w').write('\n'.join([str(d) for d in data]))
+            datafile = self.datafile
+        elif not code:
+            # execute() writes data back, so write it fresh for every run
+            open(self.datafile, 'w').write('\n'.join([str(d) for d in self.trans.data[1:]]))
+            datafile = self.datafile
+        vm = VM(codefile=self.codefile, datafile=datafile, output=ListOutput(), **vm_args)
+        vm.execute()
+        if vm.outfile: vm.outfile.close()
+        return vm
+
+    def test_render_matches_vm_pic_outfile(self):
+        self.run_vm(outfile=self.picfile, input=[5, 3, 9, 1, 4])
+        vm = self.run_vm(outfile=self.tracefile, trace='delta', input=[5, 3, 9, 1, 4])
+        self.assertEqual(vm.output.values, [1, 3, 4, 5, 9])
+        out = StringIO.StringIO()
+        TraceReader(self.tracefile).render(out)
+        self.assertEqual(out.getvalue(), open(self.picfile).read())
+
+    def test_ring_keeps_the_last_instructions(self):
+        self.run_vm(outfile=self.tracefile, trace='delta', input=[5, 3, 9, 1, 4])
+        full = TraceReader(self.tracefile)
+        vm = self.run_vm(outfile=self.tracefile, trace='delta', trace_ring=20,
+                         input=[5, 3, 9, 1, 4])
+        self.assertEqual(vm.tracer.steps, len(full.records))
+        ring = TraceReader(self.tracefile)
+        self.assertEqual(len(ring.records), 20)
+        self.assertEqual(ring.first_step, len(full.records) - 20)
+        for step in range(ring.first_step, len(full.records) + 1):
+            self.assertEqual(ring.pic(step), full.pic(step))
+        self.assertRaises(TraceException, ring.pic, 0)
+
+    def test_trace_size_does_not_grow_with_memory(self):
+        code = ['lit', 1, 'lit', 2, 'sti', 'load', 150, 'out', 'quit']
+        sizes = []
+        for n in (200, 2000):
+            self.run_vm(code, range(n), outfile=self.tracefile, trace='delta')
+            sizes.append(os.path.getsize(self.tracefile))
+        # only the snapshot in the header grows, by an int a cell
+        self.assertEqual(sizes[1] - sizes[0], 1800 * 9)
+        reader = TraceReader(self.tracefile)
+        self.assertEqual(reader.records[2], (5, 'sti', None, [1, 2], [], [(1, 0, 2)], None))
+
+    def test_mixed_values_and_data_growth(self):
+        code = ['lit', 'abc', 'store', 5, 'lit', 2.5, 'not', 'lit', 2**70, 'neg',
+                'lit', 1, 'dec', 1, 'quit']
+        vm = self.run_vm(code, outfile=self.tracefile, trace='delta')
+        reader = TraceReader(self.tracefile)
+        self.assertEqual(reader.records[1][5:], ([(5, None, 'abc')], 1))
+        self.assertEqual(reader.records[3][4], [False])
+        self.assertEqual(reader.records[5][4], [-2**70])
+        steps = list(reader.states())
+        self.assertEqual(steps[-1][2], vm.stack.data)
+        self.assertEqual(steps[-1][3], vm.data)
+
+    def test_not_a_trace(self):
+        open(self.tracefile, 'w').write('stack\n')
+        self.assertRaises(TraceException, TraceReader, self.tracefile)
+
+    def test_unknown_trace_format(self):
+        self.assertRaises(VmException, VM, trace='xml')
+
+
+if __name__ == '__main__':
+    unittest.main()
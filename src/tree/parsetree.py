@@ -100,52 +100,49 @@ class ParseTreeBuilder(Parser):
     def execute_one_cycle(self):
         """Execute one cycle of the parser. If the parser rejects the input, the tree is
         set to none."""
-        stack = self.stack
+        sym_stack = self.sym_stack
         tree_stack = self.tree_stack
         grammar = self.grammar
         current_token = self.current_token
-        top = stack.top()['name']        
-        if top in grammar.nonterminals:
-            n = grammar.parse_action(top, current_token['name'])
+        top = sym_stack[-1]
+        kind = grammar.symbol_kinds[top]
+        if kind == NONTERMINAL:
+            n = grammar.id_table[top].get(self.current_id, -1)
             if n == -1:
                 self.tree = None
                 self.is_parsing = False
             else:
                 #rulestr = "rule %s:   %s" % (n, ' -> '.join( grammar.rules[n]) )
                 #write_to(rulestr, self.outfile)                
-                stack.pop()
-                right_side_parts =  [{'name': name, 'value': ''} 
-                                  for name in grammar.rules[n][1].strip().split()]  
-                stack.multipush(right_side_parts)
+                sym_stack.pop()
+                sym_stack.extend(grammar.rule_pushes[n])
                 
                 ## for any level in a parse tree/subtree
                 ## we want the tree_stack to read in reverse as with the other stack
                 ## but the children list should read forward (ie left to right)
                 top_node = tree_stack.pop()
-                for tok in right_side_parts: 
-                    child = Node(tok['name'], tok['value'])
-                    top_node.add_child(child)
+                for name in grammar.rhs[n]: 
+                    top_node.add_child(Node(name, ''))
                 tree_stack.multipush(top_node.children)
                 
-        elif top in grammar.terminals:
-            if top == current_token['name']:
-                tok = stack.pop()
+        elif kind == TERMINAL:
+            if top == self.current_id:
+                sym_stack.pop()
                 node = tree_stack.pop()
                 # check for value in node at this point
                 if current_token['value']:
                     node.value = current_token['value']
                 self.next_token()                
            
-            elif current_token['name'] == '#' and top == '%':
-                self.is_parsing = False
             else:
+                # either accept, '#' with '%' on top, or reject
                 self.is_parsing = False
                 
-        elif self.grammar_is_ts and top in grammar.action_symbols:
+        elif self.grammar_is_ts and kind == ACTION:
             # if it's an action symbol, we want it displayed, but nothing else
             # it should already be a child of the nonterminal on the left hand side
             # of the rule that generated it
-            stack.pop()
+            sym_stack.pop()
             tree_stack.pop()
                 
                    